@@ -0,0 +1,8 @@
+"""
+Micro-benchmarks for the betfair package. Run from the repository root, e.g.
+
+    python -m benchmarks.market_prices
+
+benchmarks.suite covers the parsing of all the data calls and can save its
+results as JSON for comparing commits.
+"""
@@ -0,0 +1,59 @@
+"""
+getAllMarkets parsing: the original parser, which builds a list of every
+market, versus betfair.parsers.iter_all_markets() consumed in full and with
+menu path/start time filters applied while parsing.
+
+    python -m benchmarks.all_markets [--payload FILE ...]
+"""
+from __future__ import print_function, division
+
+import argparse
+import datetime
+
+from betfair import parsers
+from benchmarks import legacy, payloads
+from benchmarks.common import ops_per_sec, report, deep_size
+
+START_TAG = "<marketData xsi:type='xsd:string'>"
+END_TAG = '</marketData>'
+
+
+def stream(resp_xml, **filters):
+    start = resp_xml.find(START_TAG) + len(START_TAG)
+    return parsers.iter_all_markets(resp_xml[start:resp_xml.find(END_TAG, start)], **filters)
+
+
+def main(args):
+    if args.payload:
+        cases = [(path, payloads.load([path], '', '')[0]) for path in args.payload]
+    else:
+        cases = [('synthetic %d markets' % n, payloads.all_markets(n)) for n in (2000, 20000)]
+
+    for name, resp_xml in cases:
+        markets = legacy.parse_all_markets(resp_xml)
+        assert list(stream(resp_xml)) == markets, 'parsers disagree on %s' % name
+        first = min(m['event_date'] for m in markets)
+        filters = {'menu_prefix': args.menu_prefix, 'starts_after': first,
+                   'starts_before': first + datetime.timedelta(hours=2)}
+        kept = list(stream(resp_xml, **filters))
+        assert kept == [m for m in markets if m['menu_path'].startswith(args.menu_prefix)
+                        and filters['starts_after'] < m['event_date'] < filters['starts_before']]
+
+        old = ops_per_sec(legacy.parse_all_markets, resp_xml, args.secs)
+        new = ops_per_sec(lambda x: list(stream(x)), resp_xml, args.secs)
+        filtered = ops_per_sec(lambda x: list(stream(x, **filters)), resp_xml, args.secs)
+        print('%s (%d bytes response)' % (name, len(resp_xml)))
+        report('  legacy (list of all)', old)
+        report('  iter_all_markets (all)', new)
+        report('  iter_all_markets (%d filtered)' % len(kept), filtered)
+        print('  speed-up: %.2fx all, %.2fx filtered' % (new / old, filtered / old))
+        print('  markets held: legacy %d bytes, streaming %d bytes (largest single market)'
+              % (deep_size(markets), max(deep_size(m) for m in markets)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks getAllMarkets parsing')
+    parser.add_argument('--payload', action='append', default=[], help='recorded response xml file (repeatable)')
+    parser.add_argument('--menu-prefix', default='\\Horse Racing\\GB', help='menu path filter')
+    parser.add_argument('--secs', type=float, default=0.5, help='minimum seconds per measurement')
+    main(parser.parse_args())
@@ -0,0 +1,88 @@
+"""
+Feed timing with a slow subscriber (standing in for a Mongo insert or a bet
+round trip) called inline by the feed, as before harb.bus, and through a
+MessageBus. Feeds poll the stub exchange at 1 Hz on a FeedScheduler.
+
+    python -m benchmarks.bus [--feeds 50] [--subscriber-ms 1500] [--secs 8]
+"""
+from __future__ import print_function, division
+
+import argparse
+import time
+
+from betfair.api import API
+from betfair.stub import stub_urls
+from benchmarks.exchange_throughput import start_stub
+from harb.bus import MessageBus
+from harb.scheduler import FeedScheduler
+
+
+class PostingFeed(object):
+    """QuoteFeed.post_to_all() without the feeds module's dependencies"""
+    def __init__(self, api, market_id, subscribers, bus):
+        self.api = api
+        self.market_id = market_id
+        self.subscribers = subscribers
+        self.bus = bus
+
+    def post_to_all(self):
+        quotes = self.api.get_market_prices(self.market_id)
+        for sub in self.subscribers:
+            sub(self.api.API_TIMESTAMP, quotes)
+        if self.bus is not None:
+            self.bus.publish(('quotes', self.market_id), self.api.API_TIMESTAMP, quotes)
+        return quotes
+
+
+def run(name, api, market_ids, args, bus):
+    def slow_subscriber(timestamp, quotes):
+        time.sleep(args.subscriber_ms / 1000)
+
+    scheduler = FeedScheduler(workers=args.workers)
+    for i in range(args.feeds):
+        market_id = market_ids[i % len(market_ids)]
+        if bus is not None:
+            bus.subscribe(('quotes', market_id), slow_subscriber, policy='coalesce')
+        scheduler.add_feed(PostingFeed(api, market_id, [] if bus else [slow_subscriber], bus), 1)
+    scheduler.start()
+    time.sleep(args.secs)
+    scheduler.stop()
+    stats = scheduler.stats()
+    ticks = sum(s['ticks'] for s in stats)
+    skipped = sum(s['skipped_busy'] + s['dropped_late'] for s in stats)
+    runtime = max(s['runtime_ms']['p99'] for s in stats)
+    print('%-8s %5.2f ticks/s per feed (1.00 wanted), %4d ticks skipped, tick run time p99 %6.0f ms'
+          % (name, ticks / args.feeds / args.secs, skipped, runtime))
+
+
+def main(args):
+    proc, url = start_stub(args)
+    try:
+        api = API()
+        api.urls = stub_urls(url)
+        api.login('load', 'test')
+        market_ids = [m['market_id'] for m in api.get_all_markets()]
+        print('%d feeds at 1 Hz, subscriber taking %d ms' % (args.feeds, args.subscriber_ms))
+        run('inline', api, market_ids, args, None)
+        bus = MessageBus(workers=args.workers)
+        run('bus', api, market_ids, args, bus)
+        bus.close(timeout=args.subscriber_ms / 1000 * 2)
+        if args.report:
+            print(bus.report())
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks feed timing with slow subscribers')
+    parser.add_argument('--feeds', type=int, default=50, help='1 Hz price feeds')
+    parser.add_argument('--workers', type=int, default=16, help='scheduler and bus threads')
+    parser.add_argument('--subscriber-ms', type=float, default=1500, help='time each post takes to handle')
+    parser.add_argument('--markets', type=int, default=200, help='stub markets')
+    parser.add_argument('--latency', type=float, nargs=2, default=[0.005, 0.02], metavar=('MIN', 'MAX'),
+                        help='stub latency range')
+    parser.add_argument('--tick-secs', type=float, default=1.0, help='seconds per stub price step')
+    parser.add_argument('--secs', type=float, default=8.0, help='seconds measured per run')
+    parser.add_argument('--report', action='store_true', help='print the bus per subscription stats')
+    main(parser.parse_args())
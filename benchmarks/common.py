@@ -0,0 +1,57 @@
+from __future__ import print_function, division
+
+import sys
+import time
+
+
+def ops_per_sec(fn, arg, min_secs=0.5):
+    """calls fn(arg) repeatedly for at least min_secs and returns calls/second"""
+    fn(arg) # warm up
+    n, start = 0, time.time()
+    batch = 1
+    while True:
+        for _ in range(batch):
+            fn(arg)
+        n += batch
+        elapsed = time.time() - start
+        if elapsed >= min_secs:
+            return n / elapsed
+        batch *= 2
+
+
+def report(name, ops):
+    print('%-40s %12.1f ops/sec  %10.1f usec/op' % (name, ops, 1e6 / ops))
+
+
+def deep_size(obj):
+    """approximate bytes held by obj and everything it references (numpy aware)"""
+    return _walk(obj)[0]
+
+
+def deep_count(obj):
+    """number of distinct objects making up obj (numpy arrays count as one)"""
+    return _walk(obj)[1]
+
+
+def _walk(obj):
+    """returns (bytes, objects) held by obj and everything it references"""
+    seen = set()
+
+    def size(o):
+        if id(o) in seen:
+            return 0
+        seen.add(id(o))
+        n = sys.getsizeof(o)
+        if hasattr(o, 'nbytes') and hasattr(o, 'base'):
+            # numpy array: count the buffer of arrays that own one, not of views
+            # into another array's. recent numpys include it in getsizeof() already
+            if o.base is None and n < o.nbytes:
+                n += o.nbytes
+            return n
+        if isinstance(o, dict):
+            n += sum(size(k) + size(v) for k, v in o.items())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            n += sum(size(x) for x in o)
+        return n
+
+    return size(obj), len(seen)
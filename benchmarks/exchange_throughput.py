@@ -0,0 +1,119 @@
+"""
+End-to-end request throughput of API and API_T against the local stub
+exchange (betfair/stub.py), which runs in a child process so it does not
+compete with the client for the GIL.
+
+    python -m benchmarks.exchange_throughput [--markets 500] [--latency 0.01 0.03]
+"""
+from __future__ import print_function, division
+
+import argparse
+import subprocess
+import sys
+import time
+
+from betfair.api import API
+from betfair.api_throttled import API_T
+from betfair.bulk import BulkOrders
+from betfair.ratelimit import RateLimiter
+from betfair.sessions import SessionManager, default_api
+from betfair.stub import stub_urls
+from benchmarks.common import report
+
+
+def start_stub(args):
+    cmd = [sys.executable, '-m', 'betfair.stub', '--port', '0', '--markets', str(args.markets),
+           '--tick-secs', str(args.tick_secs)]
+    if args.latency:
+        cmd += ['--latency'] + [str(x) for x in args.latency]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    line = proc.stdout.readline().decode()
+    if ' on ' not in line:
+        proc.kill()
+        raise RuntimeError('stub exchange did not start: %r' % line)
+    return proc, line.strip().rpartition(' on ')[2]
+
+
+def client(cls, url, workers, **kwargs):
+    api = cls(**kwargs)
+    api.urls = stub_urls(url)
+    api.batch_workers = workers
+    assert api.login('load', 'test') == 'OK'
+    return api
+
+
+def per_sec(fn, n_requests, min_secs):
+    """calls fn() until min_secs have passed. returns requests/second"""
+    fn() # warm up (threads, connections, market state)
+    calls, start = 0, time.time()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.time() - start
+        if elapsed >= min_secs:
+            return calls * n_requests / elapsed
+
+
+def main(args):
+    proc, url = start_stub(args)
+    try:
+        api = client(API, url, args.workers)
+        market_ids = [m['market_id'] for m in api.get_all_markets()]
+        print('%d markets at %s, %d client threads' % (len(market_ids), url, args.workers))
+
+        report('  get_market_prices (one at a time)',
+               per_sec(lambda: api.get_market_prices(market_ids[0]), 1, args.secs))
+        report('  get_markets_prices (API)',
+               per_sec(lambda: api.get_markets_prices(market_ids), len(market_ids), args.secs))
+
+        # a budget the stub can never exhaust shows the cost of the limiter itself,
+        # the default budget shows what the bots actually get
+        unlimited = RateLimiter(dict((k, (1e9, 1e9)) for k in ('data', 'free', 'bets')))
+        api_t = client(API_T, url, args.workers, limiter=unlimited)
+        report('  get_markets_prices (API_T, no budget)',
+               per_sec(lambda: api_t.get_markets_prices(market_ids), len(market_ids), args.secs))
+        api_t = client(API_T, url, args.workers, limiter=RateLimiter())
+        report('  get_markets_prices (API_T, default budget)',
+               per_sec(lambda: api_t.get_markets_prices(market_ids[:10]), 10, args.secs))
+
+        # one default budget per session, markets sharded across them
+        def stub_api(exchange):
+            api = default_api(exchange)
+            api.urls = stub_urls(url)
+            return api
+        sessions = SessionManager([('load%d' % i, 'test') for i in range(args.sessions)],
+                                  api_factory=stub_api, workers=args.workers)
+        sessions.login()
+        shard_ids = market_ids[:10 * args.sessions]
+        report('  get_markets_prices (SessionManager, %d sessions)' % args.sessions,
+               per_sec(lambda: sessions.get_markets_prices(shard_ids), len(shard_ids), args.secs))
+        sessions.close()
+
+        prices = api.get_market_prices(market_ids[0])
+        bets = [{'marketId': market_ids[0], 'selectionId': r['selection_id'], 'betType': 'B',
+                 'price': '1000', 'size': '2', 'betCategoryType': 'E', 'betPersistenceType': 'NONE',
+                 'bspLiability': '0', 'asianLineId': '0'} for r in prices['runners']]
+        bets = (bets * (args.bets // len(bets) + 1))[:args.bets]
+        bulk = BulkOrders(api, args.workers)
+
+        def requote():
+            placed = bulk.place_bets(bets)['results']
+            bulk.cancel_bets([r['bet_id'] for r in placed if isinstance(r, dict)])
+        # one op = one bet placed and cancelled
+        report('  BulkOrders place + cancel (%d bets)' % len(bets), per_sec(requote, len(bets), args.secs))
+        bulk.shutdown()
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks API throughput against the stub exchange')
+    parser.add_argument('--markets', type=int, default=200, help='synthetic markets')
+    parser.add_argument('--latency', type=float, nargs=2, metavar=('MIN', 'MAX'), help='stub latency range')
+    parser.add_argument('--tick-secs', type=float, default=1.0, help='seconds per price step')
+    parser.add_argument('--workers', type=int, default=8, help='client threads per batch call')
+    parser.add_argument('--sessions', type=int, default=4, help='sessions of the SessionManager')
+    parser.add_argument('--bets', type=int, default=200, help='bets per BulkOrders round')
+    parser.add_argument('--secs', type=float, default=2.0, help='minimum seconds per measurement')
+    main(parser.parse_args())
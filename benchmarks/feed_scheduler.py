@@ -0,0 +1,97 @@
+"""
+Many 1 Hz price feeds polled from one process against the stub exchange:
+harb.scheduler.FeedScheduler vs the old single threaded sched MasterTimer.
+One extra feed stands in for a slow get_market_traded_volume() call.
+
+    python -m benchmarks.feed_scheduler [--feeds 120] [--secs 10]
+"""
+from __future__ import print_function, division
+
+import argparse
+import threading
+import time
+
+from betfair.api import API
+from betfair.stub import stub_urls
+from benchmarks import legacy
+from benchmarks.exchange_throughput import start_stub
+from harb.scheduler import FeedScheduler
+
+
+class PriceFeed(object):
+    """QuoteFeed without the subscribers, recording its start times"""
+    def __init__(self, api, market_id, delay=0.0):
+        self.api = api
+        self.market_id = market_id
+        self.delay = delay
+        self.starts = []
+
+    def post_to_all(self):
+        self.starts.append(time.time())
+        self.api.get_market_prices(self.market_id)
+        if self.delay:
+            time.sleep(self.delay)
+
+
+def measure(feeds, since, until, period):
+    """returns (ticks per feed per second, mean interval, p99 interval error)"""
+    intervals = []
+    ticks = 0
+    for feed in feeds:
+        starts = [t for t in feed.starts if since <= t < until]
+        ticks += len(starts)
+        intervals += [b - a for a, b in zip(starts, starts[1:])]
+    errors = sorted(abs(i - period) for i in intervals) or [float('nan')]
+    mean = sum(intervals) / len(intervals) if intervals else float('nan')
+    return ticks / len(feeds) / (until - since), mean, errors[int(len(errors) * 0.99)]
+
+
+def run(name, scheduler, api, market_ids, args):
+    feeds = [PriceFeed(api, market_ids[i % len(market_ids)]) for i in range(args.feeds)]
+    slow = PriceFeed(api, market_ids[0], delay=args.slow)
+    for feed in feeds + [slow]:
+        scheduler.add_feed(feed, 1)
+    thread = threading.Thread(target=scheduler.run)
+    thread.daemon = True  # the old MasterTimer cannot be stopped
+    thread.start()
+    time.sleep(args.warmup)
+    since = time.time()
+    time.sleep(args.secs)
+    rate, mean, p99 = measure(feeds, since, time.time(), 1.0)
+    print('%-16s %5.2f ticks/s per feed (1.00 wanted)  interval mean %6.3f s  p99 error %7.1f ms'
+          % (name, rate, mean, p99 * 1000))
+    return scheduler
+
+
+def main(args):
+    proc, url = start_stub(args)
+    try:
+        api = API()
+        api.urls = stub_urls(url)
+        api.login('load', 'test')
+        market_ids = [m['market_id'] for m in api.get_all_markets()]
+        print('%d feeds at 1 Hz + 1 feed taking %.1f s, stub latency %s'
+              % (args.feeds, args.slow, args.latency))
+        scheduler = run('FeedScheduler', FeedScheduler(workers=args.workers), api, market_ids, args)
+        scheduler.stop()
+        if args.report:
+            print(scheduler.report())
+        run('MasterTimer (old)', legacy.MasterTimer(), api, market_ids, args)
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks feed scheduling against the stub exchange')
+    parser.add_argument('--feeds', type=int, default=120, help='1 Hz price feeds')
+    parser.add_argument('--workers', type=int, default=16, help='FeedScheduler threads')
+    parser.add_argument('--slow', type=float, default=2.0, help='run time of the slow feed (s)')
+    parser.add_argument('--markets', type=int, default=200, help='stub markets')
+    parser.add_argument('--latency', type=float, nargs=2, default=[0.005, 0.02], metavar=('MIN', 'MAX'),
+                        help='stub latency range')
+    parser.add_argument('--tick-secs', type=float, default=1.0, help='seconds per stub price step')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds before measuring')
+    parser.add_argument('--secs', type=float, default=10.0, help='seconds measured per scheduler')
+    parser.add_argument('--report', action='store_true', help='print the FeedScheduler per feed stats')
+    main(parser.parse_args())
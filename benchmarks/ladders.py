@@ -0,0 +1,61 @@
+"""
+Time and memory of parsing getCompleteMarketPricesCompressed ladders into lists
+of dicts (original parser and betfair.parsers) versus numpy structured arrays
+(get_complete_market_prices(..., as_arrays=True)).
+
+    python -m benchmarks.ladders [--payload FILE ...]
+"""
+from __future__ import print_function, division
+
+import argparse
+
+import numpy as np
+
+from betfair import parsers
+from betfair.book import ladder_array
+from benchmarks import legacy, payloads
+from benchmarks.common import ops_per_sec, report, deep_size
+
+
+def parse_arrays(payload):
+    return parsers.parse_complete_market_prices(payload, ladder_array)
+
+
+def check(dicts, arrays):
+    for r_dict, r_arr in zip(dicts['runners'], arrays['runners']):
+        for k in parsers.LADDER_FIELDS:
+            assert np.allclose([x[k] for x in r_dict['prices']], r_arr['prices'][k]), k
+
+
+def main(args):
+    if args.payload:
+        cases = zip(args.payload, payloads.load(args.payload, "<completeMarketPrices xsi:type='xsd:string'>",
+                                                "</completeMarketPrices>"))
+    else:
+        cases = [('synthetic %d runners x %d rungs' % (n, r), payloads.complete_market_prices(n, r))
+                 for n, r in ((10, 50), (20, 150), (40, 300))]
+
+    for name, payload in cases:
+        dicts = legacy.parse_complete_market_prices(payload)
+        assert parsers.parse_complete_market_prices(payload) == dicts, 'parsers disagree on %s' % name
+        arrays = parse_arrays(payload)
+        check(dicts, arrays)
+
+        old = ops_per_sec(legacy.parse_complete_market_prices, payload, args.secs)
+        new = ops_per_sec(parsers.parse_complete_market_prices, payload, args.secs)
+        arr = ops_per_sec(parse_arrays, payload, args.secs)
+        old_mem, arr_mem = deep_size(dicts), deep_size(arrays)
+        print('%s (%d bytes payload)' % (name, len(payload)))
+        report('  legacy', old)
+        report('  parsers (dicts)', new)
+        report('  parsers (structured arrays)', arr)
+        print('  time saved vs legacy: %.1f%%' % (100.0 * (1 - old / arr)))
+        print('  result size: dicts %d bytes, arrays %d bytes (%.1fx smaller)'
+              % (old_mem, arr_mem, old_mem / arr_mem))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks complete market price ladder parsing')
+    parser.add_argument('--payload', action='append', default=[], help='recorded payload file (repeatable)')
+    parser.add_argument('--secs', type=float, default=0.5, help='minimum seconds per measurement')
+    main(parser.parse_args())
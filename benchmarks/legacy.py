@@ -0,0 +1,372 @@
+"""
+The original inline parsing, request building and odds code of
+betfair.api.API, kept verbatim (apart from being lifted into functions) as the
+baseline for the benchmarks, and the original harb.feeds.MasterTimer and
+TradeFeed volume differencing.
+"""
+import datetime
+import os
+import sched
+import time
+from math import ceil
+
+
+def parse_market_prices(prices):
+    prices = prices.replace("\:", "") # remove escaped delimiters
+    rows = prices.split(":")
+    temp_dict = {}
+    for row in rows:
+        if "|" in row:
+            # this is a runner...
+            fields = row.split("|")
+            if len(fields) > 2:
+                # parse info (fields[0])
+                keys = ["selection_id", "order_index", "total_matched",
+                        "last_price_matched", "handicap",
+                        "reduction_factor", "vacant", "far_sp",
+                        "near_sp", "actual_sp"]
+                vals = fields[0].split("~")
+                runner = dict(zip(keys, vals))
+                if not runner.has_key("back_prices"):
+                    runner["back_prices"] = []
+                if not runner.has_key("lay_prices"):
+                    runner["lay_prices"] = []
+                # parse prices (fields[1+])
+                keys = ["price", "amount", "type", "depth"]
+                for i in xrange(1, 3):
+                    # fields[1] = backs, fields[2] = lays
+                    vals = fields[i].split("~")[:-1]
+                    key_count = len(keys)
+                    price_count = len(vals) / key_count
+                    for j in xrange(price_count):
+                        start = j * key_count
+                        stop = start + key_count
+                        temp = dict(zip(keys, vals[start:stop]))
+                        temp["price"] = float(temp["price"])
+                        temp["amount"] = float(temp["amount"])
+                        if i == 1:
+                            runner["back_prices"].append(temp)
+                        elif i == 2:
+                            runner["lay_prices"].append(temp)
+                # convert prices and amounts to floats
+                floats = ["far_sp", "actual_sp", "last_price_matched",
+                        "near_sp", "total_matched", "reduction_factor"]
+                for k in runner:
+                    if k in floats:
+                        try:
+                            runner[k] = float(runner[k])
+                        except:
+                            pass
+                # append to market dict
+                temp_dict["runners"].append(runner)
+        else:
+            # split market info
+            keys = ["market_id", "currency", "status", "in_play_delay",
+                    "no_of_winners", "info", "discount_allowed",
+                    "base_rate", "refresh_time", "none_runners",
+                    "bsp_market"]
+            vals = row.split("~")
+            temp_dict = dict(zip(keys, vals))
+            temp_dict["runners"] = []
+            # convert numbers to floats or ints
+            nums = ["no_of_winners", "base_rate"]
+            for k in nums:
+                try:
+                    temp_dict[k] = int(temp_dict[k])
+                except:
+                    try:
+                        temp_dict[k] = float(temp_dict[k])
+                    except:
+                        pass
+    return temp_dict
+
+
+def parse_complete_market_prices(prices):
+    prices = prices.replace("\:", "") # remove escaped delimiters
+    rows = prices.split(":")
+    temp_dict = {}
+    for row in rows:
+        if "|" in row:
+            # this is a runner...
+            fields = row.split("|")
+            if len(fields) > 1:
+                # parse info (fields[0])
+                keys = ["selection_id", "order_index", "total_matched",
+                        "last_price_matched", "handicap",
+                        "reduction_factor", "vacant", "asian_line_id",
+                        "far_sp", "near_sp", "actual_sp"]
+                vals = fields[0].split("~")
+                runner = dict(zip(keys, vals))
+                if not runner.has_key("prices"):
+                    runner["prices"] = []
+                # parse prices (fields[1+])
+                keys = ["price", "back_amount", "lay_amount",
+                        "bsp_back_amount", "bsp_lay_amount"]
+                vals = fields[1].split("~")[:-1]
+                key_count = len(keys)
+                price_count = len(vals) / key_count
+                for j in xrange(price_count):
+                    start = j * key_count
+                    stop = start + key_count
+                    temp = dict(zip(keys, vals[start:stop]))
+                    # convert to floats
+                    for k in keys:
+                        temp[k] = float(temp[k])
+                    runner["prices"].append(temp)
+                # convert to floats
+                floats = ["far_sp", "actual_sp", "last_price_matched",
+                        "near_sp", "total_matched", "reduction_factor"]
+                for k in runner:
+                    if k in floats:
+                        try:
+                            runner[k] = float(runner[k])
+                        except:
+                            pass
+                # append to market dict
+                temp_dict["runners"].append(runner)
+        else:
+            # split market info
+            keys = ["market_id", "in_play_delay", "none_runners"]
+            vals = row.split("~")
+            temp_dict = dict(zip(keys, vals))
+            temp_dict["runners"] = []
+    return temp_dict
+
+
+# request building, as done by API before templates were compiled
+
+def set_value(xml = "", start_tag = "", value = "", end_tag = ""):
+    try:
+        pos1 = xml.index(start_tag) + len(start_tag)
+        pos2 = xml.index(end_tag, pos1)
+        return xml[:pos1] + value + xml[pos2:]
+    except:
+        return "" # tags not found
+
+
+def remove_string(xml, start_tag = "", end_tag = ""):
+    return xml.partition(start_tag)[0] + xml.partition(end_tag)[2]
+
+
+def build_get_market_prices(req_xml, session_token, market_id, currency_code = ""):
+    if currency_code:
+        req_xml = set_value(req_xml, "<currencyCode>", currency_code,
+            "</currencyCode>")
+    else: # remove from request (user default currency will be used)
+        req_xml = remove_string(req_xml, "<currencyCode>", "</currencyCode>\n")
+    req_xml = set_value(req_xml, "<marketId>",
+        market_id, "</marketId>")
+    return set_value(req_xml, "<sessionToken>", session_token, "</sessionToken>")
+
+
+def build_get_mu_bets(req_xml, session_token, market_id = "0", status = "MU",
+    order_by = "PLACED_DATE", sort_order = "ASC",
+    record_count = "200", start_record = "0"):
+    req_xml = remove_string(req_xml, "<betIds>", "</betIds>\n")
+    req_xml = remove_string(req_xml, "<matchedSince>", "</matchedSince>\n")
+    req_xml = remove_string(req_xml, "<excludeLastSecond>", "</excludeLastSecond>\n")
+    req_xml = set_value(req_xml, "<marketId>", market_id, "</marketId>")
+    req_xml = set_value(req_xml, "<betStatus>", status, "</betStatus>")
+    req_xml = set_value(req_xml, "<orderBy>", order_by, "</orderBy>")
+    req_xml = set_value(req_xml, "<sortOrder>", sort_order, "</sortOrder>")
+    req_xml = set_value(req_xml, "<recordCount>", record_count, "</recordCount>")
+    req_xml = set_value(req_xml, "<startRecord>", start_record, "</startRecord>")
+    return set_value(req_xml, "<sessionToken>", session_token, "</sessionToken>")
+
+
+def build_place_bets(req_xml, session_token, bets):
+    temp = ""
+    for bet in bets:
+        temp += "<PlaceBets>\n"
+        temp += "<marketId>" + bet["marketId"] + "</marketId>\n"
+        temp += "<selectionId>" + bet["selectionId"] \
+            + "</selectionId>\n"
+        temp += "<betType>" + bet["betType"] + "</betType>\n"
+        temp += "<price>" + bet["price"] + "</price>\n"
+        temp += "<size>" + bet["size"] + "</size>\n"
+        temp += "<betCategoryType>" + bet["betCategoryType"] \
+            + "</betCategoryType>\n"
+        temp += "<betPersistenceType>" + bet["betPersistenceType"] \
+            + "</betPersistenceType>\n"
+        temp += "<bspLiability>" + bet["bspLiability"] \
+            + "</bspLiability>\n"
+        temp += "<asianLineId>" + bet["asianLineId"] \
+            + "</asianLineId>\n"
+        temp += "</PlaceBets>\n"
+    req_xml = set_value(req_xml, "<bets>", temp, "</bets>")
+    return set_value(req_xml, "<sessionToken>", session_token, "</sessionToken>")
+
+
+def build_cancel_bets(req_xml, session_token, bet_ids):
+    ids = ""
+    for bid in bet_ids:
+        ids += "<CancelBets><betId>" + bid \
+            + "</betId></CancelBets>\n"
+    req_xml = set_value(req_xml, "<bets>\n", ids, "</bets>")
+    return set_value(req_xml, "<sessionToken>", session_token, "</sessionToken>")
+
+
+def build_get_all_markets(req_xml, session_token, events, countries):
+    req_xml = remove_string(req_xml, "<locale>", "</locale>\n")
+    temp = ""
+    for event in events:
+        temp += "<int>" + str(event) + "</int>\n"
+    req_xml = set_value(req_xml, "<eventTypeIds>\n", temp, "</eventTypeIds>")
+    req_xml = remove_string(req_xml, "<fromDate>", "</toDate>\n")
+    temp = ""
+    for country in countries:
+        temp += "<Country>" + country + "</Country>\n"
+    req_xml = set_value(req_xml, "<countries>\n", temp, "</countries>")
+    return set_value(req_xml, "<sessionToken>", session_token, "</sessionToken>")
+
+
+def set_betfair_odds(odds_table, price = 0.0, pips = 0, round_up = False,
+    round_down = False):
+    """convert calculated odds to betfair increments & add/subtract pips.
+    * "pips" should be an integer. pips = 3 ADDS 3 pips to price. pips = -1
+      SUBTRACTS 1 pip from price, etc, etc. Returned price defaults to
+      1000 or 1.01 if calculated price is outside these limits.
+    """
+    # set calculated odds to nearest increment
+    price = float(price)
+    prc = price
+    if price < 1.01:
+        prc = increment = 1.01
+    elif price < 2:
+        increment = 0.01
+    elif price < 3:
+        increment = 0.02
+    elif price < 4:
+        increment = 0.05
+    elif price < 6:
+        increment = 0.1
+    elif price < 10:
+        increment = 0.2
+    elif price < 20:
+        increment = 0.5
+    elif price < 30:
+        increment = 1.0
+    elif price < 50:
+        increment = 2.0
+    elif price < 100:
+        increment = 5.0
+    elif price < 1000:
+        increment = 10.0
+    else:
+        price = 1000.0
+        increment = 1000.0
+    if round_up:
+        prc = round(ceil(prc / increment) * increment, 2)
+    elif round_down:
+        prc = round(int(prc / increment) * increment, 2)
+    else:
+        prc = round(round(prc / increment) * increment, 2)
+    # add/subtract pips
+    if price <= 0:
+        return prc # prc = 1.01
+    else:
+        if pips != 0 and odds_table.count(prc) > 0:
+            index = odds_table.index(prc) + pips
+            if index < 0:
+                index = 0
+            if index > 349:
+                index = 349
+            prc = odds_table[index]
+    return prc
+
+
+def get_odds_spread(odds_table, back_odds = 0.0, lay_odds = 0.0):
+    """returns the No. of pips difference between back and lay odds"""
+    # make sure odds are correct increment
+    back_odds = set_betfair_odds(odds_table, back_odds)
+    lay_odds = set_betfair_odds(odds_table, lay_odds)
+    # search odds array and calculate difference
+    diff = odds_table.index(lay_odds) \
+        - odds_table.index(back_odds)
+    return diff
+
+
+def get_value(xml = "", start_tag = "", end_tag = ""):
+    part = xml.partition(start_tag)[2]
+    return part.partition(end_tag)[0]
+
+
+def parse_all_markets(resp_xml):
+    resp_xml = resp_xml.replace("\:", "") # remove escaped delimiter
+    resp_xml = resp_xml.replace("\~", "") # remove escaped delimiter
+    resp_code = get_value(resp_xml, "GetAllMarketsErrorEnum'>", "</")
+    if resp_code == "OK":
+        data = get_value(resp_xml,
+            "<marketData xsi:type='xsd:string'>", "</marketData>")
+        markets = data.split(":")[1:]
+        keys = ["market_id", "market_name", "market_type", "market_status",
+                "event_date", "menu_path", "event_hierarchy", "bet_delay",
+                "exchange_id", "country_code", "last_refresh",
+                "no_of_runners", "no_of_winners", "total_matched",
+                "bsp_market", "turning_in_play"]
+        ret = []
+        for market in markets:
+            vals = market.split("~")
+            temp = dict(zip(keys, vals))
+            # convert event start date to datetime object
+            if temp.has_key('event_date'):
+                temp['event_date'] = datetime.datetime.utcfromtimestamp(int(temp['event_date']) / 1000)
+            # convert numbers to floats or ints
+            nums = ["no_of_runners", "no_of_winners", "total_matched"]
+            for k in nums:
+                try:
+                    temp[k] = int(temp[k])
+                except:
+                    try:
+                        temp[k] = float(temp[k])
+                    except:
+                        pass
+            ret.append(temp)
+        return ret
+
+
+def load_templates(root_path):
+    """API.__load_templates(), which every API instance used to run"""
+    templates = {"global": {}, "uk": {}, "aus": {}}
+    for folder in os.listdir(root_path):
+        if templates.has_key(folder):
+            fp = root_path + folder + "/"
+            for file_name in os.listdir(fp):
+                if file_name.endswith(".req.xml"):
+                    soap_action = file_name.split(".")[1]
+                    xml = open(fp + file_name, "r").read()
+                    templates[folder][soap_action] = xml
+    return templates
+
+
+class MasterTimer(object):
+    """harb.feeds.MasterTimer before FeedScheduler replaced it"""
+    def __init__(self):
+        self._sched = sched.scheduler(time.time, time.sleep)
+        self._feeds = []
+
+    def add_feed(self, feed, seconds, priority=1):
+        def timed_feed():
+            feed.post_to_all()
+            self._sched.enter(seconds, priority, timed_feed, ())
+        self._feeds.append(timed_feed)
+
+    def run(self):
+        map(lambda f: f(), self._feeds)
+        self._sched.run()
+
+
+def traded_volume_series(tv):
+    """harb.feeds.TradeFeed.get_traded_volume() before TradeTracker"""
+    import pandas as pd
+    return dict(map(lambda x: (x['selection_id'], pd.DataFrame(x['volumes']).set_index('price').amount), tv))
+
+
+def trades_since(last, curr):
+    """harb.feeds.TradeFeed.post_to_all() differencing before TradeTracker"""
+    trades = {}
+    for sel_id, vol in last.items():
+        sel_trades = (curr[sel_id] - vol)
+        sel_trades = sel_trades[sel_trades >= 2]
+        trades[sel_id] = sel_trades
+    return trades
@@ -0,0 +1,41 @@
+"""
+Compares betfair.parsers.parse_market_prices against the original inline
+parser of API.get_market_prices.
+
+    python -m benchmarks.market_prices [--payload FILE ...]
+
+FILE can be a recorded getMarketPricesCompressed response or a bare
+<marketPrices> payload. Without --payload synthetic markets are used.
+"""
+from __future__ import print_function, division
+
+import argparse
+
+from betfair import parsers
+from benchmarks import legacy, payloads
+from benchmarks.common import ops_per_sec, report
+
+
+def main(args):
+    if args.payload:
+        cases = zip(args.payload, payloads.load(args.payload, "<marketPrices xsi:type='xsd:string'>",
+                                                "</marketPrices>"))
+    else:
+        cases = [('synthetic %d runners' % n, payloads.market_prices(n_runners=n)) for n in (5, 12, 20, 40)]
+
+    for name, payload in cases:
+        assert parsers.parse_market_prices(payload) == legacy.parse_market_prices(payload), \
+            'parsers disagree on %s' % name
+        old = ops_per_sec(legacy.parse_market_prices, payload, args.secs)
+        new = ops_per_sec(parsers.parse_market_prices, payload, args.secs)
+        print(name)
+        report('  legacy', old)
+        report('  parsers.parse_market_prices', new)
+        print('  speed-up: %.2fx' % (new / old))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the getMarketPricesCompressed parser')
+    parser.add_argument('--payload', action='append', default=[], help='recorded payload file (repeatable)')
+    parser.add_argument('--secs', type=float, default=0.5, help='minimum seconds per measurement')
+    main(parser.parse_args())
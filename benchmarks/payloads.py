@@ -0,0 +1,165 @@
+"""
+Synthetic and recorded payloads for the benchmarks.
+
+The synthetic generators produce strings in the same delimited formats as the
+compressed betfair responses, seeded so that runs are repeatable.
+"""
+from __future__ import print_function, division
+
+import random
+
+
+def tick_ladder():
+    """the 350 betfair price increments from 1.01 to 1000"""
+    bands = [(1.01, 2.0, 0.01), (2.0, 3.0, 0.02), (3.0, 4.0, 0.05), (4.0, 6.0, 0.1),
+             (6.0, 10.0, 0.2), (10.0, 20.0, 0.5), (20.0, 30.0, 1.0), (30.0, 50.0, 2.0),
+             (50.0, 100.0, 5.0), (100.0, 1000.0, 10.0)]
+    ticks = []
+    for lo, hi, inc in bands:
+        n = int(round((hi - lo) / inc))
+        ticks.extend(round(lo + i * inc, 2) for i in range(n))
+    ticks.append(1000.0)
+    return ticks
+
+
+TICKS = tick_ladder()
+
+
+def _runner_ticks(rnd, n_runners):
+    """a plausible best back tick index per runner"""
+    return [rnd.randint(60, 260) for _ in range(n_runners)]
+
+
+def market_prices(n_runners=12, depth=3, seed=0, market_id=107514860):
+    """a getMarketPricesCompressed <marketPrices> payload"""
+    rnd = random.Random(seed)
+    rows = ['%d~GBP~ACTIVE~0~1~Some info\\: with escaped colon~true~5.0~1375194000000~~Y' % market_id]
+    for i, tick in enumerate(_runner_ticks(rnd, n_runners)):
+        info = '%d~%d~%.2f~%.2f~~0.0~false~%.2f~%.2f~' % (
+            1000000 + i, i, rnd.uniform(0, 50000), TICKS[tick], TICKS[tick - 2], TICKS[tick + 3])
+        backs = ''.join('%.2f~%.2f~L~%d~' % (TICKS[tick - d], rnd.uniform(2, 500), d + 1)
+                        for d in range(depth))
+        lays = ''.join('%.2f~%.2f~B~%d~' % (TICKS[tick + 1 + d], rnd.uniform(2, 500), d + 1)
+                       for d in range(depth))
+        rows.append('|'.join([info, backs, lays]))
+    return ':'.join(rows)
+
+
+def complete_market_prices(n_runners=12, rungs=150, seed=0, market_id=107514860):
+    """a getCompleteMarketPricesCompressed <completeMarketPrices> payload.
+    each runner has a contiguous ladder of "rungs" prices around its LTP"""
+    rnd = random.Random(seed)
+    rows = ['%d~0~' % market_id]
+    for i, tick in enumerate(_runner_ticks(rnd, n_runners)):
+        info = '%d~%d~%.2f~%.2f~~0.0~false~0~%.2f~%.2f~' % (
+            1000000 + i, i, rnd.uniform(0, 50000), TICKS[tick], TICKS[tick - 2], TICKS[tick + 3])
+        lo = max(0, tick - rungs // 2)
+        ladder = []
+        for t in range(lo, min(len(TICKS), lo + rungs)):
+            back = rnd.uniform(2, 500) if t <= tick else 0.0
+            lay = rnd.uniform(2, 500) if t > tick else 0.0
+            ladder.append('%.2f~%.2f~%.2f~%.2f~%.2f~' % (TICKS[t], back, lay, 0.0, 0.0))
+        rows.append(info + '|' + ''.join(ladder))
+    return ':'.join(rows)
+
+
+MENU_PATHS = ['\\Horse Racing\\GB\\Kemp 1st Jun', '\\Horse Racing\\IRE\\Leop 1st Jun',
+              '\\Soccer\\English Soccer\\Barclays Premier League', '\\Tennis\\Group A\\ATP Nottingham',
+              '\\Greyhound Racing\\GB\\Romf 1st Jun']
+
+
+def all_markets(n_markets=20000, seed=0, start_ms=1370044800000):
+    """a complete getAllMarkets response xml holding n_markets markets spread
+    over the 24 hours from start_ms"""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n_markets):
+        menu = rnd.choice(MENU_PATHS)
+        country = 'IRL' if '\\IRE' in menu else 'GBR'
+        rows.append('%d~Market\\: %d~O~ACTIVE~%d~%s~/7/%d/%d~0~1~%s~%d~%d~1~%.2f~Y~N' % (
+            101000000 + i, i, start_ms + rnd.randint(0, 86400000), menu, 298251, 26000000 + i, country,
+            start_ms, rnd.randint(2, 20), rnd.uniform(0, 100000)))
+    return ("<n:Result xsi:type='n2:GetAllMarketsResp'><header xsi:type='n2:APIResponseHeader'>"
+            "<errorCode xsi:type='n2:APIErrorEnum'>OK</errorCode></header>"
+            "<marketData xsi:type='xsd:string'>:" + ':'.join(rows) + "</marketData>"
+            "<errorCode xsi:type='n2:GetAllMarketsErrorEnum'>OK</errorCode></n:Result>")
+
+
+def traded_volume(n_runners=12, n_prices=60, seed=0):
+    """a getMarketTradedVolumeCompressed <tradedVolume> payload with n_prices
+    traded prices per runner"""
+    rnd = random.Random(seed)
+    rows = []
+    for i, tick in enumerate(_runner_ticks(rnd, n_runners)):
+        lo = max(0, tick - n_prices // 2)
+        rows.append('%d~0~0.0~0.0~0.0' % (1000000 + i) + ''.join(
+            '|%.2f~%.2f' % (TICKS[t], rnd.uniform(2, 5000)) for t in range(lo, min(len(TICKS), lo + n_prices))))
+    return ':' + ':'.join(rows)
+
+
+def _field(name, xsd_type, val):
+    return "<%s xsi:type='%s'>%s</%s>" % (name, xsd_type, val, name)
+
+
+def mu_bets(n_bets=200, n_runners=12, seed=0, market_id=107514860):
+    """a getMUBets body: n_bets matched/unmatched bets and the record count"""
+    rnd = random.Random(seed)
+    ticks = _runner_ticks(rnd, n_runners)
+    items = []
+    for i in range(n_bets):
+        sel = rnd.randrange(n_runners)
+        matched = rnd.random() < 0.7
+        items.append("<n2:MUBet xsi:type='n2:MUBet'>" + ''.join([
+            _field('asianLineId', 'xsd:int', 0), _field('betId', 'xsd:long', 20000000000 + i),
+            _field('transactionId', 'xsd:long', 30000000000 + i),
+            _field('betStatus', 'n2:BetStatusEnum', 'M' if matched else 'U'),
+            _field('marketId', 'xsd:int', market_id),
+            _field('matchedDate', 'xsd:dateTime', '2013-06-01T13:%02d:%02d.000Z' % (i // 60 % 60, i % 60)
+                   if matched else '0001-01-01T00:00:00.000Z'),
+            _field('placedDate', 'xsd:dateTime', '2013-06-01T12:%02d:%02d.000Z' % (i // 60 % 60, i % 60)),
+            _field('price', 'xsd:double', '%.2f' % TICKS[ticks[sel] + rnd.randint(-3, 3)]),
+            _field('selectionId', 'xsd:int', 1000000 + sel),
+            _field('size', 'xsd:double', '%.2f' % rnd.uniform(2, 200)),
+            _field('betType', 'n2:BetTypeEnum', rnd.choice('BL')),
+            _field('betCategoryType', 'n2:BetCategoryTypeEnum', 'E'),
+            _field('betPersistenceType', 'n2:BetPersistenceTypeEnum', 'NONE'),
+            _field('bspLiability', 'xsd:double', '0.0'), _field('handicap', 'xsd:double', '0.0')])
+            + '</n2:MUBet>')
+    return ("<bets xsi:type='n2:ArrayOfMUBet'>" + ''.join(items) + '</bets>'
+            + _field('totalRecordCount', 'xsd:int', n_bets))
+
+
+def profit_and_loss(n_runners=12, seed=0, market_id=107514860):
+    """a getMarketProfitAndLoss body"""
+    rnd = random.Random(seed)
+    items = ''.join("<n2:ProfitAndLoss xsi:type='n2:ProfitAndLoss'>"
+                    + _field('ifWin', 'xsd:double', '%.2f' % rnd.uniform(-500, 500))
+                    + _field('selectionId', 'xsd:int', 1000000 + i)
+                    + _field('selectionName', 'xsd:string', 'Runner %d' % (i + 1))
+                    + '</n2:ProfitAndLoss>' for i in range(n_runners))
+    return ("<annotations xsi:type='n2:ArrayOfProfitAndLoss'>" + items + '</annotations>'
+            + _field('marketId', 'xsd:int', market_id))
+
+
+def response(error_enum, body):
+    """wraps a payload or body in a successful response xml, as the API
+    receives it (header, server timestamp, call error code)"""
+    return ("<n:Result xsi:type='n2:Resp'><header xsi:type='n2:APIResponseHeader'>"
+            "<errorCode xsi:type='n2:APIErrorEnum'>OK</errorCode>"
+            "<sessionToken xsi:type='xsd:string'>" + 'x' * 44 + '</sessionToken>'
+            "<timestamp xsi:type='xsd:dateTime'>2013-06-01T13:00:00.123Z</timestamp></header>"
+            + body + "<errorCode xsi:type='n2:%s'>OK</errorCode></n:Result>" % error_enum)
+
+
+def load(paths, start_tag, end_tag):
+    """loads recorded payloads from files. each file may hold a complete
+    response xml (the payload is then cut out between start_tag and end_tag)
+    or just the bare payload string"""
+    payloads = []
+    for path in paths:
+        with open(path) as f:
+            data = f.read()
+        if start_tag in data:
+            data = data.partition(start_tag)[2].partition(end_tag)[0]
+        payloads.append(data.strip())
+    return payloads
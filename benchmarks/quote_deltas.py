@@ -0,0 +1,82 @@
+"""
+Size and cost of QuoteFeed's delta encoding (harb/deltas.py) against full
+get_market_prices() snapshots, on a quiet and a busy stub exchange market.
+The stub runs in-process; polls are spaced by --interval, and a market moves
+one price step every tick_secs (quiet: many polls per step, busy: one).
+Sizes are of the JSON encoding, close to what MongoDB stores.
+
+    python -m benchmarks.quote_deltas [--polls 300] [--keyframe-every 60]
+"""
+from __future__ import print_function, division
+
+import argparse
+import json
+import time
+
+from betfair.api import API
+from betfair.stub import StubExchange
+from benchmarks.common import ops_per_sec, report
+from harb.deltas import QuoteDiffer, apply_delta
+
+
+class StubHttp(object):
+    """transport calling an in-process StubExchange"""
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    def send_http_request(self, url='', req_xml='', soap_action=''):
+        return self.exchange.handle(soap_action, req_xml)
+
+
+def poll(tick_secs, args):
+    """returns the snapshots of one market polled args.polls times"""
+    api = API()
+    api.http = StubHttp(StubExchange(markets=1, max_runners=args.runners, tick_secs=tick_secs))
+    api.login('load', 'test')
+    market_id = api.get_all_markets()[0]['market_id']
+    snapshots = []
+    for _ in range(args.polls):
+        quotes = api.get_market_prices(market_id)
+        quotes['timestamp'] = api.API_TIMESTAMP.isoformat()
+        snapshots.append(quotes)
+        time.sleep(args.interval)
+    return snapshots
+
+
+def encode_all(snapshots, keyframe_every):
+    differ = QuoteDiffer(keyframe_every)
+    return [doc for doc in map(differ.encode, snapshots) if doc is not None]
+
+
+def decode_all(docs):
+    snapshot = None
+    for doc in docs:
+        snapshot = apply_delta(snapshot, doc)
+    return snapshot
+
+
+def main(args):
+    print('%d polls of a %d runner market, %.0f ms apart, keyframe every %d ticks'
+          % (args.polls, args.runners, args.interval * 1000, args.keyframe_every))
+    for name, tick_secs in (('quiet', args.interval * 30), ('busy', args.interval)):
+        snapshots = poll(tick_secs, args)
+        docs = encode_all(snapshots, args.keyframe_every)
+        full = sum(len(json.dumps(s)) for s in snapshots)
+        deltas = sum(len(json.dumps(d)) for d in docs)
+        last = dict(decode_all(docs), refresh_time=None, timestamp=None)
+        assert last == dict(snapshots[-1], refresh_time=None, timestamp=None), 'round trip failed'
+        print('%s market: %d documents for %d ticks, %d bytes vs %d full (%.1fx smaller)'
+              % (name, len(docs), len(snapshots), deltas, full, full / deltas))
+        report('  encode (%s, per tick)' % name,
+               ops_per_sec(lambda s: encode_all(s, args.keyframe_every), snapshots, args.secs) * len(snapshots))
+        report('  apply_delta (%s, per document)' % name, ops_per_sec(decode_all, docs, args.secs) * len(docs))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks QuoteFeed delta encoding')
+    parser.add_argument('--polls', type=int, default=300, help='snapshots per market')
+    parser.add_argument('--runners', type=int, default=14, help='max runners of the market')
+    parser.add_argument('--interval', type=float, default=0.005, help='seconds between polls')
+    parser.add_argument('--keyframe-every', type=int, default=60, help='ticks between keyframes')
+    parser.add_argument('--secs', type=float, default=0.5, help='minimum seconds per measurement')
+    main(parser.parse_args())
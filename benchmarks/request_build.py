@@ -0,0 +1,84 @@
+"""
+Request build cost per API method: repeated set_value()/remove_string() on the
+raw template (as API used to do) versus compiled RequestTemplate slots.
+
+    python -m benchmarks.request_build
+"""
+from __future__ import print_function, division
+
+import argparse
+import os
+
+from betfair.api import PLACE_BETS_XML
+from betfair.template import RequestTemplate
+from benchmarks import legacy
+from benchmarks.common import ops_per_sec, report
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'betfair', 'templates', 'uk')
+TOKEN = 'x' * 44
+
+
+def raw_template(soap_action):
+    with open(os.path.join(TEMPLATES, 'BFExchangeService.%s.req.xml' % soap_action)) as f:
+        return f.read()
+
+
+def cases(n_bets):
+    bets = [{'marketId': '107514860', 'selectionId': str(1000000 + i), 'betType': 'B' if i % 2 else 'L',
+             'price': '3.45', 'size': '12.50', 'betCategoryType': 'E', 'betPersistenceType': 'NONE',
+             'bspLiability': '0', 'asianLineId': '0'} for i in range(n_bets)]
+    bet_ids = [str(20000000000 + i) for i in range(40)]
+
+    raw = raw_template('getMarketPricesCompressed')
+    tmpl = RequestTemplate(raw)
+    yield ('get_market_prices',
+           lambda _: legacy.build_get_market_prices(raw, TOKEN, '107514860'),
+           lambda _: tmpl.build({'sessionToken': TOKEN, 'marketId': '107514860', 'currencyCode': None}))
+
+    raw_mu = raw_template('getMUBets')
+    tmpl_mu = RequestTemplate(raw_mu)
+    yield ('get_mu_bets',
+           lambda _: legacy.build_get_mu_bets(raw_mu, TOKEN, '107514860'),
+           lambda _: tmpl_mu.build({'sessionToken': TOKEN, 'betIds': None, 'matchedSince': None,
+                                    'excludeLastSecond': None, 'marketId': '107514860', 'betStatus': 'MU',
+                                    'orderBy': 'PLACED_DATE', 'sortOrder': 'ASC', 'recordCount': '200',
+                                    'startRecord': '0'}))
+
+    raw_pb = raw_template('placeBets')
+    tmpl_pb = RequestTemplate(raw_pb)
+    yield ('place_bets (%d bets)' % n_bets,
+           lambda _: legacy.build_place_bets(raw_pb, TOKEN, bets),
+           lambda _: tmpl_pb.build({'sessionToken': TOKEN, 'bets': ''.join([PLACE_BETS_XML % b for b in bets])}))
+
+    raw_cb = raw_template('cancelBets')
+    tmpl_cb = RequestTemplate(raw_cb)
+    yield ('cancel_bets (40 ids)',
+           lambda _: legacy.build_cancel_bets(raw_cb, TOKEN, bet_ids),
+           lambda _: tmpl_cb.build({'sessionToken': TOKEN, 'bets': '\n' + ''.join(
+               ['<CancelBets><betId>' + b + '</betId></CancelBets>\n' for b in bet_ids])}))
+
+    raw_am = raw_template('getAllMarkets')
+    tmpl_am = RequestTemplate(raw_am)
+    yield ('get_all_markets',
+           lambda _: legacy.build_get_all_markets(raw_am, TOKEN, ['7'], ['GBR', 'IRL']),
+           lambda _: tmpl_am.build({'sessionToken': TOKEN, 'locale': None, 'fromDate': None, 'toDate': None,
+                                    'eventTypeIds': '\n<int>7</int>\n',
+                                    'countries': '\n<Country>GBR</Country>\n<Country>IRL</Country>\n'}))
+
+
+def main(args):
+    for name, old, new in cases(args.bets):
+        assert old(None) == new(None), 'requests differ for %s' % name
+        old_ops = ops_per_sec(old, None, args.secs)
+        new_ops = ops_per_sec(new, None, args.secs)
+        print(name)
+        report('  set_value/remove_string', old_ops)
+        report('  RequestTemplate', new_ops)
+        print('  speed-up: %.2fx' % (new_ops / old_ops))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks SOAP request building')
+    parser.add_argument('--bets', type=int, default=20, help='bets per place_bets request')
+    parser.add_argument('--secs', type=float, default=0.5, help='minimum seconds per measurement')
+    main(parser.parse_args())
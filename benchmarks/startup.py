@@ -0,0 +1,74 @@
+"""
+Start-up cost of the betfair package: importing it and creating API instances,
+as paid by short-lived scripts (paper-trade.py run from cron) and every
+upload.py pool worker. Each scenario runs in a fresh interpreter.
+
+The old behaviour is emulated by importing numpy (api.py imported book.py,
+and so numpy, at import time) and reading every template file per instance,
+as API.__load_templates() did.
+
+    python -m benchmarks.startup [--runs 20] [--instances 8]
+"""
+from __future__ import print_function, division
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TIMER = '''
+import time
+t0 = time.time()
+%s
+t1 = time.time()
+%s
+t2 = time.time()
+print('%%f %%f' %% ((t1 - t0) * 1000, (t2 - t1) * 1000))
+'''
+
+SCENARIOS = [
+    ('old: import, then %(n)d API() reading all templates',
+     'import numpy\nimport betfair\nfrom benchmarks import legacy',
+     'for i in range(%(n)d):\n    api = betfair.API()\n    api.odds_table = list(api.odds_table)\n'
+     '    legacy.load_templates(api.abs_path + "/templates/")'),
+    ('new: import, then %(n)d API()',
+     'import betfair',
+     'for i in range(%(n)d):\n    api = betfair.API()'),
+    ('new: import, then %(n)d API() + first request',
+     'import betfair\nclass CannedHttp(object):\n'
+     '    def send_http_request(self, url, req_xml, soap_action):\n        return ""',
+     'for i in range(%(n)d):\n    api = betfair.API()\n    api.http = CannedHttp()\n    api.keep_alive()'),
+]
+
+
+def run(setup, body, runs):
+    """returns the median (import ms, body ms) over runs fresh interpreters"""
+    times = []
+    for _ in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', TIMER % (setup, body)], cwd=ROOT)
+        times.append([float(x) for x in out.decode().split()])
+    times.sort(key=sum)
+    return times[len(times) // 2]
+
+
+def main(args):
+    n = {'n': args.instances}
+    results = []
+    for name, setup, body in SCENARIOS:
+        import_ms, body_ms = run(setup, body % n, args.runs)
+        results.append((name % n, import_ms, body_ms))
+    print('median of %d runs' % args.runs)
+    for name, import_ms, body_ms in results:
+        print('%-50s import %7.1f ms  instances %7.2f ms  total %7.1f ms'
+              % (name, import_ms, body_ms, import_ms + body_ms))
+    old, new = results[0], results[1]
+    print('start-up speed-up: %.1fx' % ((old[1] + old[2]) / (new[1] + new[2])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks import and API() start-up time')
+    parser.add_argument('--runs', type=int, default=20, help='fresh interpreters per scenario')
+    parser.add_argument('--instances', type=int, default=8, help='API instances per interpreter')
+    main(parser.parse_args())
@@ -0,0 +1,206 @@
+"""
+Benchmark suite for the response parsing of the API data calls, with
+machine readable results so that parser changes can be compared across
+commits:
+
+    python -m benchmarks.suite --json before.json
+    ... change a parser ...
+    python -m benchmarks.suite --json after.json --compare before.json
+
+Every case calls the API method itself (get_market_prices(), get_mu_bets(),
+...) on a transport that returns a canned response xml, so the figures cover
+all the work the method does on a response, but no network. Responses are
+synthetic (see payloads.py) unless --log gives a session recorded with
+betfair.replay.RecordingHttp, in which case the largest recorded response of
+each call is used instead. Per case:
+* ops_per_sec: calls per second
+* objects, result_bytes: python objects and bytes held by one result, i.e.
+  the allocations that outlive the call
+* peak_kb: peak RSS growth during one call, measured in a forked child
+  (Linux only, else null). memory freed by earlier cases is reused without
+  growing the RSS, so small cases read low; compare like with like
+"""
+from __future__ import print_function, division
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+
+from betfair import Error
+from betfair.api import API
+from betfair.replay import read_log
+from benchmarks import payloads
+from benchmarks.common import ops_per_sec, report, deep_size, deep_count
+
+MARKET_ID = '107514860'
+
+# method -> (soap action, call error enum, call)
+METHODS = {
+    'get_market_prices': ('getMarketPricesCompressed', 'GetMarketPricesErrorEnum',
+                          lambda api: api.get_market_prices(MARKET_ID)),
+    'get_complete_market_prices': ('getCompleteMarketPricesCompressed', 'GetCompleteMarketPricesErrorEnum',
+                                   lambda api: api.get_complete_market_prices(MARKET_ID)),
+    'get_market_traded_volume': ('getMarketTradedVolumeCompressed', 'GetMarketTradedVolumeCompressedErrorEnum',
+                                 lambda api: api.get_market_traded_volume(MARKET_ID)),
+    'get_mu_bets': ('getMUBets', 'GetMUBetsErrorEnum', lambda api: api.get_mu_bets(MARKET_ID)),
+    'get_market_profit_and_loss': ('getMarketProfitAndLoss', 'GetMarketProfitAndLossErrorEnum',
+                                   lambda api: api.get_market_profit_and_loss(MARKET_ID)),
+    'get_all_markets': ('getAllMarkets', 'GetAllMarketsErrorEnum', lambda api: api.get_all_markets()),
+}
+
+
+def synthetic_cases():
+    """yields (method, case, response xml)"""
+    def wrap(method, body):
+        return payloads.response(METHODS[method][1], body)
+
+    for n in (10, 20, 40):
+        yield ('get_market_prices', '%d runners' % n,
+               wrap('get_market_prices', "<marketPrices xsi:type='xsd:string'>"
+                    + payloads.market_prices(n_runners=n) + '</marketPrices>'))
+    for n, rungs in ((10, 50), (20, 150), (40, 300)):
+        yield ('get_complete_market_prices', '%d runners x %d rungs' % (n, rungs),
+               wrap('get_complete_market_prices', "<completeMarketPrices xsi:type='xsd:string'>"
+                    + payloads.complete_market_prices(n, rungs) + '</completeMarketPrices>'))
+    for n, prices in ((10, 30), (20, 60), (40, 120)):
+        yield ('get_market_traded_volume', '%d runners x %d prices' % (n, prices),
+               wrap('get_market_traded_volume', "<tradedVolume xsi:type='xsd:string'>"
+                    + payloads.traded_volume(n, prices) + '</tradedVolume>'))
+    for n in (20, 200):
+        yield 'get_mu_bets', '%d bets' % n, wrap('get_mu_bets', payloads.mu_bets(n))
+    for n in (10, 20, 40):
+        yield ('get_market_profit_and_loss', '%d runners' % n,
+               wrap('get_market_profit_and_loss', payloads.profit_and_loss(n)))
+    for n in (2000, 20000):
+        yield 'get_all_markets', '%d markets' % n, payloads.all_markets(n)
+
+
+def recorded_cases(path):
+    """yields (method, case, response xml) for the largest recorded response
+    of each method in a RecordingHttp log"""
+    actions = dict((action, method) for method, (action, enum, call) in METHODS.items())
+    largest = {}
+    for record in read_log(path):
+        method = actions.get(record['action'])
+        resp_xml = record['response']
+        if method and 'ErrorEnum\'>OK<' in resp_xml.replace('"', "'") \
+                and len(resp_xml) > len(largest.get(method, '')):
+            largest[method] = resp_xml
+    for method in sorted(largest):
+        yield method, 'recorded', largest[method].encode('utf-8')
+
+
+class CannedHttp(object):
+    """transport that answers every request with the same response"""
+    def __init__(self, resp_xml):
+        self.resp_xml = resp_xml
+
+    def send_http_request(self, url='', req_xml='', soap_action=''):
+        return self.resp_xml
+
+
+def _rss_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+
+
+def peak_kb(fn, arg):
+    """peak RSS growth (KB) of fn(arg), measured in a forked child whose RSS
+    high water mark is reset first. Linux only"""
+    if not hasattr(os, 'fork') or not os.path.exists('/proc/self/clear_refs'):
+        return None
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(r)
+            gc.collect()
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')  # resets VmHWM to the current RSS
+            base = _rss_kb('VmRSS')
+            result = fn(arg)
+            os.write(w, str(_rss_kb('VmHWM') - base).encode())
+            del result
+        finally:
+            os._exit(0)
+    os.close(w)
+    data = os.read(r, 64)
+    os.close(r)
+    os.waitpid(pid, 0)
+    return int(data) if data else None
+
+
+def run_case(method, case, resp_xml, secs):
+    api = API()
+    api.http = CannedHttp(resp_xml)
+    call = METHODS[method][2]
+    result = call(api)
+    if isinstance(result, Error) or result is None:
+        raise ValueError('%s (%s) returned %r' % (method, case, result))
+    ops = ops_per_sec(call, api, secs)
+    return {'method': method, 'case': case, 'response_bytes': len(resp_xml),
+            'ops_per_sec': round(ops, 1), 'usec_per_op': round(1e6 / ops, 1),
+            'objects': deep_count(result), 'result_bytes': deep_size(result),
+            'peak_kb': peak_kb(call, api)}
+
+
+def git_commit():
+    """returns (commit, dirty) of the working tree, or (None, None)"""
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD']).decode().strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no']).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(results, path):
+    """prints the change of each case against a previous --json file"""
+    with open(path) as f:
+        base = dict(((r['method'], r['case']), r) for r in json.load(f)['results'])
+    print('\ncompared with %s:' % path)
+    for r in results:
+        old = base.get((r['method'], r['case']))
+        if old:
+            print('  %-28s %-24s %6.2fx ops/sec  %+8d result bytes' % (
+                r['method'], r['case'], r['ops_per_sec'] / old['ops_per_sec'],
+                r['result_bytes'] - old['result_bytes']))
+
+
+def main(args):
+    cases = recorded_cases(args.log) if args.log else synthetic_cases()
+    results = []
+    for method, case, resp_xml in cases:
+        if args.method and method not in args.method:
+            continue
+        r = run_case(method, case, resp_xml, args.secs)
+        results.append(r)
+        report('%s (%s)' % (method, case), r['ops_per_sec'])
+        print('  %d response bytes -> %d objects, %d bytes held, peak %s KB'
+              % (r['response_bytes'], r['objects'], r['result_bytes'], r['peak_kb']))
+    commit, dirty = git_commit()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'commit': commit, 'dirty': dirty, 'python': platform.python_version(),
+                       'time': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                       'secs': args.secs, 'source': args.log or 'synthetic', 'results': results},
+                      f, indent=1, sort_keys=True)
+        print('results written to %s' % args.json)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the parsing of the API data calls')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results file of an earlier run to compare with')
+    parser.add_argument('--log', help='RecordingHttp log to take the responses from')
+    parser.add_argument('--method', action='append', default=[], help='only this API method (repeatable)')
+    parser.add_argument('--secs', type=float, default=0.5, help='minimum seconds per measurement')
+    main(parser.parse_args())
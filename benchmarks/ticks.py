@@ -0,0 +1,51 @@
+"""
+Price ladder maths: the original if/elif + list.index() implementation of
+API.set_betfair_odds()/get_odds_spread() versus betfair.ticks, one price at a
+time and for a whole array of prices.
+
+    python -m benchmarks.ticks
+"""
+from __future__ import print_function, division
+
+import argparse
+
+import numpy as np
+
+from betfair import ticks
+from benchmarks import legacy
+from benchmarks.common import ops_per_sec, report
+
+
+def main(args):
+    rng = np.random.RandomState(args.seed)
+    prices = np.exp(rng.uniform(np.log(1.01), np.log(1000), args.prices))
+    price_list = prices.tolist()
+    table = ticks.TICKS
+
+    cases = [
+        ('round + 1 pip (%d prices)' % args.prices,
+         lambda _: [legacy.set_betfair_odds(table, p, 1) for p in price_list],
+         lambda _: [ticks.shift_price(p, 1) for p in price_list],
+         lambda _: ticks.shift_prices(prices, 1)),
+        ('spread (%d pairs)' % args.prices,
+         lambda _: [legacy.get_odds_spread(table, p, p * 1.05) for p in price_list],
+         lambda _: [ticks.tick_distance(p, p * 1.05) for p in price_list],
+         lambda _: ticks.tick_distances(prices, prices * 1.05)),
+    ]
+    for name, old, scalar, vector in cases:
+        old_ops = ops_per_sec(old, None, args.secs)
+        scalar_ops = ops_per_sec(scalar, None, args.secs)
+        vector_ops = ops_per_sec(vector, None, args.secs)
+        print(name)
+        report('  if/elif + list.index', old_ops)
+        report('  ticks (bisect)', scalar_ops)
+        report('  ticks (numpy)', vector_ops)
+        print('  speed-up: %.1fx bisect, %.1fx numpy' % (scalar_ops / old_ops, vector_ops / old_ops))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks betfair price ladder rounding')
+    parser.add_argument('--prices', type=int, default=1000, help='prices per call')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--secs', type=float, default=0.5, help='minimum seconds per measurement')
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+"""
+Per poll cost of inferring trades from get_market_traded_volume():
+harb.trades.TradeTracker against the pandas Series differencing TradeFeed
+used before (skipped when pandas is not installed).
+
+    python -m benchmarks.trade_volume
+"""
+from __future__ import print_function, division
+
+import argparse
+import copy
+import random
+
+from betfair.api import API
+from benchmarks import legacy, payloads
+from benchmarks.common import ops_per_sec, report
+from benchmarks.suite import CannedHttp
+from harb.trades import TradeTracker
+
+CASES = [(10, 30), (20, 60), (40, 120)]  # runners, traded prices per runner
+
+
+def polls(n_runners, n_prices):
+    """two consecutive polls: the second has a fifth of the prices traded more"""
+    api = API()
+    api.http = CannedHttp(payloads.response(
+        'GetMarketTradedVolumeCompressedErrorEnum',
+        "<tradedVolume xsi:type='xsd:string'>" + payloads.traded_volume(n_runners, n_prices) + '</tradedVolume>'))
+    first = api.get_market_traded_volume('1')
+    second = copy.deepcopy(first)
+    rnd = random.Random(0)
+    for runner in second:
+        for volume in runner['volumes']:
+            if rnd.random() < 0.2:
+                volume['amount'] += rnd.uniform(2, 100)
+    return first, second
+
+
+def main(args):
+    try:
+        import pandas
+    except ImportError:
+        pandas = None
+        print('pandas is not installed, the old TradeFeed code is skipped')
+    for n_runners, n_prices in CASES:
+        first, second = polls(n_runners, n_prices)
+        name = '%d runners x %d prices' % (n_runners, n_prices)
+        tracker = TradeTracker()
+        tracker.update(first)
+        state = {'i': 0}
+
+        def new(_):
+            state['i'] += 1
+            return tracker.update(second if state['i'] % 2 else first)
+        report('  TradeTracker (%s)' % name, ops_per_sec(new, None, args.secs))
+
+        if pandas is not None:
+            last = legacy.traded_volume_series(first)
+
+            def old(_):
+                return legacy.trades_since(last, legacy.traded_volume_series(second))
+            report('  pandas TradeFeed (%s)' % name, ops_per_sec(old, None, args.secs))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks inferring trades from traded volume polls')
+    parser.add_argument('--secs', type=float, default=0.5, help='minimum seconds per measurement')
+    main(parser.parse_args())
@@ -8,3 +8,6 @@ It allows the Python interpreter use the betfair folder as a module, so we can i
 
 from api import API
 from api_throttled import API_T
+from api_async import API_A
+from sessions import SessionManager
+from errors import Error, APIError, SessionError, ThrottleError, ServerError, RequestError
@@ -21,9 +21,11 @@ Thank you and good luck!
 
 
 * HOW IT WORKS:
-* The basic theory is to load the request xml strings into memory at start up
-  and then use those as templates. This uses less than 100KB of memory if using
-  ALL templates. Most bots only require 7 or 8 of the 58+ available functions.
+* The basic theory is to load the request xml strings into memory and then use
+  those as templates. This uses less than 100KB of memory if using ALL
+  templates. Most bots only require 7 or 8 of the 58+ available functions, so
+  each template is only read the first time it is used, and the loaded
+  templates are shared by every API instance in the process.
 * gSoap library is used to create the raw xml templates, however this only needs
   to be called when doing a fresh build (i.e. when the WSDL file changes)
   The gSoap command prompts have been automated within __make_templates() but
@@ -135,10 +137,65 @@ ROAD MAP:
 
 import os
 import datetime
+import _strptime # datetime.strptime() lazily imports this, which is not thread-safe
 import sys
-from math import ceil
+import threading
 from http import Http
-from time import sleep
+from clock import ServerClock, parse_timestamp
+from parsers import parse_market_prices, parse_complete_market_prices, \
+    iter_all_markets
+from template import TemplateDir
+from ticks import TICKS, MIN_PRICE, shift_price, tick_distance
+from workers import WorkerPool
+from errors import Error, APIError, QUIET_CODES
+from time import sleep, time
+
+BATCH_WORKERS = 8 # concurrent requests per batch call, e.g. get_markets_prices()
+MU_BETS_PAGE = 200 # max records per getMUBets request
+NO_SESSION_XML = "<errorCode xsi:type='n2:APIErrorEnum'>NO_SESSION</errorCode>"
+
+TEMPLATES_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)),
+    "templates")
+_templates = {} # service -> TemplateDir, see shared_templates()
+_templates_lock = threading.Lock()
+
+# service -> endpoint. API.urls can point these elsewhere, e.g. at stub.py
+SERVICE_URLS = {
+    "global": "https://api.betfair.com/global/v3/BFGlobalService",
+    "uk": "https://api.betfair.com/exchange/v5/BFExchangeService",
+    "aus": "https://api-au.betfair.com/exchange/v5/BFExchangeService",
+}
+
+PLACE_BETS_XML = ("<PlaceBets>\n"
+    "<marketId>%(marketId)s</marketId>\n"
+    "<selectionId>%(selectionId)s</selectionId>\n"
+    "<betType>%(betType)s</betType>\n"
+    "<price>%(price)s</price>\n"
+    "<size>%(size)s</size>\n"
+    "<betCategoryType>%(betCategoryType)s</betCategoryType>\n"
+    "<betPersistenceType>%(betPersistenceType)s</betPersistenceType>\n"
+    "<bspLiability>%(bspLiability)s</bspLiability>\n"
+    "<asianLineId>%(asianLineId)s</asianLineId>\n"
+    "</PlaceBets>\n")
+
+UPDATE_BETS_XML = ("<UpdateBets>\n"
+    "<betId>%(betId)s</betId>\n"
+    "<oldPrice>%(oldPrice)s</oldPrice>\n"
+    "<newPrice>%(newPrice)s</newPrice>\n"
+    "<oldSize>%(oldSize)s</oldSize>\n"
+    "<newSize>%(newSize)s</newSize>\n"
+    "<oldBetPersistenceType>%(oldBetPersistenceType)s</oldBetPersistenceType>\n"
+    "<newBetPersistenceType>%(newBetPersistenceType)s</newBetPersistenceType>\n"
+    "</UpdateBets>\n")
+
+def shared_templates(service):
+    """returns the process wide TemplateDir of a service ("global", "uk" or
+    "aus"). templates are read on first use (see template.py)"""
+    with _templates_lock:
+        if service not in _templates:
+            _templates[service] = TemplateDir(os.path.join(TEMPLATES_PATH,
+                service))
+        return _templates[service]
 
 class API(object):
     """betfair API library
@@ -147,6 +204,10 @@ class API(object):
       sent us a reply, so is only as accurate as our request frequency. Use of
       datetime.utcnow() may be less accurate because it only indicates the local
       time and does not compensate for internet lag.
+    * self.clock (see clock.py) estimates the server clock from every reply,
+      so self.clock.server_now() is the current server time, without waiting
+      for a reply, and self.clock.secs_until(start_time) is the time until the
+      event starts.
     * To calculate the time remaining until event starts, we need to use the
       marketTime field returned by the get_market() function (GMT/UTC time).
       EXAMPLE:
@@ -159,77 +220,80 @@ class API(object):
     """
     API_TIMESTAMP = None # datetime object indicating betfair server time (GMT)
 
-    def __init__(self, exchange = "uk"):
+    def __init__(self, exchange = "uk", raise_errors = False):
         self.http = Http()
+        self.urls = dict(SERVICE_URLS) # see SERVICE_URLS
         self.abs_path = os.path.abspath(os.path.dirname(__file__))
-        self.templates = {"global": {}, "uk": {}, "aus": {}}
         self.session_token = ""
         self.exchange = exchange # must be "uk" OR "aus"!
         if self.exchange not in ["uk", "aus"]:
             raise Exception("Invalid exchange string. MUST be 'uk' OR 'aus'!")
-        self.odds_table = []
-        self.__init_odds_table()
+        self.odds_table = TICKS # valid betfair prices, shared, see ticks.py
         self.__load_templates()
         self.free_api = False # see Login() function
+        self.limiter = None # optional ratelimit.RateLimiter, see API_T
+        self.batch_workers = BATCH_WORKERS # threads used by batch calls
+        self.__workers = None
+        self.__workers_lock = threading.Lock()
+        # error handling, see errors.py
+        self.raise_errors = raise_errors # raise APIErrors instead of returning Errors
+        self.relogin = True # log back in (once per call) if the session expires
+        self.__credentials = None # set by login()
+        self.clock = ServerClock() # server time estimate, see clock.py
+        self.last_reply = None # local time.time() of the last response
+        self.__login_lock = threading.Lock()
 
-    def __init_odds_table(self):
-        """loads the lookup table for the set_betfair_odds() function"""
-        self.odds_table = [1.01, 1.02, 1.03, 1.04, 1.05, 1.06, 1.07, 1.08, 1.09,
-            1.1, 1.11, 1.12, 1.13, 1.14, 1.15, 1.16, 1.17, 1.18, 1.19, 1.2,
-            1.21, 1.22, 1.23, 1.24, 1.25, 1.26, 1.27, 1.28, 1.29, 1.3, 1.31,
-            1.32, 1.33, 1.34, 1.35, 1.36, 1.37, 1.38, 1.39, 1.4, 1.41, 1.42,
-            1.43, 1.44, 1.45, 1.46, 1.47, 1.48, 1.49, 1.5, 1.51, 1.52, 1.53,
-            1.54, 1.55, 1.56, 1.57, 1.58, 1.59, 1.6, 1.61, 1.62, 1.63, 1.64,
-            1.65, 1.66, 1.67, 1.68, 1.69, 1.7, 1.71, 1.72, 1.73, 1.74, 1.75,
-            1.76, 1.77, 1.78, 1.79, 1.8, 1.81, 1.82, 1.83, 1.84, 1.85, 1.86,
-            1.87, 1.88, 1.89, 1.9, 1.91, 1.92, 1.93, 1.94, 1.95, 1.96, 1.97,
-            1.98, 1.99, 2.0, 2.02, 2.04, 2.06, 2.08, 2.1, 2.12, 2.14, 2.16,
-            2.18, 2.2, 2.22, 2.24, 2.26, 2.28, 2.3, 2.32, 2.34, 2.36, 2.38, 2.4,
-            2.42, 2.44, 2.46, 2.48, 2.5, 2.52, 2.54, 2.56, 2.58, 2.6, 2.62,
-            2.64, 2.66, 2.68, 2.7, 2.72, 2.74, 2.76, 2.78, 2.8, 2.82, 2.84,
-            2.86, 2.88, 2.9, 2.92, 2.94, 2.96, 2.98, 3.0, 3.05, 3.1, 3.15, 3.2,
-            3.25, 3.3, 3.35, 3.4, 3.45, 3.5, 3.55, 3.6, 3.65, 3.7, 3.75, 3.8,
-            3.85, 3.9, 3.95, 4.0, 4.1, 4.2, 4.3, 4.4, 4.5, 4.6, 4.7, 4.8, 4.9,
-            5.0, 5.1, 5.2, 5.3, 5.4, 5.5, 5.6, 5.7, 5.8, 5.9, 6.0, 6.2, 6.4,
-            6.6, 6.8, 7.0, 7.2, 7.4, 7.6, 7.8, 8.0, 8.2, 8.4, 8.6, 8.8, 9.0,
-            9.2, 9.4, 9.6, 9.8, 10.0, 10.5, 11.0, 11.5, 12.0, 12.5, 13.0, 13.5,
-            14.0, 14.5, 15.0, 15.5, 16.0, 16.5, 17.0, 17.5, 18.0, 18.5, 19.0,
-            19.5, 20.0, 21.0, 22.0, 23.0, 24.0, 25.0, 26.0, 27.0, 28.0, 29.0,
-            30.0, 32.0, 34.0, 36.0, 38.0, 40.0, 42.0, 44.0, 46.0, 48.0, 50.0,
-            55.0, 60.0, 65.0, 70.0, 75.0, 80.0, 85.0, 90.0, 95.0, 100.0, 110.0,
-            120.0, 130.0, 140.0, 150.0, 160.0, 170.0, 180.0, 190.0, 200.0,
-            210.0, 220.0, 230.0, 240.0, 250.0, 260.0, 270.0, 280.0, 290.0,
-            300.0, 310.0, 320.0, 330.0, 340.0, 350.0, 360.0, 370.0, 380.0,
-            390.0, 400.0, 410.0, 420.0, 430.0, 440.0, 450.0, 460.0, 470.0,
-            480.0, 490.0, 500.0, 510.0, 520.0, 530.0, 540.0, 550.0, 560.0,
-            570.0, 580.0, 590.0, 600.0, 610.0, 620.0, 630.0, 640.0, 650.0,
-            660.0, 670.0, 680.0, 690.0, 700.0, 710.0, 720.0, 730.0, 740.0,
-            750.0, 760.0, 770.0, 780.0, 790.0, 800.0, 810.0, 820.0, 830.0,
-            840.0, 850.0, 860.0, 870.0, 880.0, 890.0, 900.0, 910.0, 920.0,
-            930.0, 940.0, 950.0, 960.0, 970.0, 980.0, 990.0, 1000.0]
+    def __build_request(self, service, soap_action, **values):
+        """fills in the compiled template for soap_action (see template.py).
+        * service = "global" or the exchange ("uk"/"aus")
+        * values are element contents keyed by tag name. None removes the
+          element from the request.
+        """
+        values["sessionToken"] = self.session_token
+        return self.templates[service][soap_action].build(values)
 
     def __send_request(self, global_serv = True, req_xml = "", soap_action = ""):
-        """sends http request"""
-        # add session token to request
-        req_xml = self.set_value(req_xml, "<sessionToken>", self.session_token,
-            "</sessionToken>")
+        """sends http request. req_xml should come from __build_request() so
+        that it already carries the session token.
+        * if the session has expired and login() succeeded earlier, logs back
+          in and resends the request once (see self.relogin)
+        """
         # setup url
         if global_serv:
-            url = "https://api.betfair.com/global/v3/BFGlobalService"
-        elif self.exchange == "uk":
-            url = "https://api.betfair.com/exchange/v5/BFExchangeService"
-        elif self.exchange == "aus":
-            url = "https://api-au.betfair.com/exchange/v5/BFExchangeService"
+            url = self.urls["global"]
+        elif self.exchange in ("uk", "aus"):
+            url = self.urls[self.exchange]
         else:
             raise Exception("Invalid server. Must be 'uk' OR 'aus'!")
+        resp_xml = self.__post(url, req_xml, soap_action)
+        if (NO_SESSION_XML in resp_xml and self.relogin and self.__credentials
+            and soap_action != "login"):
+            old_token = self.get_value(req_xml, "<sessionToken>", "</sessionToken>")
+            if self.__relogin(old_token) == "OK":
+                req_xml = req_xml.replace(
+                    "<sessionToken>" + old_token + "</sessionToken>",
+                    "<sessionToken>" + self.session_token + "</sessionToken>", 1)
+                resp_xml = self.__post(url, req_xml, soap_action)
+        return resp_xml
+
+    def __post(self, url, req_xml, soap_action):
+        """sends one request and updates the server timestamp/session token"""
+        # wait for our request budget (if rate limited)
+        if self.limiter is not None:
+            self.limiter.acquire(soap_action)
         # send request
+        sent = time()
         resp_xml = self.http.send_http_request(url, req_xml, soap_action)
+        received = self.last_reply = time()
         resp_xml = resp_xml.replace('"', "'")
-        # update server timestamp - default to utcnow() rather than None
-        self.API_TIMESTAMP = datetime.datetime.utcnow()
+        # update server timestamp + clock - default to utcnow() rather than None
         s_time = self.get_value(resp_xml, "<timestamp xsi:type='xsd:dateTime'>", "</timestamp>")
-        if s_time:
-            self.API_TIMESTAMP = datetime.datetime.strptime(s_time, '%Y-%m-%dT%H:%M:%S.%fZ')
+        server_time = s_time and parse_timestamp(s_time)
+        if server_time:
+            self.API_TIMESTAMP = server_time
+            self.clock.update(sent, received, server_time)
+        else:
+            self.API_TIMESTAMP = datetime.datetime.utcnow()
         # update session token + return
         token = self.get_value(resp_xml, "<sessionToken xsi:type='xsd:string'>",
             "</")
@@ -237,95 +301,86 @@ class API(object):
             self.session_token = token
         return resp_xml
 
+    def __relogin(self, old_token):
+        """logs in again with the stored credentials, unless another thread
+        already did so since old_token was used. returns the login response"""
+        with self.__login_lock:
+            if self.session_token and self.session_token != old_token:
+                return "OK"
+            raise_errors, self.raise_errors = self.raise_errors, False
+            try:
+                return self.login(*self.__credentials)
+            finally:
+                self.raise_errors = raise_errors
+
+    def __error(self, resp_code, resp_xml):
+        """returns an Error for a failed response (see errors.py) OR raises
+        it if self.raise_errors is set.
+        * resp_code = the call's ErrorEnum value
+        """
+        if resp_code == "API_ERROR":
+            err = Error(resp_code, self.get_value(resp_xml,
+                "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>"),
+                resp_xml)
+        elif resp_code:
+            err = Error(resp_code, response = resp_xml)
+        else:
+            err = Error("SERVER_RESPONSE_ERROR", response = resp_xml)
+        if self.raise_errors and err.code not in QUIET_CODES:
+            raise err.exception()
+        return err
+
+    def __invalid(self, text):
+        """returns (or raises) an Error for bad call arguments"""
+        err = Error("INVALID_ARGUMENT", text = text)
+        if self.raise_errors:
+            raise err.exception()
+        return err
+
     def set_betfair_odds(self, price = 0.0, pips = 0, round_up = False,
         round_down = False):
         """convert calculated odds to betfair increments & add/subtract pips.
         * "pips" should be an integer. pips = 3 ADDS 3 pips to price. pips = -1
           SUBTRACTS 1 pip from price, etc, etc. Returned price defaults to
           1000 or 1.01 if calculated price is outside these limits.
+        * see ticks.py for vectorised versions (round_prices, shift_prices)
         """
-        # set calculated odds to nearest increment
-        price = float(price)
-        prc = price
-        if price < 1.01:
-            prc = increment = 1.01
-        elif price < 2:
-            increment = 0.01
-        elif price < 3:
-            increment = 0.02
-        elif price < 4:
-            increment = 0.05
-        elif price < 6:
-            increment = 0.1
-        elif price < 10:
-            increment = 0.2
-        elif price < 20:
-            increment = 0.5
-        elif price < 30:
-            increment = 1.0
-        elif price < 50:
-            increment = 2.0
-        elif price < 100:
-            increment = 5.0
-        elif price < 1000:
-            increment = 10.0
-        else:
-            price = 1000.0
-            increment = 1000.0
         if round_up:
-            prc = round(ceil(prc / increment) * increment, 2)
+            mode = "up"
         elif round_down:
-            prc = round(int(prc / increment) * increment, 2)
-        else:
-            prc = round(round(prc / increment) * increment, 2)
-        # add/subtract pips
-        if price <= 0:
-            return prc # prc = 1.01
+            mode = "down"
         else:
-            if pips != 0 and self.odds_table.count(prc) > 0:
-                index = self.odds_table.index(prc) + pips
-                if index < 0:
-                    index = 0
-                if index > 349:
-                    index = 349
-                prc = self.odds_table[index]
-        return prc
+            mode = "nearest"
+        if float(price) <= 0:
+            return MIN_PRICE
+        return shift_price(price, pips, mode)
 
     def get_odds_spread(self, back_odds = 0.0, lay_odds = 0.0):
         """returns the No. of pips difference between back and lay odds"""
-        # make sure odds are correct increment
-        back_odds = self.set_betfair_odds(back_odds)
-        lay_odds = self.set_betfair_odds(lay_odds)
-        # search odds array and calculate difference
-        diff = self.odds_table.index(lay_odds) \
-            - self.odds_table.index(back_odds)
-        return diff
+        return tick_distance(back_odds, lay_odds)
 
     def login(self, username = "", password = "", product_id = "82",
         vendor_id = "0"):
         """login to betfair"""
         # are we using free api?
         if product_id == "82": self.free_api = True
-        req_xml = self.templates["global"]["login"]
-        req_xml = self.set_value(req_xml, "<username>", username, "</username>")
-        req_xml = self.set_value(req_xml, "<password>", password, "</password>")
-        req_xml = self.set_value(req_xml, "<productId>", product_id,
-            "</productId>")
-        req_xml = self.set_value(req_xml, "<vendorSoftwareId>", vendor_id,
-            "</vendorSoftwareId>")
+        req_xml = self.__build_request("global", "login", username = username,
+            password = password, productId = product_id,
+            vendorSoftwareId = vendor_id)
         resp_xml = self.__send_request(True, req_xml, "login")
         resp_code = self.get_value(resp_xml, "LoginErrorEnum'>", "</")
-        if resp_code == "API_ERROR":
-            resp_code += ": " + self.get_value(resp_xml,
-                "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-        return resp_code
+        if resp_code == "OK":
+            # remembered for automatic re-login, see __send_request()
+            self.__credentials = (username, password, product_id, vendor_id)
+            return resp_code
+        return self.__error(resp_code, resp_xml)
 
 
     def keep_alive(self):
         """prevents session time out (approx 20 mins) when no other API calls
         are being made
         """
-        req_xml = self.templates["global"]["keepAlive"]
+        req_xml = self.__build_request("global", "keepAlive")
         resp_xml = self.__send_request(True, req_xml, "keepAlive")
         api_error = self.get_value(resp_xml,
             "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
@@ -333,27 +388,24 @@ class API(object):
 
     def logout(self):
         """logout of betfair"""
-        req_xml = self.templates["global"]["logout"]
+        req_xml = self.__build_request("global", "logout")
         resp_xml = self.__send_request(True, req_xml, "logout")
         resp_code = self.get_value(resp_xml, "LogoutErrorEnum'>", "</")
         if resp_code == "OK":
             self.session_token = "" # reset session
+            self.__credentials = None # ...and don't log back in
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml,
-                    "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+            resp_code = self.__error(resp_code, resp_xml)
         return resp_code
 
     def get_account_funds(self):
         """get available account funds"""
-        req_xml = self.templates[self.exchange]["getAccountFunds"]
+        req_xml = self.__build_request(self.exchange, "getAccountFunds")
         resp_xml = self.__send_request(False, req_xml, "getAccountFunds")
         resp_code = self.get_value(resp_xml, "GetAccountFundsErrorEnum'>", "</")
         if not resp_code:
             # occurs rarely - could be an error on betfairs' servers??
-            return 'API_ERROR: empty response code. Response XML = ' + resp_xml
+            return self.__error(resp_code, resp_xml)
         elif resp_code == "OK":
             funds = {}
             resp_xml = self.get_value(resp_xml, "</header>",
@@ -368,16 +420,12 @@ class API(object):
                     funds[key] = val # probably minorErrorCode
             return funds
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml,
-                    "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+            resp_code = self.__error(resp_code, resp_xml)
             return resp_code
 
     def get_active_event_types(self):
         """returns a dictionary containing active event type names and ids"""
-        req_xml = self.templates["global"]["getActiveEventTypes"]
+        req_xml = self.__build_request("global", "getActiveEventTypes")
         resp_xml = self.__send_request(True, req_xml, "getActiveEventTypes")
         resp_code = self.get_value(resp_xml, "GetEventsErrorEnum'>", "</")
         if resp_code == "OK":
@@ -393,16 +441,12 @@ class API(object):
                 if name: events_list[name] = eid
             return events_list
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml,
-                    "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+            resp_code = self.__error(resp_code, resp_xml)
             return resp_code
 
     def get_all_event_types(self):
         """returns a dictionary containing ALL event type names and ids"""
-        req_xml = self.templates["global"]["getAllEventTypes"]
+        req_xml = self.__build_request("global", "getAllEventTypes")
         resp_xml = self.__send_request(True, req_xml, "getAllEventTypes")
         resp_code = self.get_value(resp_xml, "GetEventsErrorEnum'>", "</")
         if resp_code == "OK":
@@ -418,19 +462,14 @@ class API(object):
                 if name: events_list[name] = eid
             return events_list
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml,
-                    "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+            resp_code = self.__error(resp_code, resp_xml)
             return resp_code
 
     def get_market(self, market_id = ""):
         """returns static data for given market id"""
         if market_id:
-            req_xml = self.templates[self.exchange]["getMarket"]
-            req_xml = self.set_value(req_xml, "<marketId>", market_id,
-                "</marketId>")
+            req_xml = self.__build_request(self.exchange, "getMarket",
+                marketId = market_id)
             resp_xml = self.__send_request(False, req_xml, "getMarket")
             resp_code = self.get_value(resp_xml, "GetMarketErrorEnum'>", "</")
             if resp_code == "OK":
@@ -467,12 +506,7 @@ class API(object):
                     if key: temp[key] = val
                 return temp
             else:
-                if resp_code == "API_ERROR":
-                    resp_code += ": " + self.get_value(resp_xml,
-                        "<errorCode xsi:type='n2:APIErrorEnum'>",
-                        "</errorCode>")
-                elif resp_code == '':
-                    resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+                resp_code = self.__error(resp_code, resp_xml)
                 return resp_code
         return None
 
@@ -491,91 +525,75 @@ class API(object):
           to include sports, e.g. GBR horse racing. A list of ISO3 codes is available
           here: http://en.wikipedia.org/wiki/ISO_3166-1_alpha-3
         """
-        req_xml = self.templates[self.exchange]["getAllMarkets"]
-        req_xml = self.remove_string(req_xml, "<locale>", "</locale>\n")
+        markets = self.iter_all_markets(events, hours, include_started,
+            countries)
+        if isinstance(markets, Error):
+            return markets
+        return list(markets)
+
+    def iter_all_markets(self, events = None, hours = None,
+        include_started = True, countries = None, menu_prefix = None,
+        starts_after = None, starts_before = None):
+        """streaming version of get_all_markets(). returns a generator of
+        markets OR an error string. markets are parsed as the generator is
+        consumed and filtered before their dicts are built, so a caller that
+        only wants a few markets (or stops early) never holds the full list.
+        * events, hours, include_started, countries: see get_all_markets()
+        * menu_prefix: only markets whose menu_path starts with this string,
+          e.g. "\\Horse Racing\\GB"
+        * starts_after/starts_before: datetimes (GMT). only markets with
+          starts_after < event_date < starts_before
+        """
+        values = {"locale": None}
         # set event ids (if req'd)
         if events:
-            temp = ""
-            for event in events:
-                temp += "<int>" + str(event) + "</int>\n"
-            req_xml = self.set_value(req_xml, "<eventTypeIds>\n", temp, "</eventTypeIds>")
+            values["eventTypeIds"] = "\n" + "".join(["<int>" + str(event)
+                + "</int>\n" for event in events])
         else: # unused - remove from request
-            req_xml = self.remove_string(req_xml, "<eventTypeIds>", "</eventTypeIds>\n")
+            values["eventTypeIds"] = None
         # set from/to dates
         if hours:
             # get current time in GMT/UTC (betfair server is GMT)
-            now_gmt = self.API_TIMESTAMP
-            if not now_gmt:
-                now_gmt = datetime.datetime.utcnow()
+            now_gmt = self.clock.server_now()
             from_date = now_gmt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
             if include_started: from_date = "null"
             to_date = (now_gmt + datetime.timedelta(hours = hours)
                 ).strftime("%Y-%m-%dT%H:%M:%S.000Z")
-            req_xml = self.set_value(req_xml, "<fromDate>", from_date,
-                "</fromDate>")
-            req_xml = self.set_value(req_xml, "<toDate>", to_date, "</toDate>")
+            values["fromDate"] = from_date
+            values["toDate"] = to_date
         else: # unused - remove from request
-            req_xml = self.remove_string(req_xml, "<fromDate>", "</toDate>\n")
+            values["fromDate"] = values["toDate"] = None
         # set country codes
         if countries and type(countries) is list:
-            temp = ""
-            for country in countries:
-                temp += "<Country>" + country + "</Country>\n"
-            req_xml = self.set_value(req_xml, "<countries>\n", temp, "</countries>")
+            values["countries"] = "\n" + "".join(["<Country>" + country
+                + "</Country>\n" for country in countries])
         else:
             # unused - remove from request
-            req_xml = self.remove_string(req_xml, "<countries>", "</countries>\n")
+            values["countries"] = None
+        req_xml = self.__build_request(self.exchange, "getAllMarkets", **values)
         # send request/check response
         resp_xml = self.__send_request(False, req_xml, "getAllMarkets")
-        resp_xml = resp_xml.replace("\:", "") # remove escaped delimiter
-        resp_xml = resp_xml.replace("\~", "") # remove escaped delimiter
         resp_code = self.get_value(resp_xml, "GetAllMarketsErrorEnum'>", "</")
         if resp_code == "OK":
-            data = self.get_value(resp_xml,
-                "<marketData xsi:type='xsd:string'>", "</marketData>")
-            markets = data.split(":")[1:]
-            keys = ["market_id", "market_name", "market_type", "market_status",
-                    "event_date", "menu_path", "event_hierarchy", "bet_delay",
-                    "exchange_id", "country_code", "last_refresh",
-                    "no_of_runners", "no_of_winners", "total_matched",
-                    "bsp_market", "turning_in_play"]
-            ret = []
-            for market in markets:
-                vals = market.split("~")
-                temp = dict(zip(keys, vals))
-                # convert event start date to datetime object
-                if temp.has_key('event_date'):
-                    temp['event_date'] = datetime.datetime.utcfromtimestamp(int(temp['event_date']) / 1000)
-                # convert numbers to floats or ints
-                nums = ["no_of_runners", "no_of_winners", "total_matched"]
-                for k in nums:
-                    try:
-                        temp[k] = int(temp[k])
-                    except:
-                        try:
-                            temp[k] = float(temp[k])
-                        except:
-                            pass
-                ret.append(temp)
-            return ret
+            # slice the payload out in one copy (escaped delimiters are
+            # removed by the parser, and only if there are any)
+            start_tag = "<marketData xsi:type='xsd:string'>"
+            start = resp_xml.find(start_tag) + len(start_tag)
+            data = resp_xml[start:resp_xml.find("</marketData>", start)]
+            return iter_all_markets(data, menu_prefix, None, starts_after,
+                starts_before)
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml,
-                    "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
-            return resp_code
+            return self.__error(resp_code, resp_xml)
 
-    def get_market_prices(self, market_id = "", currency_code = ""):
-        """returns a dict OR an error string"""
-        req_xml = self.templates[self.exchange]["getMarketPricesCompressed"]
-        if currency_code:
-            req_xml = self.set_value(req_xml, "<currencyCode>", currency_code,
-                "</currencyCode>")
-        else: # remove from request (user default currency will be used)
-            req_xml = self.remove_string(req_xml, "<currencyCode>", "</currencyCode>\n")
-        req_xml = self.set_value(req_xml, "<marketId>",
-            market_id, "</marketId>")
+    def get_market_prices(self, market_id = "", currency_code = "", as_book = False):
+        """returns a dict OR an error string
+        * as_book = True returns a numpy backed MarketBook (see book.py)
+          instead of the dict
+        """
+        # no currency code = user default currency will be used
+        req_xml = self.__build_request(self.exchange,
+            "getMarketPricesCompressed", marketId = market_id,
+            currencyCode = currency_code or None)
         resp_xml = self.__send_request(False, req_xml, "getMarketPricesCompressed")
         # check response
         resp_code = self.get_value(resp_xml, "GetMarketPricesErrorEnum'>", "</")
@@ -583,91 +601,25 @@ class API(object):
             # parse response
             prices = self.get_value(resp_xml,
                 "<marketPrices xsi:type='xsd:string'>", "</marketPrices>")
-            prices = prices.replace("\:", "") # remove escaped delimiters
-            rows = prices.split(":")
-            temp_dict = {}
-            for row in rows:
-                if "|" in row:
-                    # this is a runner...
-                    fields = row.split("|")
-                    if len(fields) > 2:
-                        # parse info (fields[0])
-                        keys = ["selection_id", "order_index", "total_matched",
-                                "last_price_matched", "handicap",
-                                "reduction_factor", "vacant", "far_sp",
-                                "near_sp", "actual_sp"]
-                        vals = fields[0].split("~")
-                        runner = dict(zip(keys, vals))
-                        if not runner.has_key("back_prices"):
-                            runner["back_prices"] = []
-                        if not runner.has_key("lay_prices"):
-                            runner["lay_prices"] = []
-                        # parse prices (fields[1+])
-                        keys = ["price", "amount", "type", "depth"]
-                        for i in xrange(1, 3):
-                            # fields[1] = backs, fields[2] = lays
-                            vals = fields[i].split("~")[:-1]
-                            key_count = len(keys)
-                            price_count = len(vals) / key_count
-                            for j in xrange(price_count):
-                                start = j * key_count
-                                stop = start + key_count
-                                temp = dict(zip(keys, vals[start:stop]))
-                                temp["price"] = float(temp["price"])
-                                temp["amount"] = float(temp["amount"])
-                                if i == 1:
-                                    runner["back_prices"].append(temp)
-                                elif i == 2:
-                                    runner["lay_prices"].append(temp)
-                        # convert prices and amounts to floats
-                        floats = ["far_sp", "actual_sp", "last_price_matched",
-                                "near_sp", "total_matched", "reduction_factor"]
-                        for k in runner:
-                            if k in floats:
-                                try:
-                                    runner[k] = float(runner[k])
-                                except:
-                                    pass
-                        # append to market dict
-                        temp_dict["runners"].append(runner)
-                else:
-                    # split market info
-                    keys = ["market_id", "currency", "status", "in_play_delay",
-                            "no_of_winners", "info", "discount_allowed",
-                            "base_rate", "refresh_time", "none_runners",
-                            "bsp_market"]
-                    vals = row.split("~")
-                    temp_dict = dict(zip(keys, vals))
-                    temp_dict["runners"] = []
-                    # convert numbers to floats or ints
-                    nums = ["no_of_winners", "base_rate"]
-                    for k in nums:
-                        try:
-                            temp_dict[k] = int(temp_dict[k])
-                        except:
-                            try:
-                                temp_dict[k] = float(temp_dict[k])
-                            except:
-                                pass
-            return temp_dict
+            if as_book:
+                from book import MarketBook # numpy is only imported when used
+                return MarketBook.from_payload(prices)
+            return parse_market_prices(prices)
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml,
-                    "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+            resp_code = self.__error(resp_code, resp_xml)
         return resp_code
 
-    def get_complete_market_prices(self, market_id = "", currency_code = ""):
-        """returns a dict OR an error string"""
-        req_xml = self.templates[self.exchange]["getCompleteMarketPricesCompressed"]
-        if currency_code:
-            req_xml = self.set_value(req_xml, "<currencyCode>", currency_code,
-                "</currencyCode>")
-        else: # remove from request (user default currency will be used)
-            req_xml = self.remove_string(req_xml, "<currencyCode>", "</currencyCode>\n")
-        req_xml = self.set_value(req_xml, "<marketId>",
-            market_id, "</marketId>")
+    def get_complete_market_prices(self, market_id = "", currency_code = "",
+        as_arrays = False):
+        """returns a dict OR an error string
+        * as_arrays = True returns each runner's "prices" as a numpy structured
+          array with fields price, back_amount, lay_amount, bsp_back_amount and
+          bsp_lay_amount instead of a list of dicts (see book.py)
+        """
+        # no currency code = user default currency will be used
+        req_xml = self.__build_request(self.exchange,
+            "getCompleteMarketPricesCompressed", marketId = market_id,
+            currencyCode = currency_code or None)
         resp_xml = self.__send_request(False, req_xml,
             "getCompleteMarketPricesCompressed")
         # check response code
@@ -678,71 +630,63 @@ class API(object):
             prices = self.get_value(resp_xml,
                 "<completeMarketPrices xsi:type='xsd:string'>",
                 "</completeMarketPrices>")
-            prices = prices.replace("\:", "") # remove escaped delimiters
-            rows = prices.split(":")
-            temp_dict = {}
-            for row in rows:
-                if "|" in row:
-                    # this is a runner...
-                    fields = row.split("|")
-                    if len(fields) > 1:
-                        # parse info (fields[0])
-                        keys = ["selection_id", "order_index", "total_matched",
-                                "last_price_matched", "handicap",
-                                "reduction_factor", "vacant", "asian_line_id",
-                                "far_sp", "near_sp", "actual_sp"]
-                        vals = fields[0].split("~")
-                        runner = dict(zip(keys, vals))
-                        if not runner.has_key("prices"):
-                            runner["prices"] = []
-                        # parse prices (fields[1+])
-                        keys = ["price", "back_amount", "lay_amount",
-                                "bsp_back_amount", "bsp_lay_amount"]
-                        vals = fields[1].split("~")[:-1]
-                        key_count = len(keys)
-                        price_count = len(vals) / key_count
-                        for j in xrange(price_count):
-                            start = j * key_count
-                            stop = start + key_count
-                            temp = dict(zip(keys, vals[start:stop]))
-                            # convert to floats
-                            for k in keys:
-                                temp[k] = float(temp[k])
-                            runner["prices"].append(temp)
-                        # convert to floats
-                        floats = ["far_sp", "actual_sp", "last_price_matched",
-                                "near_sp", "total_matched", "reduction_factor"]
-                        for k in runner:
-                            if k in floats:
-                                try:
-                                    runner[k] = float(runner[k])
-                                except:
-                                    pass
-                        # append to market dict
-                        temp_dict["runners"].append(runner)
-                else:
-                    # split market info
-                    keys = ["market_id", "in_play_delay", "none_runners"]
-                    vals = row.split("~")
-                    temp_dict = dict(zip(keys, vals))
-                    temp_dict["runners"] = []
-            return temp_dict
+            if as_arrays:
+                from book import ladder_array # numpy, see get_market_prices()
+                return parse_complete_market_prices(prices, ladder_array)
+            return parse_complete_market_prices(prices)
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml,
-                    "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+            resp_code = self.__error(resp_code, resp_xml)
             return resp_code
 
+    def get_markets(self, market_ids = None):
+        """batch version of get_market(). requests are sent concurrently.
+        returns a dict of {market_id: market dict OR error string}"""
+        return self.__fan_out(self.get_market, market_ids)
+
+    def get_markets_prices(self, market_ids = None, currency_code = "",
+        as_book = False):
+        """batch version of get_market_prices(). requests are sent
+        concurrently (within the rate limits of API_T).
+        returns a dict of {market_id: prices dict/MarketBook OR error string}"""
+        return self.__fan_out(lambda market_id: self.get_market_prices(
+            market_id, currency_code, as_book), market_ids)
+
+    def get_markets_traded_volume(self, market_ids = None, currency_code = ""):
+        """batch version of get_market_traded_volume().
+        returns a dict of {market_id: runners list OR error string}"""
+        return self.__fan_out(lambda market_id: self.get_market_traded_volume(
+            market_id, currency_code), market_ids)
+
+    def __fan_out(self, method, market_ids):
+        """calls method(market_id) for every market (or other key, e.g. a
+        page start) on the worker pool and collects the results by key.
+        failures are returned as Errors (never raised, even with raise_errors
+        set) so one bad market does not lose the others"""
+        if not market_ids:
+            return {}
+        if self.__workers is None:
+            with self.__workers_lock: # one pool, however many threads get here
+                if self.__workers is None:
+                    self.__workers = WorkerPool(self.batch_workers)
+        futures = [(market_id, self.__workers.submit(method, market_id))
+            for market_id in market_ids]
+        results = {}
+        for market_id, future in futures:
+            try:
+                results[market_id] = future.result()
+            except APIError, e:
+                results[market_id] = e.error
+            except Exception, e:
+                results[market_id] = Error("ERROR",
+                    text = "ERROR: %s(%s)" % (type(e).__name__, e))
+        return results
+
     def get_market_traded_volume(self, market_id = "", currency_code = ""):
         """returns a list of runners and price/volume data OR an error string"""
-        req_xml = self.templates[self.exchange]["getMarketTradedVolumeCompressed"]
-        if currency_code:
-            req_xml = self.set_value(req_xml, "<currencyCode>", currency_code, "</currencyCode>")
-        else: # remove from request (user default currency will be used)
-            req_xml = self.remove_string(req_xml, "<currencyCode>", "</currencyCode>\n")
-        req_xml = self.set_value(req_xml, "<marketId>", market_id, "</marketId>")
+        # no currency code = user default currency will be used
+        req_xml = self.__build_request(self.exchange,
+            "getMarketTradedVolumeCompressed", marketId = market_id,
+            currencyCode = currency_code or None)
         resp_xml = self.__send_request(False, req_xml, "getMarketTradedVolumeCompressed")
         # check response
         resp_code = self.get_value(resp_xml, "GetMarketTradedVolumeCompressedErrorEnum'>", "</")
@@ -770,10 +714,7 @@ class API(object):
                 temp_list.append(temp_dict)
             return temp_list
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml, "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+            resp_code = self.__error(resp_code, resp_xml)
         return resp_code
 
     def place_bets(self, bets = None):
@@ -797,28 +738,11 @@ class API(object):
         """
         if bets and type(bets) is list:
             # build PlaceBets array string
-            temp = ""
-            for bet in bets:
-                temp += "<PlaceBets>\n"
-                temp += "<marketId>" + bet["marketId"] + "</marketId>\n"
-                temp += "<selectionId>" + bet["selectionId"] \
-                    + "</selectionId>\n"
-                temp += "<betType>" + bet["betType"] + "</betType>\n"
-                temp += "<price>" + bet["price"] + "</price>\n"
-                temp += "<size>" + bet["size"] + "</size>\n"
-                temp += "<betCategoryType>" + bet["betCategoryType"] \
-                    + "</betCategoryType>\n"
-                temp += "<betPersistenceType>" + bet["betPersistenceType"] \
-                    + "</betPersistenceType>\n"
-                temp += "<bspLiability>" + bet["bspLiability"] \
-                    + "</bspLiability>\n"
-                temp += "<asianLineId>" + bet["asianLineId"] \
-                    + "</asianLineId>\n"
-                temp += "</PlaceBets>\n"
+            temp = "".join([PLACE_BETS_XML % bet for bet in bets])
             # send request
             if temp:
-                req_xml = self.templates[self.exchange]["placeBets"]
-                req_xml = self.set_value(req_xml, "<bets>", temp, "</bets>")
+                req_xml = self.__build_request(self.exchange, "placeBets",
+                    bets = temp)
                 resp_xml = self.__send_request(False, req_xml, "placeBets")
                 resp_code = self.get_value(resp_xml, "PlaceBetsErrorEnum'>", "</")
                 if resp_code == "OK":
@@ -846,15 +770,10 @@ class API(object):
                             })
                     return temp
                 else:
-                    if resp_code == "API_ERROR":
-                        resp_code += ": " + self.get_value(resp_xml,
-                            "<errorCode xsi:type='n2:APIErrorEnum'>",
-                            "</errorCode>")
-                    elif resp_code == '':
-                        resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+                    resp_code = self.__error(resp_code, resp_xml)
                 return resp_code
         else:
-            return "place_bets() ERROR: no bets supplied!"
+            return self.__invalid("place_bets() ERROR: no bets supplied!")
         return None
 
     def update_bets(self, bets = None):
@@ -875,8 +794,7 @@ class API(object):
           100 at odds of 2.0.
         """
         if bets:
-            req_xml = self.templates[self.exchange]["updateBets"]
-            temp = ""
+            temp = []
             for bet in bets:
                 # are we trying to change size AND price?
                 if (bet["oldPrice"] != bet["newPrice"]
@@ -890,21 +808,10 @@ class API(object):
                     resp2 = self.update_bets([bet2])
                     return (resp1, resp2)
                 else:
-                    temp += "<UpdateBets>\n"
-                    temp += "<betId>" + bet["betId"] + "</betId>\n"
-                    temp += "<oldPrice>" + bet["oldPrice"] + "</oldPrice>\n"
-                    temp += "<newPrice>" + bet["newPrice"] + "</newPrice>\n"
-                    temp += "<oldSize>" + bet["oldSize"] + "</oldSize>\n"
-                    temp += "<newSize>" + bet["newSize"] + "</newSize>\n"
-                    temp += "<oldBetPersistenceType>" \
-                        + bet["oldBetPersistenceType"] \
-                        + "</oldBetPersistenceType>\n"
-                    temp += "<newBetPersistenceType>" \
-                        + bet["newBetPersistenceType"] \
-                        + "</newBetPersistenceType>\n"
-                    temp += "</UpdateBets>\n"
+                    temp.append(UPDATE_BETS_XML % bet)
             if temp:
-                req_xml = self.set_value(req_xml, "<bets>", temp, "</bets>")
+                req_xml = self.__build_request(self.exchange, "updateBets",
+                    bets = "".join(temp))
                 resp_xml = self.__send_request(False, req_xml, "updateBets")
                 resp_code = self.get_value(resp_xml,
                     "UpdateBetsErrorEnum'>", "</")
@@ -937,15 +844,10 @@ class API(object):
                                 })
                     return temp
                 else:
-                    if resp_code == "API_ERROR":
-                        resp_code += ": " + self.get_value(resp_xml,
-                            "<errorCode xsi:type='n2:APIErrorEnum'>",
-                            "</errorCode>")
-                    elif resp_code == '':
-                        resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+                    resp_code = self.__error(resp_code, resp_xml)
                 return resp_code
         else:
-            return "update_bets() ERROR: no bets supplied!"
+            return self.__invalid("update_bets() ERROR: no bets supplied!")
         return None
 
     def cancel_bets(self, bet_ids = None):
@@ -954,31 +856,26 @@ class API(object):
         """
         if bet_ids:
             if len(bet_ids) <= 40:
-                req_xml = self.templates[self.exchange]["cancelBets"]
-                ids = ""
-                for bid in bet_ids:
-                    ids += "<CancelBets><betId>" + bid \
-                        + "</betId></CancelBets>\n"
-                req_xml = self.set_value(req_xml, "<bets>\n", ids, "</bets>")
+                ids = "".join(["<CancelBets><betId>" + bid
+                    + "</betId></CancelBets>\n" for bid in bet_ids])
+                req_xml = self.__build_request(self.exchange, "cancelBets",
+                    bets = "\n" + ids)
                 resp_xml = self.__send_request(False, req_xml, "cancelBets")
                 resp_code = self.get_value(resp_xml,
                     "CancelBetsErrorEnum'>", "</")
-                if resp_code == "API_ERROR":
-                    resp_code += ": " + self.get_value(resp_xml,
-                        "<errorCode xsi:type='n2:APIErrorEnum'>",
-                        "</errorCode>")
-                elif resp_code == '':
-                    resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+                if resp_code != "OK":
+                    resp_code = self.__error(resp_code, resp_xml)
                 return resp_code
             else:
-                return "ERROR: too many bet ids! (max = 40)"
+                return self.__invalid("ERROR: too many bet ids! (max = 40)")
         else:
-            return "ERROR: no bet ids specified!"
+            return self.__invalid("ERROR: no bet ids specified!")
         return None
 
     def get_mu_bets(self, market_id = "0", status = "MU",
         order_by = "PLACED_DATE", sort_order = "ASC",
-        record_count = "200", start_record = "0"):
+        record_count = "200", start_record = "0", matched_since = None,
+        exclude_last_second = False):
         """return all current matched/unmatched bets as a LIST.
         * market_id = market id OR "0"
         * status = "M", "U" or "MU"
@@ -987,24 +884,48 @@ class API(object):
         * record_count = (string) integer. Number of records to return.
           200 is maximum limit.
         * start_record = (string) integer. Start record. Count starts at zero.
+        * matched_since = datetime object (GMT). only returns bets matched
+          since then. betfair requires status = "M" and
+          order_by = "MATCHED_DATE" with this.
+        * exclude_last_second = True leaves out bets matched during the last
+          second, which may not all be visible yet (use with matched_since)
+        see get_all_mu_bets() for more than 200 bets.
+        """
+        page = self.get_mu_bets_page(market_id, status, order_by, sort_order,
+            record_count, start_record, matched_since, exclude_last_second)
+        if type(page) is dict:
+            return page["bets"]
+        return page
+
+    def get_mu_bets_page(self, market_id = "0", status = "MU",
+        order_by = "PLACED_DATE", sort_order = "ASC",
+        record_count = "200", start_record = "0", matched_since = None,
+        exclude_last_second = False):
+        """returns a 2 part dict. Key ["total_record_count"] is the total
+        number of bets matching the query and key ["bets"] is the LIST of bets
+        from start_record on (see get_mu_bets() for the parameters)
         """
         if market_id:
-            req_xml = self.templates[self.exchange]["getMUBets"]
-            # remove none-mandatory fields (can be implemented if REALLY needed)
-            req_xml = self.remove_string(req_xml, "<betIds>", "</betIds>\n")
-            req_xml = self.remove_string(req_xml, "<matchedSince>", "</matchedSince>\n")
-            req_xml = self.remove_string(req_xml, "<excludeLastSecond>", "</excludeLastSecond>\n")
-            # set values
-            req_xml = self.set_value(req_xml, "<marketId>", market_id, "</marketId>")
-            req_xml = self.set_value(req_xml, "<betStatus>", status, "</betStatus>")
-            req_xml = self.set_value(req_xml, "<orderBy>", order_by, "</orderBy>")
-            req_xml = self.set_value(req_xml, "<sortOrder>", sort_order, "</sortOrder>")
-            req_xml = self.set_value(req_xml, "<recordCount>", record_count, "</recordCount>")
-            req_xml = self.set_value(req_xml, "<startRecord>", start_record, "</startRecord>")
+            if matched_since is not None:
+                matched_since = matched_since.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+                exclude_last_second = exclude_last_second and "true" or "false"
+            else: # not used - remove from request
+                exclude_last_second = None
+            req_xml = self.__build_request(self.exchange, "getMUBets",
+                # remove none-mandatory fields (can be implemented if REALLY needed)
+                betIds = None, matchedSince = matched_since,
+                excludeLastSecond = exclude_last_second,
+                # set values
+                marketId = market_id, betStatus = status, orderBy = order_by,
+                sortOrder = sort_order, recordCount = str(record_count),
+                startRecord = str(start_record))
             # get response
             resp_xml = self.__send_request(False, req_xml, "getMUBets")
             resp_code = self.get_value(resp_xml, "GetMUBetsErrorEnum'>", "</")
             if resp_code == "OK":
+                total_record_count = int(self.get_value(resp_xml,
+                    "<totalRecordCount xsi:type='xsd:int'>",
+                    "</totalRecordCount>") or 0)
                 # loop through bets and build return
                 bets_list = []
                 resp_xml = self.get_value(resp_xml, "ArrayOfMUBet'>", "</bets>")
@@ -1021,24 +942,49 @@ class API(object):
                                 val = float(val)
                             temp[key] = val
                     bets_list.append(temp)
-                return bets_list
+                return {"total_record_count": total_record_count,
+                    "bets": bets_list}
             else:
-                if resp_code == "API_ERROR":
-                    resp_code += ": " + self.get_value(resp_xml,
-                        "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-                elif resp_code == '':
-                    resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+                resp_code = self.__error(resp_code, resp_xml)
             return resp_code
         else:
-            return "ERROR: market_id should be a string integer. market_id given = " + market_id
+            return self.__invalid("ERROR: market_id should be a string integer. market_id given = " + market_id)
+
+    def get_all_mu_bets(self, market_id = "0", status = "MU",
+        order_by = "PLACED_DATE", sort_order = "ASC", matched_since = None,
+        exclude_last_second = False):
+        """get_mu_bets() without the 200 record limit. the first page gives
+        the total record count, then the remaining pages are requested
+        concurrently. returns a LIST of bets OR an error string (including
+        "NO_RESULTS")
+        """
+        page = self.get_mu_bets_page(market_id, status, order_by, sort_order,
+            MU_BETS_PAGE, 0, matched_since, exclude_last_second)
+        if type(page) is not dict:
+            return page
+        bets = page["bets"]
+        starts = range(MU_BETS_PAGE, page["total_record_count"], MU_BETS_PAGE)
+        if starts:
+            pages = self.__fan_out(lambda start: self.get_mu_bets_page(
+                market_id, status, order_by, sort_order, MU_BETS_PAGE, start,
+                matched_since, exclude_last_second), starts)
+            for start in starts:
+                page = pages[start]
+                if type(page) is not dict:
+                    if page == "NO_RESULTS":
+                        break # bets went away while paging
+                    if self.raise_errors:
+                        raise page.exception()
+                    return page
+                bets.extend(page["bets"])
+        return bets
 
     def get_market_profit_and_loss(self, market_id = ""):
         """returns P&L for given market"""
         if market_id:
-            req_xml = self.templates[self.exchange]["getMarketProfitAndLoss"]
             # NOTE: <marketID> for this call but <marketId> for all others!!
-            req_xml = self.set_value(req_xml, "<marketID>", market_id, "</marketID>")
-            req_xml = self.remove_string(req_xml, "<locale>", "</locale>\n")
+            req_xml = self.__build_request(self.exchange,
+                "getMarketProfitAndLoss", marketID = market_id, locale = None)
             resp_xml = self.__send_request(False, req_xml, "getMarketProfitAndLoss")
             resp_code = self.get_value(resp_xml,
                 "GetMarketProfitAndLossErrorEnum'>", "</")
@@ -1063,11 +1009,7 @@ class API(object):
                     pl_list.append(temp)
                 return pl_list
             else:
-                if resp_code == "API_ERROR":
-                    resp_code += ": " + self.get_value(resp_xml,
-                        "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-                elif resp_code == '':
-                    resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+                resp_code = self.__error(resp_code, resp_xml)
                 return resp_code
 
     def __get_bet_history(self, bet_types_included = "S", detailed = "false",
@@ -1106,46 +1048,30 @@ class API(object):
         else:
             market_id = "0"
             if type(event_type_ids) is not list:
-                return "ERROR: event_type_ids should be a list!"
+                return self.__invalid("ERROR: event_type_ids should be a list!")
         if type(market_types_included) is not list:
-            return "ERROR: market_types_included should be a list!"
+            return self.__invalid("ERROR: market_types_included should be a list!")
         if type(placed_date_from) is not datetime.datetime:
-            return "ERROR: placed_date_from must be specified."
+            return self.__invalid("ERROR: placed_date_from must be specified.")
         if type(placed_date_to) is not datetime.datetime:
-            return "ERROR: placed_date_to must be specified."
+            return self.__invalid("ERROR: placed_date_to must be specified.")
         # build xml request string
-        req_xml = self.templates[self.exchange]["getBetHistory"]
-        req_xml = self.remove_string(req_xml, "<locale>", "</locale>\n")
-        req_xml = self.remove_string(req_xml, "<timezone>", "</timezone>\n")
-        req_xml = self.set_value(req_xml, "<betTypesIncluded>",
-            bet_types_included, "</betTypesIncluded>")
-        req_xml = self.set_value(req_xml, "<detailed>", detailed, "</detailed>")
-        temp = "\n"
-        for event_id in event_type_ids:
-            temp += "<int>" + str(event_id) + "</int>\n"
-        req_xml = self.set_value(req_xml, "<eventTypeIds>", temp,
-            "</eventTypeIds")
-        temp = "\n"
-        for market_type in market_types_included:
-            temp += "<MarketTypeEnum>" + market_type + "</MarketTypeEnum>\n"
-        req_xml = self.set_value(req_xml, "<marketTypesIncluded>", temp,
-            "</marketTypesIncluded>")
+        event_ids = "\n" + "".join(["<int>" + str(event_id) + "</int>\n"
+            for event_id in event_type_ids])
+        market_types = "\n" + "".join(["<MarketTypeEnum>" + market_type
+            + "</MarketTypeEnum>\n" for market_type in market_types_included])
         # (set dates)
         from_date = placed_date_from.strftime("%Y-%m-%dT%H:%M:%S.000Z")
         to_date = placed_date_to.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-        req_xml = self.set_value(req_xml, "<placedDateFrom>", from_date,
-            "</placedDateFrom>")
-        req_xml = self.set_value(req_xml, "<placedDateTo>", to_date,
-            "</placedDateTo>")
-        # (record sorting/counts)
-        req_xml = self.set_value(req_xml, "<recordCount>", '100',
-            "</recordCount>") # (max No. of records to return)
-        req_xml = self.set_value(req_xml, "<sortBetsBy>", sort_bets_by,
-            "</sortBetsBy>")
-        req_xml = self.set_value(req_xml, "<startRecord>", str(start_record),
-            "</startRecord>")
-        req_xml = self.set_value(req_xml, "<marketId>", str(market_id),
-            "</marketId>")
+        req_xml = self.__build_request(self.exchange, "getBetHistory",
+            locale = None, timezone = None,
+            betTypesIncluded = bet_types_included, detailed = detailed,
+            eventTypeIds = event_ids, marketTypesIncluded = market_types,
+            placedDateFrom = from_date, placedDateTo = to_date,
+            # (record sorting/counts)
+            recordCount = "100", # (max No. of records to return)
+            sortBetsBy = sort_bets_by, startRecord = str(start_record),
+            marketId = str(market_id))
         # send request
         resp_xml = self.__send_request(False, req_xml, "getBetHistory")
         resp_code = self.get_value(resp_xml, "GetBetHistoryErrorEnum'>", "</")
@@ -1169,11 +1095,7 @@ class API(object):
                 records['bets'].append(temp)
             return records
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml,
-                    "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+            resp_code = self.__error(resp_code, resp_xml)
         return resp_code
 
     def get_bet_history(self, bet_types_included = "S", detailed = "false",
@@ -1208,7 +1130,8 @@ class API(object):
         elif records == 'NO_RESULTS':
             return records
         else:
-            return "ERROR in get_bet_history(): type(records) is not a dict..." + str(records)
+            return Error(records.code, records.reason, records.response,
+                "ERROR in get_bet_history(): type(records) is not a dict..." + records)
 
     def get_account_statement(self, start_date = None, end_date = None):
         """get account statement/history.
@@ -1227,20 +1150,16 @@ class API(object):
         # check input values
         gmt_now = datetime.datetime.utcnow()
         if type(start_date) is not datetime.datetime:
-            return "ERROR in get_account_statement(): start_date must be a datetime object."
+            return self.__invalid("ERROR in get_account_statement(): start_date must be a datetime object.")
         if type(end_date) is not datetime.datetime:
-            return "ERROR in get_account_statement(): end_date must be a datetime object."
+            return self.__invalid("ERROR in get_account_statement(): end_date must be a datetime object.")
         # create request xml
-        req_xml = self.templates[self.exchange]["getAccountStatement"]
-        req_xml = self.remove_string(req_xml, "<locale>", "</locale>\n")
         from_date = start_date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
         to_date = end_date.strftime("%Y-%m-%dT%H:%M:%S.000Z")
-        req_xml = self.set_value(req_xml, "<startDate>", from_date, "</startDate>")
-        req_xml = self.set_value(req_xml, "<endDate>", to_date, "</endDate>")
-        req_xml = self.set_value(req_xml, "<startRecord>", "0", "</startRecord>")
-        req_xml = self.set_value(req_xml, "<recordCount>", "99999", "</recordCount>")
-        req_xml = self.set_value(req_xml, "<itemsIncluded>", "ALL", "</itemsIncluded>")
-        req_xml = self.set_value(req_xml, "<ignoreAutoTransfers>", "false", "</ignoreAutoTransfers>")
+        req_xml = self.__build_request(self.exchange, "getAccountStatement",
+            locale = None, startDate = from_date, endDate = to_date,
+            startRecord = "0", recordCount = "99999", itemsIncluded = "ALL",
+            ignoreAutoTransfers = "false")
         # send request
         resp_xml = self.__send_request(False, req_xml, "getAccountStatement")
         resp_code = self.get_value(resp_xml, "GetAccountStatementErrorEnum'>", "</")
@@ -1262,11 +1181,7 @@ class API(object):
                 records.append(temp)
             return records
         else:
-            if resp_code == "API_ERROR":
-                resp_code += ": " + self.get_value(resp_xml,
-                    "<errorCode xsi:type='n2:APIErrorEnum'>", "</errorCode>")
-            elif resp_code == '':
-                resp_code = "SERVER_RESPONSE_ERROR: Response XML = " + resp_xml
+            resp_code = self.__error(resp_code, resp_xml)
         return resp_code
 
     def get_value(self, xml = "", start_tag = "", end_tag = ""):
@@ -1340,23 +1255,15 @@ class API(object):
                     open(fp + fn, "w").write(xml)
 
     def __load_templates(self):
-        """loads the raw XML templates/strings into a static Dictionary
-        * look-up Key is the equivalent "Soap Action" string
+        """points self.templates at the shared, lazily loaded templates
+        * look-up Key is the service ("global", "uk" or "aus"), then the
+          equivalent "Soap Action" string
+        * each template is read from disk and wrapped in a RequestTemplate
+          the first time any API instance uses it (see template.py)
         * memory footprint is low - loading EVERY request is less than 80KB
         """
-        root_path = self.abs_path + "/templates/"
-        if os.path.exists(root_path):
-            for folder in os.listdir(root_path):
-                if self.templates.has_key(folder):
-                    fp = root_path + folder + "/"
-                    for file_name in os.listdir(fp):
-                        if file_name.endswith(".req.xml"):
-                            soap_action = file_name.split(".")[1]
-                            xml = open(fp + file_name, "r").read()
-                            self.templates[folder][soap_action] = xml
-        else:
+        if not os.path.exists(TEMPLATES_PATH):
             # templates do not exist so build them!
             self.__make_templates()
-            self.__load_templates()
-
-
+        self.templates = dict((service, shared_templates(service))
+            for service in ("global", "uk", "aus"))
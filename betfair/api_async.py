@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+Non-blocking variant of the betfair API wrapper.
+
+API_A exposes the same request methods as API, but each call is handed to a
+pool of worker threads and returns a Future straight away. The request
+templates, http transport and response parsing are those of the wrapped API
+instance, so results are identical to the blocking calls.
+
+EXAMPLE:
+    client = API_A("uk", workers = 32)
+    client.login(username, password).result()
+    futures = [client.get_market_prices(m) for m in market_ids]
+    for market_id, f in zip(market_ids, futures):
+        prices = f.result()
+
+NOTE: python 2 has no asyncio, hence threads + futures. The requests spend
+nearly all their time waiting on the network, so the GIL is not a concern.
+"""
+
+from api import API
+from http import Http, ConnectionPool
+from workers import WorkerPool, wait_all
+
+# API methods that talk to betfair and are therefore run on the worker pool
+ASYNC_METHODS = ["login", "keep_alive", "logout", "get_account_funds",
+    "get_active_event_types", "get_all_event_types", "get_market",
+    "get_all_markets", "get_market_prices", "get_complete_market_prices",
+    "get_market_traded_volume", "place_bets", "update_bets", "cancel_bets",
+    "get_mu_bets", "get_market_profit_and_loss", "get_bet_history",
+    "get_account_statement"]
+
+
+def _async_method(name):
+    def method(self, *args, **kwargs):
+        return self.pool.submit(getattr(self.api, name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = "returns a Future. see API.%s()" % name
+    return method
+
+
+class API_A(object):
+    """betfair API library returning Futures.
+    * "api" can be an existing API or API_T instance to wrap (e.g. to share a
+      session). by default a new API is created with its own connection pool
+      large enough to serve every worker concurrently.
+    * local helpers such as set_betfair_odds() are passed through unchanged.
+    """
+    def __init__(self, exchange = "uk", workers = 16, api = None):
+        if api is None:
+            api = API(exchange)
+            api.http = Http(pool = ConnectionPool(size = workers))
+        self.api = api
+        self.pool = WorkerPool(workers)
+
+    def __getattr__(self, name):
+        # only called for attributes not found normally, i.e. non-request
+        # methods and attributes such as API_TIMESTAMP or session_token
+        if name == "api":
+            raise AttributeError(name)
+        return getattr(self.api, name)
+
+    def gather(self, futures, timeout = None):
+        """waits for futures and returns their results in order"""
+        return wait_all(futures, timeout)
+
+    def shutdown(self, wait = True):
+        """stops the worker threads"""
+        self.pool.shutdown(wait)
+
+for _name in ASYNC_METHODS:
+    setattr(API_A, _name, _async_method(_name))
+del _name
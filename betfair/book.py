@@ -0,0 +1,170 @@
+"""
+Array-backed order book for getMarketPricesCompressed snapshots, and
+structured array ladders for getCompleteMarketPricesCompressed.
+
+get_market_prices(market_id, as_book = True) returns a MarketBook instead of
+the usual dict of lists of dicts. Prices and sizes are held in fixed-depth
+(runners x depth) float matrices, NaN where there is no offer, so top of book,
+implied probabilities and overround are single vectorised expressions.
+
+get_complete_market_prices(market_id, as_arrays = True) returns each runner's
+"prices" ladder as a structured array (one record per rung) instead of a list
+of five-key dicts.
+
+Requires numpy, which the rest of the betfair package does not.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from parsers import MARKET_PRICES_FIELDS, LADDER_FIELDS, to_number
+
+DEPTH = 3 # getMarketPricesCompressed returns the best 3 prices each side
+
+if np is not None:
+    LADDER_DTYPE = np.dtype([(k, np.float64) for k in LADDER_FIELDS])
+
+
+def ladder_array(field):
+    """parses a getCompleteMarketPricesCompressed ladder field
+    ('price~back~lay~bsp_back~bsp_lay~' repeated) straight into a structured
+    array with LADDER_FIELDS, without building any intermediate strings"""
+    if np is None:
+        raise ImportError("ladder_array requires numpy")
+    vals = np.fromstring(field, sep = "~")
+    return vals[:len(vals) // 5 * 5].view(LADDER_DTYPE)
+
+
+class MarketBook(object):
+    """snapshot of one market.
+    * selection_ids, last_price_matched, total_matched: 1-d arrays, one entry
+      per runner in the order betfair returned them
+    * back_prices, back_sizes, lay_prices, lay_sizes: (runners x depth)
+      arrays, column 0 is the best price
+    * info: dict of the market level fields (market_id, status, ...)
+    """
+    def __init__(self, info, selection_ids, last_price_matched, total_matched,
+        back_prices, back_sizes, lay_prices, lay_sizes):
+        self.info = info
+        self.selection_ids = selection_ids
+        self.last_price_matched = last_price_matched
+        self.total_matched = total_matched
+        self.back_prices = back_prices
+        self.back_sizes = back_sizes
+        self.lay_prices = lay_prices
+        self.lay_sizes = lay_sizes
+        self._index = None
+
+    @property
+    def market_id(self):
+        return self.info.get("market_id")
+
+    @property
+    def status(self):
+        return self.info.get("status")
+
+    def __len__(self):
+        return len(self.selection_ids)
+
+    def index(self, selection_id):
+        """row number of selection_id (str or int) or KeyError"""
+        if self._index is None:
+            self._index = dict((sid, i) for i, sid in enumerate(self.selection_ids.tolist()))
+        return self._index[int(selection_id)]
+
+    def best_back(self):
+        """(prices, sizes) of the best back offer per runner"""
+        return self.back_prices[:, 0], self.back_sizes[:, 0]
+
+    def best_lay(self):
+        """(prices, sizes) of the best lay offer per runner"""
+        return self.lay_prices[:, 0], self.lay_sizes[:, 0]
+
+    def implied_probabilities(self, side = "back", normalise = True):
+        """1 / best price per runner (0 where there is no price). normalised to
+        sum to 1 unless normalise = False"""
+        prices = self.back_prices[:, 0] if side == "back" else self.lay_prices[:, 0]
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            p = np.where(np.isnan(prices), 0.0, 1.0 / prices)
+        if normalise:
+            total = p.sum()
+            if total > 0:
+                p /= total
+        return p
+
+    def overround(self, side = "back"):
+        """sum of the implied probabilities of the best prices (1.0 = fair book)"""
+        return self.implied_probabilities(side, normalise = False).sum()
+
+    @classmethod
+    def from_payload(cls, prices, depth = DEPTH):
+        """parses a <marketPrices> payload straight into arrays"""
+        if np is None:
+            raise ImportError("MarketBook requires numpy")
+        if "\:" in prices:
+            prices = prices.replace("\:", "") # remove escaped delimiters
+        rows = prices.split(":")
+        info = {}
+        runners = []
+        for row in rows:
+            if "|" in row:
+                fields = row.split("|")
+                if len(fields) > 2:
+                    runners.append(fields)
+            else:
+                info = dict(zip(MARKET_PRICES_FIELDS, row.split("~")))
+                for k in ("no_of_winners", "base_rate"):
+                    if k in info:
+                        info[k] = to_number(info[k])
+        n = len(runners)
+        selection_ids = np.zeros(n, dtype = np.int64)
+        ltp = np.empty(n)
+        matched = np.empty(n)
+        books = np.empty((4, n, depth))
+        books.fill(np.nan)
+        for i, fields in enumerate(runners):
+            vals = fields[0].split("~")
+            selection_ids[i] = int(vals[0])
+            ltp[i] = _float(vals[3]) if len(vals) > 3 else np.nan
+            matched[i] = _float(vals[2]) if len(vals) > 2 else np.nan
+            for side in (0, 1):
+                levels = fields[side + 1].split("~")
+                count = min((len(levels) - 1) // 4, depth)
+                for d in xrange(count):
+                    books[2 * side, i, d] = float(levels[4 * d])
+                    books[2 * side + 1, i, d] = float(levels[4 * d + 1])
+        return cls(info, selection_ids, ltp, matched,
+            books[0], books[1], books[2], books[3])
+
+    @classmethod
+    def from_prices(cls, market, depth = DEPTH):
+        """builds a MarketBook from a get_market_prices() dict"""
+        if np is None:
+            raise ImportError("MarketBook requires numpy")
+        runners = market["runners"]
+        n = len(runners)
+        info = dict((k, v) for k, v in market.items() if k != "runners")
+        selection_ids = np.array([int(r["selection_id"]) for r in runners], dtype = np.int64)
+        ltp = np.array([_float(r.get("last_price_matched", "")) for r in runners])
+        matched = np.array([_float(r.get("total_matched", "")) for r in runners])
+        books = np.empty((4, n, depth))
+        books.fill(np.nan)
+        for i, r in enumerate(runners):
+            for side, key in ((0, "back_prices"), (1, "lay_prices")):
+                for d, level in enumerate(r[key][:depth]):
+                    books[2 * side, i, d] = level["price"]
+                    books[2 * side + 1, i, d] = level["amount"]
+        return cls(info, selection_ids, ltp, matched,
+            books[0], books[1], books[2], books[3])
+
+
+def _float(val):
+    """float(val) or NaN for empty/invalid fields"""
+    if isinstance(val, float):
+        return val
+    try:
+        return float(val)
+    except ValueError:
+        return float("nan")
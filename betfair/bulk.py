@@ -0,0 +1,154 @@
+"""
+Bulk order submission on top of API.place_bets(), update_bets() and
+cancel_bets().
+
+Betfair limits the number of bets per call (see MAX_BETS) and each call is a
+full round trip, so requoting a 20 runner book one call after another takes
+as long as all the round trips together. BulkOrders splits any number of
+bets into chunks within the limits, sends the chunks concurrently and merges
+the responses back into input order:
+
+    bulk = BulkOrders(api)
+    resp = bulk.place_bets(bets)
+    resp["results"] # one result per bet, in the order of bets
+    resp["chunks"] # one entry per request: start, count, secs, error
+
+* a chunk that fails gives every bet in it the chunk's error string, the
+  other chunks are unaffected
+* requests still go through the api's rate limiter (API_T)
+* requote() cancels and then places, e.g. to move a whole book in one step
+"""
+
+import threading
+import time
+
+from errors import Error, APIError
+from workers import WorkerPool
+
+# bets per call allowed by betfair
+MAX_BETS = {
+    "place_bets": 60,
+    "update_bets": 15,
+    "cancel_bets": 40,
+}
+
+WORKERS = 8
+
+
+class BulkOrders(object):
+    """chunks, dispatches concurrently and merges bet calls.
+    * api: an API instance (or API_T, CachedAPI, ...)
+    * workers: requests in flight at once
+    * max_bets: {method name: bets per call} merged over MAX_BETS
+    """
+    def __init__(self, api, workers = WORKERS, max_bets = None):
+        self.api = api
+        self.workers = workers
+        self.max_bets = dict(MAX_BETS)
+        self.max_bets.update(max_bets or {})
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def place_bets(self, bets):
+        """api.place_bets() for any number of bets. returns a 2 part dict:
+        ["results"] = one bet response dict (or error string) per bet and
+        ["chunks"] = per request timings, see BulkOrders.__dispatch()"""
+        return self.__dispatch("place_bets", self.api.place_bets, bets)
+
+    def cancel_bets(self, bet_ids):
+        """api.cancel_bets() for any number of bet ids. ["results"] holds
+        the response code of each bet's request ("OK" or an error string)"""
+        return self.__dispatch("cancel_bets", self.api.cancel_bets, bet_ids,
+            per_chunk = True)
+
+    def update_bets(self, bets):
+        """api.update_bets() for any number of bets (see update_bets() for
+        the bet dicts). bets changing both price and size are updated in two
+        rounds, size first, as API.update_bets() does; their result is a
+        tuple of (size result, price result)"""
+        first, second = [], [] # (input index, bet)
+        for i, bet in enumerate(bets):
+            if (bet["oldPrice"] != bet["newPrice"]
+                and bet["oldSize"] != bet["newSize"]):
+                size_bet = bet.copy()
+                size_bet["newPrice"] = size_bet["oldPrice"]
+                price_bet = bet.copy()
+                price_bet["oldSize"] = price_bet["newSize"]
+                first.append((i, size_bet))
+                second.append((i, price_bet))
+            else:
+                first.append((i, bet))
+        resp = self.__dispatch("update_bets", self.api.update_bets,
+            [bet for i, bet in first])
+        results = [None] * len(bets)
+        for (i, bet), result in zip(first, resp["results"]):
+            results[i] = result
+        if second:
+            more = self.__dispatch("update_bets", self.api.update_bets,
+                [bet for i, bet in second])
+            for (i, bet), result in zip(second, more["results"]):
+                results[i] = (results[i], result)
+            resp["chunks"] += more["chunks"]
+        resp["results"] = results
+        return resp
+
+    def requote(self, cancel_ids, bets):
+        """cancels cancel_ids, then places bets. returns
+        {"cancelled": cancel_bets() response, "placed": place_bets() response}"""
+        cancelled = self.cancel_bets(cancel_ids) if cancel_ids else \
+            {"results": [], "chunks": []}
+        placed = self.place_bets(bets) if bets else {"results": [], "chunks": []}
+        return {"cancelled": cancelled, "placed": placed}
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __dispatch(self, name, method, items, per_chunk = False):
+        """sends items in chunks of max_bets[name] concurrently.
+        * per_chunk = the call returns one code for the whole chunk rather
+          than a list with one result per item
+        returns {"results": [...], "chunks": [{"start", "count", "secs",
+        "error"}, ...]}
+        """
+        size = self.max_bets[name]
+        starts = range(0, len(items), size)
+        pool = self._pool
+        if pool is None:
+            with self._pool_lock: # one pool, however many threads get here
+                if self._pool is None:
+                    self._pool = WorkerPool(self.workers)
+                pool = self._pool
+        futures = [pool.submit(self.__timed, method, items[s:s + size])
+            for s in starts]
+        results, chunks = [], []
+        for start, future in zip(starts, futures):
+            count = min(size, len(items) - start)
+            try:
+                secs, resp = future.result()
+            except APIError, e: # api.raise_errors is set
+                secs, resp = None, e.error
+            except Exception, e:
+                secs, resp = None, Error("ERROR",
+                    text = "ERROR: %s(%s)" % (type(e).__name__, e))
+            if per_chunk or type(resp) is not list:
+                error = resp if isinstance(resp, Error) else None
+                results.extend([resp] * count)
+            else:
+                error = None
+                resp = resp[:count]
+                if len(resp) < count:
+                    error = Error("SERVER_RESPONSE_ERROR",
+                        text = "ERROR: %d results for %d bets" % (len(resp), count))
+                    resp += [error] * (count - len(resp))
+                results.extend(resp)
+            chunks.append({"start": start, "count": count, "secs": secs,
+                "error": error})
+        return {"results": results, "chunks": chunks}
+
+    def __timed(self, method, chunk):
+        started = time.time()
+        resp = method(chunk)
+        return time.time() - started, resp
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+"""
+Response cache and request coalescing in front of an API instance.
+
+CachedAPI wraps an API or API_T instance and serves repeated
+calls with the same arguments from memory:
+* a response younger than the method's TTL is returned without a request
+* identical calls made while a request is already in flight wait for that
+  request instead of sending their own (request coalescing)
+* error strings are never cached
+* calls are keyed by their bound arguments, so get_market_prices("1") and
+  get_market_prices(market_id = "1") share a response
+* bet placement/update/cancellation drops cached bets and P&L so the next
+  read reflects the change
+
+EXAMPLE:
+    client = CachedAPI(API_T(), ttls = {"get_market_prices": 0.5})
+    client.login(username, password)
+    client.get_market_profit_and_loss(market_id) # request
+    client.get_market_profit_and_loss(market_id) # cached
+
+NOTE: cached responses are shared between callers. treat them as read-only.
+"""
+
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+# method name -> seconds a response stays fresh
+DEFAULT_TTLS = {
+    "get_market_prices": 0.5,
+    "get_complete_market_prices": 0.5,
+    "get_market_traded_volume": 0.5,
+    "get_market_profit_and_loss": 0.5,
+    "get_mu_bets": 0.5,
+    "get_account_funds": 5.0,
+    "get_all_markets": 60.0,
+    # static data
+    "get_market": 6 * 3600.0,
+    "get_active_event_types": 6 * 3600.0,
+    "get_all_event_types": 6 * 3600.0,
+}
+
+# calls that change bets -> cached methods they make stale
+INVALIDATED_BY = {
+    "place_bets": ["get_mu_bets", "get_market_profit_and_loss", "get_account_funds"],
+    "update_bets": ["get_mu_bets", "get_market_profit_and_loss", "get_account_funds"],
+    "cancel_bets": ["get_mu_bets", "get_market_profit_and_loss", "get_account_funds"],
+}
+
+MAX_ENTRIES = 10000
+
+
+class _InFlight(object):
+    """a request other callers can wait on"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.generation = 0 # bumped by invalidate() while in flight
+
+
+def _hashable(value):
+    """returns value with lists and dicts (also nested ones) turned into
+    tuples, e.g. get_all_markets(countries = ["GBR", "IRL"])"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    return value
+
+
+def call_key(name, method, args, kwargs):
+    """returns a hashable key for method(*args, **kwargs). arguments are bound
+    to the method's parameters, with the defaults filled in, so equivalent
+    calls get the same key"""
+    try:
+        bound = inspect.getcallargs(method, *args, **kwargs)
+    except TypeError: # not a python function, or arguments that do not fit
+        return name, _hashable(args), _hashable(kwargs)
+    bound.pop("self", None)
+    return name, _hashable(bound) # **kwargs are a dict too
+
+
+class CachedAPI(object):
+    """API wrapper with per-method TTL caching and request coalescing.
+    * ttls: {method name: seconds} merged over DEFAULT_TTLS. methods not
+      listed (and TTLs <= 0) are passed straight through.
+    * max_entries: cached responses kept before least recently used ones are
+      evicted
+    """
+    def __init__(self, api, ttls = None, max_entries = MAX_ENTRIES):
+        self.api = api
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (expires, result)
+        self._in_flight = {} # key -> _InFlight
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __getattr__(self, name):
+        if name == "api":
+            raise AttributeError(name)
+        attr = getattr(self.api, name)
+        if name in INVALIDATED_BY and callable(attr):
+            return self.__invalidating(name, attr)
+        if self.ttls.get(name, 0) > 0 and callable(attr):
+            return self.__cached(name, attr)
+        return attr
+
+    def invalidate(self, method = None):
+        """drops cached responses of method (all methods if None). requests
+        of method already in flight are not cached when they return, and
+        later calls do not wait for them"""
+        with self._lock:
+            if method is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == method]:
+                    del self._entries[key]
+            for key in [k for k in self._in_flight
+                if method is None or k[0] == method]:
+                self._in_flight.pop(key).generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                "coalesced": self.coalesced, "entries": len(self._entries)}
+
+    def __cached(self, name, method):
+        ttl = self.ttls[name]
+        def cached(*args, **kwargs):
+            key = call_key(name, method, args, kwargs)
+            try:
+                hash(key)
+            except TypeError: # e.g. a set argument
+                with self._lock:
+                    self.misses += 1
+                return method(*args, **kwargs)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    if entry[0] > time.time():
+                        self._entries[key] = self._entries.pop(key) # most recently used
+                        self.hits += 1
+                        return entry[1]
+                    del self._entries[key]
+                flight = self._in_flight.get(key)
+                if flight is None:
+                    flight = self._in_flight[key] = _InFlight()
+                    generation = flight.generation
+                    owner = True
+                    self.misses += 1
+                else:
+                    owner = False
+                    self.coalesced += 1
+            if not owner:
+                flight.event.wait()
+                if flight.error is not None:
+                    raise flight.error
+                return flight.result
+            try:
+                result = method(*args, **kwargs)
+            except Exception, e:
+                flight.error = e
+                raise
+            else:
+                flight.result = result
+                if not isinstance(result, basestring):
+                    self.__store(key, time.time() + ttl, result, flight,
+                        generation)
+                return result
+            finally:
+                with self._lock:
+                    if self._in_flight.get(key) is flight:
+                        del self._in_flight[key]
+                flight.event.set()
+        cached.__name__ = name
+        return cached
+
+    def __invalidating(self, name, method):
+        def invalidating(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            finally:
+                for stale in INVALIDATED_BY[name]:
+                    self.invalidate(stale)
+        invalidating.__name__ = name
+        return invalidating
+
+    def __store(self, key, expires, result, flight, generation):
+        with self._lock:
+            if flight.generation != generation:
+                return # invalidated while in flight: may predate the change
+            self._entries[key] = (expires, result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last = False)
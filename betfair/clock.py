@@ -0,0 +1,96 @@
+"""
+Estimate of the betfair server clock, kept up to date from the timestamp in
+every response.
+
+API_TIMESTAMP is the server time of the last reply, so it is stale by however
+long ago that was, and utcnow() is off by the local clock's error. The clock
+compares each server timestamp with the local send/receive times of its
+request (as NTP does):
+* offset = server time - local time at the middle of the round trip
+* latency = half the round trip (one-way)
+Only the sample with the shortest round trip in the last WINDOW samples is
+trusted for the offset, as queueing delays skew the others. The latency is a
+moving average, so it follows the network.
+
+server_now() is local time plus the offset, so it costs no parsing or
+requests, e.g. to bet a fixed time before the off:
+
+    secs = api.clock.secs_until(market["event_date"]) - 5.0
+"""
+
+import calendar
+import collections
+import datetime
+import threading
+import time
+
+WINDOW = 8 # samples considered for the offset
+LATENCY_ALPHA = 0.2 # weight of the newest sample in the latency average
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def parse_timestamp(s):
+    """returns the datetime of a betfair timestamp, e.g.
+    "2012-08-18T14:02:11.123Z", or None if it is not one. much faster than
+    strptime()"""
+    try:
+        micros = s[20:-1] if s[19:20] == "." else ""
+        return datetime.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+            int(s[11:13]), int(s[14:16]), int(s[17:19]),
+            int((micros + "00000")[:6]) if micros else 0)
+    except ValueError:
+        return None
+
+
+def to_epoch(dt):
+    """returns the seconds since 1970 of a UTC datetime"""
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+class ServerClock(object):
+    """thread-safe estimate of the server clock offset and network latency.
+    offset and latency are in seconds and are 0.0 until the first sample"""
+    def __init__(self, window = WINDOW):
+        self.offset = 0.0 # server - local
+        self.latency = 0.0 # one-way, moving average
+        self.min_latency = 0.0 # one-way, of the sample behind the offset
+        self.samples = 0
+        self.updated = None # local time of the last sample
+        self._window = collections.deque(maxlen = window)
+        self._lock = threading.Lock()
+
+    def update(self, sent, received, server_time):
+        """adds a sample.
+        * sent, received: local time.time() around the request
+        * server_time: the response's timestamp (datetime, UTC)
+        """
+        rtt = max(received - sent, 0.0)
+        offset = to_epoch(server_time) - (sent + rtt / 2.0)
+        with self._lock:
+            self._window.append((rtt, offset))
+            best_rtt, self.offset = min(self._window)
+            self.min_latency = best_rtt / 2.0
+            if self.samples:
+                self.latency += LATENCY_ALPHA * (rtt / 2.0 - self.latency)
+            else:
+                self.latency = rtt / 2.0
+            self.samples += 1
+            self.updated = received
+
+    def server_time(self):
+        """returns the estimated server time in seconds since 1970"""
+        return time.time() + self.offset
+
+    def server_now(self):
+        """returns the estimated server time as a datetime (UTC), i.e. what
+        API_TIMESTAMP would be if a reply arrived now"""
+        return datetime.datetime.utcfromtimestamp(time.time() + self.offset)
+
+    def secs_until(self, dt):
+        """returns the seconds from now (server time) until a UTC datetime,
+        e.g. a market's event_date. negative once it has passed"""
+        return to_epoch(dt) - time.time() - self.offset
+
+    def stats(self):
+        return {"offset": self.offset, "latency": self.latency,
+            "min_latency": self.min_latency, "samples": self.samples}
@@ -0,0 +1,99 @@
+"""
+Error results and exceptions returned/raised by the API.
+
+Failed calls used to return plain strings such as "API_ERROR: NO_SESSION" or
+"SERVER_RESPONSE_ERROR: Response XML = <the whole response>". They now return
+an Error, which is still a str with the same short text, so existing code like
+
+    if prices == "API_ERROR: NO_SESSION": ...
+    if isinstance(prices, str): ...
+
+keeps working, but also carries the parts of the error as attributes:
+* code: the response code, e.g. "API_ERROR", "INVALID_MARKET",
+  "SERVER_RESPONSE_ERROR" (unrecognised response) or "INVALID_ARGUMENT"
+* reason: the APIErrorEnum for "API_ERROR" codes (e.g. "NO_SESSION"), else ""
+* response: the response xml the error came from. this is a reference to the
+  response string, not a copy, and is no longer part of the error text.
+
+API(raise_errors = True) raises the matching APIError subclass instead of
+returning an Error, so callers can use try/except rather than checking the
+type of every return value:
+
+    api = API(raise_errors = True)
+    try:
+        prices = api.get_market_prices(market_id)
+    except ThrottleError:
+        ...
+"""
+
+# codes that are normal outcomes rather than failures. never raised
+QUIET_CODES = frozenset(["NO_RESULTS"])
+
+SESSION_ERRORS = frozenset(["NO_SESSION", "INVALID_USERNAME_OR_PASSWORD",
+    "ACCOUNT_CLOSED", "ACCOUNT_SUSPENDED", "USER_NOT_ACCOUNT_OWNER",
+    "LOGIN_RESTRICTED_LOCATION", "LOGIN_FAILED_ACCOUNT_LOCKED"])
+THROTTLE_ERRORS = frozenset(["EXCEEDED_THROTTLE"])
+SERVER_ERRORS = frozenset(["SERVER_RESPONSE_ERROR", "INTERNAL_ERROR",
+    "SERVICE_NOT_AVAILABLE_IN_PRODUCT", "EVENT_SUSPENDED"])
+
+
+class Error(str):
+    """a failed call's result. compares and prints like the old error string"""
+    def __new__(cls, code, reason = "", response = None, text = None):
+        if text is None:
+            text = code + ": " + reason if reason else code
+        self = str.__new__(cls, text)
+        self.code = code
+        self.reason = reason
+        self.response = response
+        return self
+
+    def exception(self):
+        """returns the APIError subclass instance matching this error"""
+        key = self.reason or self.code
+        if key in SESSION_ERRORS:
+            return SessionError(self)
+        if key in THROTTLE_ERRORS:
+            return ThrottleError(self)
+        if key in SERVER_ERRORS:
+            return ServerError(self)
+        if self.code == "INVALID_ARGUMENT":
+            return RequestError(self)
+        return APIError(self)
+
+
+class APIError(Exception):
+    """base class of the exceptions raised by API(raise_errors = True).
+    * error: the Error that would have been returned
+    """
+    def __init__(self, error):
+        Exception.__init__(self, str(error))
+        self.error = error
+
+    @property
+    def code(self):
+        return self.error.code
+
+    @property
+    def reason(self):
+        return self.error.reason
+
+    @property
+    def response(self):
+        return self.error.response
+
+
+class SessionError(APIError):
+    """not logged in, or login failed"""
+
+
+class ThrottleError(APIError):
+    """the request was refused for exceeding the data request limits"""
+
+
+class ServerError(APIError):
+    """betfair returned an unrecognised response or an internal error"""
+
+
+class RequestError(APIError):
+    """the call was rejected before a request was sent (bad arguments)"""
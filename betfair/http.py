@@ -1,7 +1,247 @@
+import errno
+import httplib
+import socket
+import sys
+import threading
+import time
+import urlparse
 
-class Http(object):
-    """http class using one of python's built-in http libraries"""
+POOL_SIZE = 4 # keep-alive connections per host
+IDLE_TIMEOUT = 60.0 # seconds before an unused connection is dropped
+TIMEOUT = 60 # socket timeout in seconds
+# errors sending on a kept-alive connection the server has already closed
+STALE_ERRNOS = (errno.ECONNRESET, errno.EPIPE)
+# soap actions that change bets. never resent, as betfair may have acted on
+# the first attempt
+NO_RETRY_ACTIONS = ("placeBets", "updateBets", "cancelBets",
+    "cancelBetsByMarket")
+
+
+class HostStats(object):
+    """request timing counters for one host"""
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.connects = 0 # new TCP/TLS connections opened
+        self.reuses = 0 # requests served on a warm connection
+        self.evictions = 0 # idle connections dropped
+        self.total_secs = 0.0
+        self.max_secs = 0.0
+        self.last_secs = 0.0
+
+    def add(self, secs):
+        self.requests += 1
+        self.total_secs += secs
+        self.last_secs = secs
+        if secs > self.max_secs:
+            self.max_secs = secs
+
+    def as_dict(self):
+        d = dict(self.__dict__)
+        d["avg_secs"] = self.total_secs / self.requests if self.requests else 0.0
+        return d
+
+
+class _Stale(Exception):
+    """the request did not reach the server, which had closed the kept-alive
+    connection. holds the original exception"""
     def __init__(self):
+        Exception.__init__(self)
+        self.exc_info = sys.exc_info()
+
+    def reraise(self):
+        raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+
+
+class ConnectionPool(object):
+    """thread-safe pool of keep-alive http(s) connections.
+    * connections are grouped by (scheme, host). the global and uk exchange
+      services share api.betfair.com, aus is served by api-au.betfair.com.
+    * at most "size" requests are in flight per host, further callers block
+      until a connection is returned. "host_sizes" overrides this per host,
+      e.g. {"api-au.betfair.com": 2}
+    * connections unused for "idle_timeout" seconds are closed rather than
+      reused, as betfair (or a NAT box) will have dropped them by then.
+    * a request on a reused connection is resent once on a new connection if
+      the old one turns out to have been closed by the server (BadStatusLine,
+      or a reset/broken pipe while sending). never after a timeout or once a
+      status line has been read, and never when retry = False.
+    """
+    def __init__(self, size = POOL_SIZE, idle_timeout = IDLE_TIMEOUT,
+        timeout = TIMEOUT, host_sizes = None):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.host_sizes = host_sizes or {}
+        self._lock = threading.Lock()
+        self._idle = {} # key -> list of [conn, last_used]
+        self._slots = {} # key -> BoundedSemaphore
+        self._stats = {} # host -> HostStats
+
+    def request(self, url, method = "GET", body = None, headers = None,
+        retry = True):
+        """sends a request and returns the response body.
+        * retry = False: never resend, e.g. for bet placement"""
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        slots = self.__get_slots(key)
+        slots.acquire()
+        try:
+            conn, reused = self.__checkout(key)
+            start = time.time()
+            try:
+                resp, data = self.__send(conn, method, path, body, headers)
+            except _Stale, stale:
+                conn.close()
+                if not (reused and retry):
+                    self.__count_error(key)
+                    stale.reraise()
+                # server closed the keep-alive connection - retry once
+                conn, reused = self.__connect(key), False
+                try:
+                    resp, data = self.__send(conn, method, path, body, headers)
+                except _Stale, stale:
+                    conn.close()
+                    self.__count_error(key)
+                    stale.reraise()
+                except (httplib.HTTPException, socket.error):
+                    conn.close()
+                    self.__count_error(key)
+                    raise
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                self.__count_error(key)
+                raise
+            elapsed = time.time() - start
+            if resp.will_close:
+                conn.close()
+            else:
+                self.__checkin(key, conn)
+            with self._lock:
+                stats = self.__host_stats(key)
+                stats.add(elapsed)
+                if reused:
+                    stats.reuses += 1
+            return data
+        finally:
+            slots.release()
+
+    def evict_idle(self):
+        """closes connections that have been idle for too long"""
+        now = time.time()
+        with self._lock:
+            for key, idle in self._idle.items():
+                fresh = []
+                for conn, last_used in idle:
+                    if now - last_used > self.idle_timeout:
+                        conn.close()
+                        self.__host_stats(key).evictions += 1
+                    else:
+                        fresh.append([conn, last_used])
+                self._idle[key] = fresh
+
+    def close(self):
+        """closes all idle connections"""
+        with self._lock:
+            for idle in self._idle.values():
+                for conn, last_used in idle:
+                    conn.close()
+            self._idle = {}
+
+    def stats(self):
+        """returns a dict of timing counters per host"""
+        with self._lock:
+            return dict((host, s.as_dict()) for host, s in self._stats.items())
+
+    def __send(self, conn, method, path, body, headers):
+        """returns (response, body). raises _Stale if the server had closed
+        the connection before the request reached it"""
+        try:
+            conn.request(method, path, body, headers or {})
+        except socket.error, e:
+            if e.errno in STALE_ERRNOS:
+                raise _Stale()
+            raise
+        try:
+            resp = conn.getresponse()
+        except httplib.BadStatusLine:
+            raise _Stale() # closed without a response
+        return resp, resp.read()
+
+    def __get_slots(self, key):
+        with self._lock:
+            slots = self._slots.get(key)
+            if slots is None:
+                size = self.host_sizes.get(key[1], self.size)
+                slots = self._slots[key] = threading.BoundedSemaphore(size)
+            return slots
+
+    def __checkout(self, key):
+        """returns (connection, reused)"""
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                # most recently used first, it is the least likely to be stale
+                conn, last_used = idle.pop()
+                if now - last_used <= self.idle_timeout:
+                    return conn, True
+                conn.close()
+                self.__host_stats(key).evictions += 1
+        return self.__connect(key), False
+
+    def __checkin(self, key, conn):
+        with self._lock:
+            self._idle.setdefault(key, []).append([conn, time.time()])
+
+    def __connect(self, key):
+        scheme, host = key
+        if scheme == "https":
+            conn = httplib.HTTPSConnection(host, timeout = self.timeout)
+        else:
+            conn = httplib.HTTPConnection(host, timeout = self.timeout)
+        with self._lock:
+            self.__host_stats(key).connects += 1
+        return conn
+
+    def __count_error(self, key):
+        with self._lock:
+            self.__host_stats(key).errors += 1
+
+    def __host_stats(self, key):
+        """must be called with self._lock held"""
+        stats = self._stats.get(key[1])
+        if stats is None:
+            stats = self._stats[key[1]] = HostStats()
+        return stats
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def shared_pool():
+    """returns the process wide connection pool used by Http()"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ConnectionPool()
+        return _shared_pool
+
+
+class Http(object):
+    """http class using one of python's built-in http libraries.
+    by default requests go through the process wide keep-alive ConnectionPool
+    so every API instance shares warm TLS connections. pass pooled = False to
+    get the old one-connection-per-object behaviour.
+    """
+    def __init__(self, pool = None, pooled = True):
+        self.pool = None
+        if pooled:
+            self.pool = pool if pool is not None else shared_pool()
+            return
         try:
             # attemp to use httplib2 as it is 4x faster than urllib2!
             import httplib2
@@ -20,6 +260,10 @@ class Http(object):
             headers["SOAPAction"] = soap_action
             data = req_xml
         # send request
+        if self.pool is not None:
+            method = "POST" if data is not None else "GET"
+            return self.pool.request(url, method, data, headers,
+                retry = soap_action not in NO_RETRY_ACTIONS)
         try:
             # try httplib2. note: resp[0] = headers, [1] = xml/html
             return self.http.request(url, 'GET', data, headers)[1]
@@ -27,3 +271,8 @@ class Http(object):
             req = self.urllib2.Request(url, data, headers)
             return self.urllib2.urlopen(req, timeout = 60).read()
 
+    def stats(self):
+        """returns per-host request timing stats (pooled mode only)"""
+        if self.pool is not None:
+            return self.pool.stats()
+        return {}
@@ -0,0 +1,209 @@
+"""
+Local matched/unmatched bet state, kept up to date with getMUBets deltas.
+
+Polling get_mu_bets() every tick costs one request per 200 bets and returns
+the whole book each time. An OrderCache loads all bets once (paging
+concurrently, see API.get_all_mu_bets()) and from then on only asks for bets
+matched since the last sync, so each sync() costs one request unless a lot
+has been matched:
+
+    orders = OrderCache(api, market_id)
+    orders.sync()
+    for bet in orders.bets(selection_id = sel_id, status = "U"):
+        ...
+    api.cancel_bets(bet_ids)
+    orders.cancelled(bet_ids)
+
+* matched records are keyed by transactionId, so the one second of overlap
+  between syncs (see exclude_last_second) never counts a match twice. each
+  new match reduces the unmatched size of its bet.
+* bets placed, updated or cancelled through other means, and bets lapsing
+  (e.g. when a market turns in-play), are not visible in the deltas. tell the
+  cache about your own changes with placed()/cancelled(); everything else is
+  picked up by the full reload every resync_secs.
+"""
+
+import datetime
+import threading
+import time
+
+from errors import Error
+
+RESYNC_SECS = 60.0 # full reload interval
+OVERLAP = datetime.timedelta(seconds = 1) # matches held back by excludeLastSecond
+
+
+def _matched_key(bet):
+    """identifies one matched record of a bet"""
+    return ("M", bet.get("transactionId") or (bet.get("betId"),
+        bet.get("matchedDate"), bet.get("price"), bet.get("size")))
+
+
+class OrderCache(object):
+    """the matched/unmatched bets of one market (or all markets if
+    market_id = "0"), indexed by (market id, selection id).
+    * api: an API instance (or API_T, CachedAPI, ...)
+    * resync_secs: seconds between full reloads
+    """
+    def __init__(self, api, market_id = "0", resync_secs = RESYNC_SECS):
+        self.api = api
+        self.market_id = market_id
+        self.resync_secs = resync_secs
+        self._lock = threading.RLock()
+        self._bets = {} # (market id, selection id) -> {key: bet}
+        self._unmatched = {} # bet id -> unmatched bet record
+        self._absorb = {} # bet id -> size matched at placement, see placed()
+        self._since = None # matchedSince for the next delta
+        self._next_reload = 0.0
+        # metrics
+        self.reloads = 0
+        self.deltas = 0
+        self.matches = 0
+
+    def sync(self):
+        """brings the cache up to date: a full reload when due, otherwise the
+        bets matched since the last sync. returns the number of new matched
+        records OR an error string"""
+        if self._since is None or time.time() >= self._next_reload:
+            return self.reload()
+        since = self._since
+        started = self.api.clock.server_now()
+        bets = self.api.get_all_mu_bets(self.market_id, "M", "MATCHED_DATE",
+            "ASC", matched_since = since, exclude_last_second = True)
+        if isinstance(bets, Error):
+            if bets != "NO_RESULTS":
+                return bets
+            bets = []
+        with self._lock:
+            self.deltas += 1
+            new = 0
+            for bet in bets:
+                new += self.__add_matched(bet)
+            self.__advance(since, started)
+            return new
+
+    def reload(self):
+        """replaces the cache with a full getMUBets load. returns the number
+        of matched records OR an error string"""
+        started = self.api.clock.server_now()
+        bets = self.api.get_all_mu_bets(self.market_id, "MU")
+        if isinstance(bets, Error):
+            if bets != "NO_RESULTS":
+                return bets
+            bets = []
+        with self._lock:
+            self.reloads += 1
+            self._bets = {}
+            self._unmatched = {}
+            self._absorb = {}
+            matched = 0
+            for bet in bets:
+                if bet.get("betStatus") == "U":
+                    self.__add_unmatched(bet)
+                else:
+                    self.__index(_matched_key(bet), bet)
+                    matched += 1
+            self.__advance(None, started)
+            self._next_reload = time.time() + self.resync_secs
+            return matched
+
+    def bets(self, market_id = None, selection_id = None, status = None):
+        """returns a LIST of cached bet records. status = "M", "U" or None
+        for both"""
+        with self._lock:
+            if market_id is None and selection_id is None:
+                groups = self._bets.values()
+            elif market_id is not None and selection_id is not None:
+                groups = [self._bets.get((market_id, selection_id), {})]
+            else:
+                groups = [g for (m, s), g in self._bets.items()
+                    if market_id in (None, m) and selection_id in (None, s)]
+            return [bet for g in groups for key, bet in g.items()
+                if status is None or key[0] == status]
+
+    def placed(self, bets, results):
+        """records the unmatched remainder of bets placed with
+        api.place_bets(bets), which returned results"""
+        if type(results) is not list:
+            return
+        with self._lock:
+            for bet, result in zip(bets, results):
+                if (type(result) is not dict or result.get("success") != "true"
+                    or not result.get("bet_id")):
+                    continue
+                matched = float(result.get("size") or 0)
+                if matched > 0:
+                    # the next delta reports this match again
+                    self._absorb[result["bet_id"]] = matched
+                remaining = float(bet["size"]) - matched
+                if remaining > 0:
+                    self.__add_unmatched({"betId": result["bet_id"],
+                        "marketId": bet["marketId"],
+                        "selectionId": bet["selectionId"],
+                        "betType": bet["betType"], "betStatus": "U",
+                        "price": float(bet["price"]), "size": remaining})
+
+    def cancelled(self, bet_ids):
+        """drops the unmatched parts of cancelled bets"""
+        with self._lock:
+            for bet_id in bet_ids:
+                self.__remove_unmatched(bet_id)
+
+    def stats(self):
+        with self._lock:
+            return {"reloads": self.reloads, "deltas": self.deltas,
+                "matches": self.matches, "unmatched": len(self._unmatched),
+                "selections": len(self._bets)}
+
+    def __advance(self, since, started):
+        """sets matchedSince for the next delta to the server time when the
+        last sync started (it may have taken several pages), less the last
+        second excludeLastSecond held back. started comes from the api's
+        clock, not API_TIMESTAMP, which other threads' replies overwrite"""
+        start = started - OVERLAP
+        self._since = max(since, start) if since else start
+
+    def __index(self, key, bet):
+        group = self._bets.setdefault((bet.get("marketId"),
+            bet.get("selectionId")), {})
+        if key in group:
+            return False
+        group[key] = bet
+        return True
+
+    def __add_unmatched(self, bet):
+        self.__remove_unmatched(bet["betId"])
+        self._unmatched[bet["betId"]] = bet
+        self.__index(("U", bet["betId"]), bet)
+
+    def __remove_unmatched(self, bet_id):
+        bet = self._unmatched.pop(bet_id, None)
+        if bet is not None:
+            self._bets[(bet.get("marketId"), bet.get("selectionId"))].pop(
+                ("U", bet_id), None)
+
+    def __add_matched(self, bet):
+        """returns 1 if bet is a new matched record, else 0"""
+        if not self.__index(_matched_key(bet), bet):
+            return 0
+        self.matches += 1
+        bet_id = bet.get("betId")
+        size = bet.get("size") or 0.0
+        absorb = self._absorb.pop(bet_id, 0.0)
+        if absorb > size:
+            self._absorb[bet_id] = absorb - size
+        size -= min(size, absorb)
+        unmatched = self._unmatched.get(bet_id)
+        if unmatched is not None and size > 0:
+            left = unmatched["size"] - size
+            if left > 0.005:
+                unmatched = dict(unmatched, size = round(left, 2))
+                self._unmatched[bet_id] = unmatched
+                self.__index_replace(unmatched)
+            else:
+                self.__remove_unmatched(bet_id)
+        return 1
+
+    def __index_replace(self, bet):
+        self._bets[(bet.get("marketId"), bet.get("selectionId"))][
+            ("U", bet["betId"])] = bet
@@ -0,0 +1,204 @@
+"""
+Parsers for the compressed (delimited string) payloads returned by betfair.
+
+Each parser takes the string found between the payload tags of the response
+xml, e.g. <marketPrices xsi:type='xsd:string'>...</marketPrices>, and returns
+exactly the structure the corresponding API method has always returned. The
+field tables and converters are built once at import time so each row is
+handled with a single split and no per-field key lookups.
+"""
+
+import datetime
+
+MARKET_PRICES_FIELDS = ("market_id", "currency", "status", "in_play_delay",
+    "no_of_winners", "info", "discount_allowed", "base_rate", "refresh_time",
+    "none_runners", "bsp_market")
+
+MARKET_PRICES_RUNNER_FIELDS = ("selection_id", "order_index", "total_matched",
+    "last_price_matched", "handicap", "reduction_factor", "vacant", "far_sp",
+    "near_sp", "actual_sp")
+
+COMPLETE_PRICES_FIELDS = ("market_id", "in_play_delay", "none_runners")
+
+COMPLETE_PRICES_RUNNER_FIELDS = ("selection_id", "order_index", "total_matched",
+    "last_price_matched", "handicap", "reduction_factor", "vacant",
+    "asian_line_id", "far_sp", "near_sp", "actual_sp")
+
+LADDER_FIELDS = ("price", "back_amount", "lay_amount", "bsp_back_amount",
+    "bsp_lay_amount")
+
+ALL_MARKETS_FIELDS = ("market_id", "market_name", "market_type",
+    "market_status", "event_date", "menu_path", "event_hierarchy", "bet_delay",
+    "exchange_id", "country_code", "last_refresh", "no_of_runners",
+    "no_of_winners", "total_matched", "bsp_market", "turning_in_play")
+
+
+def to_float(val):
+    """float(val) or val unchanged if it is not a number (e.g. '')"""
+    if not val:
+        return val # empty fields are common, skip the exception
+    try:
+        return float(val)
+    except ValueError:
+        return val
+
+def to_number(val):
+    """int(val), float(val) or val unchanged, in that order of preference"""
+    try:
+        if "." in val:
+            return float(val) # int() would fail, skip the exception
+        return int(val)
+    except ValueError:
+        try:
+            return float(val)
+        except ValueError:
+            return val
+
+def _converters(fields, conversions):
+    """returns (fields, ((index, key, converter), ...)) for _convert_row()"""
+    return (fields, tuple((i, k, conversions[k])
+        for i, k in enumerate(fields) if k in conversions))
+
+_MARKET_CONVERTERS = _converters(MARKET_PRICES_FIELDS,
+    {"no_of_winners": to_number, "base_rate": to_number})
+
+_RUNNER_FLOATS = {"total_matched": to_float, "last_price_matched": to_float,
+    "reduction_factor": to_float, "far_sp": to_float, "near_sp": to_float,
+    "actual_sp": to_float}
+
+_RUNNER_CONVERTERS = _converters(MARKET_PRICES_RUNNER_FIELDS, _RUNNER_FLOATS)
+
+_COMPLETE_RUNNER_CONVERTERS = _converters(COMPLETE_PRICES_RUNNER_FIELDS,
+    _RUNNER_FLOATS)
+
+_ALL_MARKETS_CONVERTERS = _converters(ALL_MARKETS_FIELDS,
+    {"no_of_runners": to_number, "no_of_winners": to_number,
+    "total_matched": to_number})
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _convert_row(vals, converters):
+    """zips vals against the field table, converting where required"""
+    row = dict(zip(converters[0], vals))
+    n = len(vals)
+    for i, key, conv in converters[1]:
+        if i < n:
+            row[key] = conv(vals[i])
+    return row
+
+def _price_levels(field):
+    """parses 'price~amount~type~depth~' repeated into a list of dicts"""
+    vals = field.split("~")
+    levels = []
+    # the trailing '~' leaves an empty last element; incomplete groups are dropped
+    for j in xrange(0, (len(vals) - 1) // 4 * 4, 4):
+        levels.append({"price": float(vals[j]), "amount": float(vals[j + 1]),
+            "type": vals[j + 2], "depth": vals[j + 3]})
+    return levels
+
+def parse_market_prices(prices):
+    """parses a getMarketPricesCompressed payload. returns a dict of market
+    info with a "runners" list, each runner having "back_prices" and
+    "lay_prices" lists of {"price", "amount", "type", "depth"} dicts.
+    """
+    if "\:" in prices:
+        prices = prices.replace("\:", "") # remove escaped delimiters
+    market = {}
+    for row in prices.split(":"):
+        if "|" in row:
+            # this is a runner...
+            fields = row.split("|")
+            if len(fields) > 2:
+                runner = _convert_row(fields[0].split("~"), _RUNNER_CONVERTERS)
+                runner["back_prices"] = _price_levels(fields[1])
+                runner["lay_prices"] = _price_levels(fields[2])
+                market["runners"].append(runner)
+        else:
+            # market info
+            market = _convert_row(row.split("~"), _MARKET_CONVERTERS)
+            market["runners"] = []
+    return market
+
+def _ladder(field):
+    """parses 'price~back~lay~bsp_back~bsp_lay~' repeated into a list of dicts"""
+    vals = field.split("~")
+    rungs = []
+    for j in xrange(0, (len(vals) - 1) // 5 * 5, 5):
+        rungs.append({"price": float(vals[j]),
+            "back_amount": float(vals[j + 1]), "lay_amount": float(vals[j + 2]),
+            "bsp_back_amount": float(vals[j + 3]),
+            "bsp_lay_amount": float(vals[j + 4])})
+    return rungs
+
+def parse_complete_market_prices(prices, ladder = _ladder):
+    """parses a getCompleteMarketPricesCompressed payload. returns a dict of
+    market info with a "runners" list, each runner having a "prices" ladder.
+    by default the ladder is a list of dicts keyed by LADDER_FIELDS; "ladder"
+    can be any callable turning the raw 'price~...~' field into a ladder
+    (see book.ladder_array() for a numpy version).
+    """
+    if "\:" in prices:
+        prices = prices.replace("\:", "") # remove escaped delimiters
+    market = {}
+    for row in prices.split(":"):
+        if "|" in row:
+            # this is a runner...
+            fields = row.split("|")
+            if len(fields) > 1:
+                runner = _convert_row(fields[0].split("~"),
+                    _COMPLETE_RUNNER_CONVERTERS)
+                runner["prices"] = ladder(fields[1])
+                market["runners"].append(runner)
+        else:
+            # market info
+            market = dict(zip(COMPLETE_PRICES_FIELDS, row.split("~")))
+            market["runners"] = []
+    return market
+
+def iter_all_markets(data, menu_prefix = None, countries = None,
+    starts_after = None, starts_before = None):
+    """parses a getAllMarkets marketData payload one market at a time. yields
+    the same dicts get_all_markets() returns, with "event_date" as a datetime.
+    filters are checked on the raw fields, before a dict is built:
+    * menu_prefix: only markets whose menu_path starts with this
+    * countries: only markets whose country_code is in this list
+    * starts_after/starts_before: datetimes (GMT). only markets with
+      starts_after < event_date < starts_before
+    """
+    if "\\" in data:
+        data = data.replace("\\:", "").replace("\\~", "") # remove escaped delimiters
+    after = before = None
+    if starts_after is not None:
+        after = (starts_after - _EPOCH).total_seconds()
+    if starts_before is not None:
+        before = (starts_before - _EPOCH).total_seconds()
+    if countries is not None:
+        countries = frozenset(countries)
+    converters = _ALL_MARKETS_CONVERTERS[1]
+    utcfromtimestamp = datetime.datetime.utcfromtimestamp
+    pos = data.find(":") # data starts with a ':'
+    while pos >= 0:
+        end = data.find(":", pos + 1)
+        vals = data[pos + 1:end if end >= 0 else len(data)].split("~")
+        pos = end
+        n = len(vals)
+        if menu_prefix is not None and (n < 6 or not vals[5].startswith(menu_prefix)):
+            continue
+        if countries is not None and (n < 10 or vals[9] not in countries):
+            continue
+        if n > 4:
+            secs = int(vals[4]) // 1000
+            if after is not None and not secs > after:
+                continue
+            if before is not None and not secs < before:
+                continue
+        elif after is not None or before is not None:
+            continue
+        market = dict(zip(ALL_MARKETS_FIELDS, vals))
+        for i, key, conv in converters:
+            if i < n:
+                market[key] = conv(vals[i])
+        if n > 4:
+            market["event_date"] = utcfromtimestamp(secs)
+        yield market
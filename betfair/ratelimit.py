@@ -0,0 +1,137 @@
+"""
+Token bucket rate limiting for betfair requests.
+
+Every SOAP action belongs to an endpoint class with its own budget:
+* "data" - price/volume/bet polling calls that count towards data charges
+* "free" - static data, account and session calls
+* "bets" - bet placement, update and cancellation
+A bucket refills at "rate" tokens per second up to "burst" tokens, so short
+bursts go straight through while the long run average stays within budget.
+Buckets are thread-safe and keep track of how long callers waited, e.g.
+
+    limiter = RateLimiter({"data": (5.0, 10)})
+    api = API_T(limiter = limiter)
+    ...
+    print limiter.stats()
+"""
+
+import threading
+import time
+
+# soap action -> endpoint class. anything not listed is "free"
+ENDPOINT_CLASSES = {
+    "getMarketPricesCompressed": "data",
+    "getCompleteMarketPricesCompressed": "data",
+    "getMarketTradedVolumeCompressed": "data",
+    "getMarketPrices": "data",
+    "getMarketTradedVolume": "data",
+    "getDetailAvailableMktDepth": "data",
+    "getMUBets": "data",
+    "getMUBetsLite": "data",
+    "getCurrentBets": "data",
+    "getMarketProfitAndLoss": "data",
+    "placeBets": "bets",
+    "updateBets": "bets",
+    "cancelBets": "bets",
+    "cancelBetsByMarket": "bets",
+}
+
+# endpoint class -> (tokens per second, burst)
+DEFAULT_BUDGETS = {
+    "data": (1.0, 5),
+    "free": (1.0, 5),
+    "bets": (10.0, 20),
+}
+
+
+class TokenBucket(object):
+    """thread-safe token bucket"""
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._last = time.time()
+        self._lock = threading.Lock()
+        # metrics
+        self.acquired = 0
+        self.waits = 0
+        self.wait_secs = 0.0
+        self.max_wait_secs = 0.0
+
+    def __refill(self, now):
+        """must be called with self._lock held"""
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens = 1):
+        """takes tokens if available now. returns True on success"""
+        with self._lock:
+            self.__refill(time.time())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                self.acquired += 1
+                return True
+            return False
+
+    def reserve(self, tokens = 1):
+        """takes tokens, going into debt if needed, and returns how many seconds
+        the caller must wait before using them. never blocks, so it can be used
+        from an event loop as well as from threads"""
+        with self._lock:
+            self.__refill(time.time())
+            self._tokens -= tokens
+            self.acquired += 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            if wait > 0:
+                self.waits += 1
+                self.wait_secs += wait
+                if wait > self.max_wait_secs:
+                    self.max_wait_secs = wait
+            return wait
+
+    def acquire(self, tokens = 1):
+        """blocks until tokens are available. returns the seconds waited"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def stats(self):
+        with self._lock:
+            self.__refill(time.time())
+            return {"rate": self.rate, "burst": self.burst,
+                "tokens": self._tokens, "acquired": self.acquired,
+                "waits": self.waits, "wait_secs": self.wait_secs,
+                "max_wait_secs": self.max_wait_secs}
+
+
+class RateLimiter(object):
+    """one TokenBucket per endpoint class.
+    * budgets: {endpoint class: (rate, burst)} merged over DEFAULT_BUDGETS
+    * classes: {soap action: endpoint class} merged over ENDPOINT_CLASSES
+    """
+    def __init__(self, budgets = None, classes = None):
+        merged = dict(DEFAULT_BUDGETS)
+        merged.update(budgets or {})
+        self.buckets = dict((k, TokenBucket(rate, burst))
+            for k, (rate, burst) in merged.items())
+        self.classes = dict(ENDPOINT_CLASSES)
+        self.classes.update(classes or {})
+
+    def bucket(self, soap_action):
+        return self.buckets[self.classes.get(soap_action, "free")]
+
+    def acquire(self, soap_action):
+        """blocks until a request for soap_action is within budget"""
+        return self.bucket(soap_action).acquire()
+
+    def reserve(self, soap_action):
+        """non-blocking variant of acquire(). returns seconds to wait"""
+        return self.bucket(soap_action).reserve()
+
+    def stats(self):
+        """returns {endpoint class: bucket metrics}"""
+        return dict((k, b.stats()) for k, b in self.buckets.items())
+
+
+shared_limiter = RateLimiter() # used by API_T unless given another limiter
@@ -0,0 +1,208 @@
+"""
+Record and replay of betfair SOAP traffic, for running feeds, bots and
+benchmarks offline and deterministically.
+
+RecordingHttp wraps the transport an API uses (http.Http) and appends every
+request/response pair to a gzipped log, one JSON object per line:
+
+    api = API()
+    record(api, "session.log.gz") # or api.http = RecordingHttp(...)
+    api.login(username, password)
+    ... run the bot as usual ...
+    api.http.close()
+
+ReplayHttp is a drop-in replacement for http.Http that serves the recorded
+responses instead of contacting betfair, so no credentials are needed:
+
+    api = API()
+    replay(api, "session.log.gz", speed = 10.0) # 10x faster than recorded
+    api.login("anyone", "anything") # served from the log
+
+* responses are served per soap action and market id (see request_key()),
+  in the order they were recorded, so the replaying code may interleave its
+  calls to different markets differently (concurrent API_A calls, batch
+  fetches, FeedScheduler workers). logs recorded with requests = False only
+  have the soap action to go by.
+* speed = 1.0 reproduces the session's timing: a response is returned no
+  sooner than its recorded latency after the request, nor than its recorded
+  completion ("t" + "secs") after the first replayed request. 10.0 replays
+  10x faster and None (or 0) does not sleep at all.
+* the server timestamps in the responses are replayed as well, so
+  API.API_TIMESTAMP follows the recorded session.
+* passwords and session tokens are never written to the log (see
+  REDACT_TAGS). replayed responses carry "***" as the session token.
+"""
+
+import gzip
+import json
+import threading
+import time
+from collections import deque
+
+from http import Http
+
+REDACT_TAGS = ("password", "sessionToken") # elements whose contents are not logged
+MARKET_TAGS = ("marketId", "marketID") # getMarketProfitAndLoss uses the latter
+
+
+class ReplayError(Exception):
+    """raised when the log has no (more) responses for a request"""
+
+
+def redact(xml, tags = REDACT_TAGS):
+    """returns xml with the contents of the given elements replaced. the
+    elements may have attributes, e.g. <sessionToken xsi:type="xsd:string">"""
+    for tag in tags:
+        start = 0
+        while True:
+            start = xml.find("<" + tag, start)
+            if start < 0:
+                break
+            start += len(tag) + 1
+            if xml[start:start + 1] not in (">", " "):
+                continue # a longer tag name
+            start = xml.find(">", start) + 1
+            end = xml.find("</" + tag + ">", start)
+            if not start or end < 0:
+                break
+            xml = xml[:start] + "***" + xml[end:]
+    return xml
+
+
+def request_key(soap_action, req_xml):
+    """returns (soap_action, market id) for a request. the market id is the
+    contents of its first market id element, None if it has none"""
+    for tag in MARKET_TAGS:
+        open_tag = "<" + tag + ">"
+        start = req_xml.find(open_tag) if req_xml else -1
+        if start >= 0:
+            start += len(open_tag)
+            return soap_action, req_xml[start:req_xml.find("<", start)].strip()
+    return soap_action, None
+
+
+def read_log(path):
+    """yields the records of a log written by RecordingHttp"""
+    with gzip.open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class RecordingHttp(object):
+    """http transport that logs every request/response pair to path.
+    * http: the transport to record (defaults to a new http.Http)
+    * requests = False leaves the request xml out of the log, which keeps it
+      smaller; replaying only needs the responses
+    each record holds: "t" (seconds since recording started), "secs"
+    (latency), "action" (soap action), "url", "request" and "response".
+    """
+    def __init__(self, path, http = None, requests = True):
+        self.path = path
+        self.http = http if http is not None else Http()
+        self.requests = requests
+        self._file = gzip.open(path, "wb")
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self.records = 0
+
+    def send_http_request(self, url = "", req_xml = "", soap_action = ""):
+        start = time.time()
+        resp = self.http.send_http_request(url, req_xml, soap_action)
+        record = {"t": round(start - self._started, 6),
+            "secs": round(time.time() - start, 6), "action": soap_action,
+            "url": url, "response": redact(resp)}
+        if self.requests:
+            record["request"] = redact(req_xml)
+        line = json.dumps(record, separators = (",", ":")) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self.records += 1
+        return resp
+
+    def stats(self):
+        return self.http.stats() if hasattr(self.http, "stats") else {}
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayHttp(object):
+    """http transport serving responses from a RecordingHttp log.
+    * speed: recorded timing is divided by this. None or 0 = no delay
+    * loop = True starts a request's responses again from the beginning once
+      they run out, instead of raising ReplayError. each pass is timed as if
+      the session was recorded again after the last one
+    """
+    def __init__(self, path, speed = 1.0, loop = False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._recorded = {} # request_key() -> list of records
+        self.duration = 0.0 # recorded session length (seconds)
+        for record in read_log(path):
+            key = request_key(record["action"], record.get("request"))
+            self._recorded.setdefault(key, []).append(record)
+            self.duration = max(self.duration, record["t"] + record["secs"])
+        self._queues = dict((key, deque(records))
+            for key, records in self._recorded.items())
+        self._passes = dict.fromkeys(self._recorded, 0) # loops so far, per key
+        self._started = None # time of the first replayed request
+        self.served = 0
+
+    def send_http_request(self, url = "", req_xml = "", soap_action = ""):
+        start = time.time()
+        key = request_key(soap_action, req_xml)
+        with self._lock:
+            if key not in self._recorded:
+                key = (soap_action, None) # recorded without requests
+            queue = self._queues.get(key)
+            if not queue:
+                if not (self.loop and key in self._recorded):
+                    raise ReplayError("no recorded response left for %r"
+                        % (key,))
+                queue = self._queues[key] = deque(self._recorded[key])
+                self._passes[key] += 1
+            record = queue.popleft()
+            offset = record["t"] + self._passes[key] * self.duration
+            if self._started is None:
+                self._started = start - record["t"] / self.speed if self.speed else start
+            self.served += 1
+        if self.speed:
+            done = max(start + record["secs"] / self.speed,
+                self._started + (offset + record["secs"]) / self.speed)
+            delay = done - time.time()
+            if delay > 0:
+                time.sleep(delay)
+        return record["response"].encode("utf-8")
+
+    def remaining(self):
+        """returns {(soap action, market id): responses left}"""
+        with self._lock:
+            return dict((k, len(q)) for k, q in self._queues.items())
+
+    def stats(self):
+        return {}
+
+
+def record(api, path, requests = True):
+    """makes api record its traffic to path. returns the RecordingHttp"""
+    api.http = RecordingHttp(path, api.http, requests)
+    return api.http
+
+
+def replay(api, path, speed = 1.0, loop = False):
+    """makes api replay the log at path. returns the ReplayHttp"""
+    api.http = ReplayHttp(path, speed, loop)
+    return api.http
@@ -0,0 +1,341 @@
+"""
+Several logged in API instances behind one object, with market data calls
+sharded across them.
+
+Betfair budgets data requests per session, so one API is capped at one
+session's rate however many threads use it. A SessionManager logs in one API
+per account (or product id) and routes each market's data calls to the
+session that owns the market's shard, so data throughput grows with the
+number of sessions:
+
+    sessions = SessionManager([("user1", "pass1"), ("user2", "pass2")])
+    sessions.login()
+    sessions.start() # keep-alives in the background
+    prices = sessions.get_market_prices(market_id) # one session per shard
+    books = sessions.get_markets_prices(market_ids) # all shards concurrently
+    ...
+    sessions.close()
+
+* a market always goes to the same session while that session is up, so
+  caches and rate limiters see a steady share of the markets. a session
+  that is down (login failed, account suspended) hands its shard to the
+  next session until it is back
+* each API logs back in by itself when a call meets NO_SESSION (see
+  API.relogin). the manager also sends keep-alives to sessions idle for
+  keep_alive_secs and retries sessions that are down every retry_secs
+* by default every session is an API_T with a RateLimiter of its own, as the
+  budgets are per session. the process wide shared_limiter would make the
+  sessions queue behind one budget again
+* the sessions share one ServerClock (clock.py), which so gets a sample from
+  every reply: sessions.clock.server_now()
+* only market data calls are sharded (MARKET_METHODS). bets and P&L belong to
+  an account: use session(name).api for those. other calls that do not
+  depend on the account, e.g. get_all_markets(), go to the first session
+  that is up
+"""
+
+import threading
+import time
+from zlib import crc32
+
+from api import BATCH_WORKERS
+from api_throttled import API_T
+from clock import ServerClock
+from errors import Error, APIError, SessionError, SESSION_ERRORS
+from ratelimit import RateLimiter
+from workers import WorkerPool
+
+KEEP_ALIVE_SECS = 10 * 60.0 # betfair sessions expire after ~20 mins idle
+RETRY_SECS = 30.0 # between login attempts of a session that is down
+CHECK_SECS = 5.0 # how often the background thread looks at the sessions
+
+# calls that take a market id first and return the same for every account
+MARKET_METHODS = ["get_market", "get_market_prices",
+    "get_complete_market_prices", "get_market_traded_volume"]
+
+# calls that do not depend on the account, served by the first session up
+SHARED_METHODS = ["get_all_markets", "iter_all_markets",
+    "get_active_event_types", "get_all_event_types", "set_betfair_odds",
+    "get_odds_spread"]
+
+
+def default_api(exchange):
+    """an API_T with its own rate limiter (budgets are per session)"""
+    return API_T(exchange, limiter = RateLimiter())
+
+
+def shard(market_id, n):
+    """returns the shard (0 to n-1) of a market id"""
+    try:
+        return int(market_id) % n
+    except ValueError:
+        return crc32(str(market_id)) % n
+
+
+class Session(object):
+    """one API instance, its credentials and its health"""
+    def __init__(self, name, api, username, password, product_id = "82",
+        vendor_id = "0"):
+        self.name = name
+        self.api = api
+        self.username = username
+        self.password = password
+        self.product_id = product_id
+        self.vendor_id = vendor_id
+        self.up = False # logged in and not known to have failed since
+        self.last_error = None
+        self.next_retry = 0.0
+        # metrics, updated from the batch workers and the keep-alive thread
+        self._lock = threading.Lock()
+        self.logins = 0
+        self.failed_logins = 0
+        self.keep_alives = 0
+        self.calls = 0
+        self.session_errors = 0
+
+    def login(self):
+        """logs in. returns "OK" or an Error"""
+        try:
+            resp = self.api.login(self.username, self.password,
+                self.product_id, self.vendor_id)
+        except APIError, e: # api.raise_errors is set
+            resp = e.error
+        if resp == "OK":
+            self.up = True
+            self.last_error = None
+            self.count("logins")
+        else:
+            self.down(resp)
+            self.count("failed_logins")
+        return resp
+
+    def count(self, metric):
+        """adds one to a metric, e.g. count("calls")"""
+        with self._lock:
+            setattr(self, metric, getattr(self, metric) + 1)
+
+    def down(self, error):
+        """marks the session as down until the next successful login"""
+        self.up = False
+        self.last_error = error
+        self.next_retry = time.time() + RETRY_SECS
+
+    def idle_secs(self):
+        """seconds since the last reply from betfair (None = never). local
+        time only, so clock skew with the server does not come into it"""
+        last = self.api.last_reply
+        if last is None:
+            return None
+        return time.time() - last
+
+    def stats(self):
+        with self._lock:
+            return {"name": self.name, "up": self.up,
+                "last_error": self.last_error and str(self.last_error),
+                "logins": self.logins, "failed_logins": self.failed_logins,
+                "keep_alives": self.keep_alives, "calls": self.calls,
+                "session_errors": self.session_errors}
+
+
+class SessionManager(object):
+    """logged in API sessions with market data sharded across them.
+    * accounts: list of (username, password[, product_id[, vendor_id]])
+      tuples or dicts with those keys (and optionally "name", which defaults
+      to the username, or "username:product_id" for repeated usernames)
+    * api_factory: callable(exchange) returning a new API for each session,
+      e.g. lambda exchange: API_T(exchange, limiter = ..., raise_errors = True)
+    * keep_alive_secs: idle time after which a session is sent a keep-alive
+    * workers: threads used by the batch calls (default BATCH_WORKERS per
+      session)
+    """
+    def __init__(self, accounts, exchange = "uk", api_factory = default_api,
+        keep_alive_secs = KEEP_ALIVE_SECS, workers = None):
+        self.sessions = []
+        self.clock = ServerClock() # shared by the sessions' APIs
+        names = set()
+        for account in accounts:
+            if not isinstance(account, dict):
+                account = dict(zip(("username", "password", "product_id",
+                    "vendor_id"), account))
+            name = account.get("name") or account["username"]
+            if name in names:
+                name = "%s:%s" % (name, account.get("product_id", "82"))
+            names.add(name)
+            api = api_factory(exchange)
+            api.clock = self.clock
+            self.sessions.append(Session(name, api,
+                account["username"], account["password"],
+                account.get("product_id", "82"), account.get("vendor_id", "0")))
+        if not self.sessions:
+            raise ValueError("SessionManager needs at least one account")
+        self.keep_alive_secs = keep_alive_secs
+        self.workers = workers or BATCH_WORKERS * len(self.sessions)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def login(self):
+        """logs every session in. returns {session name: "OK" or Error}"""
+        return dict((s.name, s.login()) for s in self.sessions)
+
+    def logout(self):
+        for s in self.sessions:
+            if s.up:
+                s.api.logout()
+                s.up = False
+
+    def start(self):
+        """starts the keep-alive/re-login thread. returns self"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target = self.__run,
+                name = "betfair-sessions")
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def close(self, logout = True):
+        """stops the background thread and the batch workers"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if logout:
+            self.logout()
+
+    def session(self, name):
+        """returns the Session called name"""
+        for s in self.sessions:
+            if s.name == name:
+                return s
+        raise KeyError(name)
+
+    def session_for(self, market_id):
+        """returns the Session serving market_id: the shard's own session
+        if it is up, else the next one that is"""
+        n = len(self.sessions)
+        start = shard(market_id, n)
+        for i in xrange(n):
+            s = self.sessions[(start + i) % n]
+            if s.up:
+                return s
+        return self.sessions[start] # none up, its API may still log back in
+
+    def up(self):
+        """returns the sessions that are up"""
+        return [s for s in self.sessions if s.up]
+
+    def primary(self):
+        """returns the first session that is up (for SHARED_METHODS)"""
+        up = self.up()
+        return up[0] if up else self.sessions[0]
+
+    def call(self, method, market_id, *args, **kwargs):
+        """calls api.<method>(market_id, ...) on market_id's session"""
+        return self.__call(self.session_for(market_id), method, market_id,
+            *args, **kwargs)
+
+    def map(self, method, market_ids, *args, **kwargs):
+        """call() for every market, concurrently. returns a dict of
+        {market_id: result OR error string}; like API's batch calls, errors
+        are returned rather than raised"""
+        if not market_ids:
+            return {}
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = WorkerPool(self.workers)
+        futures = [(market_id, self._pool.submit(self.call, method, market_id,
+            *args, **kwargs)) for market_id in market_ids]
+        results = {}
+        for market_id, future in futures:
+            try:
+                results[market_id] = future.result()
+            except APIError, e:
+                results[market_id] = e.error
+            except Exception, e:
+                results[market_id] = Error("ERROR",
+                    text = "ERROR: %s(%s)" % (type(e).__name__, e))
+        return results
+
+    def get_markets(self, market_ids = None):
+        """see API.get_markets()"""
+        return self.map("get_market", market_ids)
+
+    def get_markets_prices(self, market_ids = None, currency_code = "",
+        as_book = False):
+        """see API.get_markets_prices()"""
+        return self.map("get_market_prices", market_ids, currency_code,
+            as_book)
+
+    def get_markets_traded_volume(self, market_ids = None, currency_code = ""):
+        """see API.get_markets_traded_volume()"""
+        return self.map("get_market_traded_volume", market_ids, currency_code)
+
+    def __getattr__(self, name):
+        # MARKET_METHODS are routed by market id, SHARED_METHODS go to the
+        # primary session
+        if name in MARKET_METHODS:
+            def routed(market_id, *args, **kwargs):
+                return self.call(name, market_id, *args, **kwargs)
+            routed.__name__ = name
+            return routed
+        if name in SHARED_METHODS:
+            def shared(*args, **kwargs):
+                return self.__call(self.primary(), name, *args, **kwargs)
+            shared.__name__ = name
+            return shared
+        raise AttributeError(name)
+
+    @property
+    def API_TIMESTAMP(self):
+        return self.primary().api.API_TIMESTAMP
+
+    def stats(self):
+        """returns a list with each session's health and counters"""
+        return [s.stats() for s in self.sessions]
+
+    def check(self):
+        """sends keep-alives to idle sessions and retries the ones that are
+        down. called every CHECK_SECS by the start() thread"""
+        now = time.time()
+        for s in self.sessions:
+            if not s.up:
+                if now >= s.next_retry:
+                    s.login()
+                continue
+            idle = s.idle_secs()
+            if idle is None or idle >= self.keep_alive_secs:
+                try:
+                    resp = s.api.keep_alive() # logs back in on NO_SESSION
+                except APIError, e:
+                    resp = e.error
+                s.count("keep_alives")
+                if resp != "OK":
+                    s.down(resp)
+                    s.login()
+
+    def __call(self, session, method, *args, **kwargs):
+        session.count("calls")
+        try:
+            result = getattr(session.api, method)(*args, **kwargs)
+        except SessionError, e:
+            session.count("session_errors")
+            session.down(e.error)
+            raise
+        if isinstance(result, Error) and (result.reason or result.code) \
+            in SESSION_ERRORS:
+            # the API's own re-login failed too
+            session.count("session_errors")
+            session.down(result)
+        return result
+
+    def __run(self):
+        while not self._stop.wait(CHECK_SECS):
+            try:
+                self.check()
+            except Exception:
+                pass # never let the keep-alive thread die
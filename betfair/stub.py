@@ -0,0 +1,899 @@
+"""
+Local stub of the betfair SOAP services, for load testing bots and feeds
+without touching betfair.
+
+StubServer is a threaded HTTP server that answers the BFGlobalService and
+BFExchangeService calls the templates cover, in the same xml (and compressed
+string) formats, from an in-memory StubExchange: synthetic markets whose
+prices follow a random walk, and a matching engine for the bets placed on
+them. Point an API at it with API.urls:
+
+    server = StubServer(StubExchange(markets = 500)).start()
+    api = API()
+    api.urls = server.urls()
+    api.login("anyone", "anything")
+    ...
+    server.stop()
+
+or run it on its own and point other processes at it:
+
+    python -m betfair.stub --port 8080 --markets 500 --latency 0.01 0.05
+
+* prices move lazily: each market advances one random walk step per
+  tick_secs elapsed whenever it is next requested, so idle markets cost
+  nothing
+* a back bet matches against the prices available to back at or above its
+  price (a lay bet, to lay at or below), best price first. the remainder
+  rests and is matched at its own price once the market moves through it
+* latency = (min, max) seconds added to every response
+* errors = {APIErrorEnum: probability}, e.g. {"EXCEEDED_THROTTLE": 0.01},
+  returns that API_ERROR instead of handling the request
+* session_ttl expires sessions unused for that many seconds (NO_SESSION)
+* actions without a handler (e.g. getBetHistory) return API_ERROR:
+  INTERNAL_ERROR
+"""
+
+import BaseHTTPServer
+import SocketServer
+import datetime
+import itertools
+import random
+import socket
+import sys
+import threading
+import time
+
+from ticks import TICKS, EPS, round_price
+
+# soap action -> the call's ErrorEnum type
+ERROR_ENUMS = {
+    "login": "LoginErrorEnum",
+    "logout": "LogoutErrorEnum",
+    "keepAlive": "KeepAliveErrorEnum",
+    "getActiveEventTypes": "GetEventsErrorEnum",
+    "getAllEventTypes": "GetEventsErrorEnum",
+    "getAccountFunds": "GetAccountFundsErrorEnum",
+    "getMarket": "GetMarketErrorEnum",
+    "getAllMarkets": "GetAllMarketsErrorEnum",
+    "getMarketPricesCompressed": "GetMarketPricesErrorEnum",
+    "getCompleteMarketPricesCompressed": "GetCompleteMarketPricesErrorEnum",
+    "getMarketTradedVolumeCompressed": "GetMarketTradedVolumeCompressedErrorEnum",
+    "placeBets": "PlaceBetsErrorEnum",
+    "updateBets": "UpdateBetsErrorEnum",
+    "cancelBets": "CancelBetsErrorEnum",
+    "getMUBets": "GetMUBetsErrorEnum",
+    "getMarketProfitAndLoss": "GetMarketProfitAndLossErrorEnum",
+}
+
+# (event type id, name, menu paths, country)
+EVENT_TYPES = [
+    ("7", "Horse Racing", ["\\Horse Racing\\GB\\Kemp", "\\Horse Racing\\GB\\Ascot",
+        "\\Horse Racing\\GB\\York"], "GBR"),
+    ("7", "Horse Racing", ["\\Horse Racing\\IRE\\Leop",
+        "\\Horse Racing\\IRE\\Curragh"], "IRL"),
+    ("4339", "Greyhound Racing", ["\\Greyhound Racing\\GB\\Romf",
+        "\\Greyhound Racing\\GB\\Hove"], "GBR"),
+    ("1", "Soccer", ["\\Soccer\\English Soccer\\Barclays Premier League"], "GBR"),
+    ("2", "Tennis", ["\\Tennis\\Group A\\ATP Nottingham"], "GBR"),
+]
+
+DEPTH = 3 # price levels per side in getMarketPricesCompressed
+LADDER = 10 # price levels per side in getCompleteMarketPricesCompressed
+MAX_BETS = {"placeBets": 60, "updateBets": 15, "cancelBets": 40}
+MIN_STAKE = 2.0
+WALK = (-1, 0, 0, 0, 1) # best back tick moves per step
+MAX_STEPS = 50 # steps caught up per request, older history is skipped
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S"
+NO_DATE = "0001-01-01T00:00:00.000Z"
+
+ENVELOPE = ("<?xml version='1.0' encoding='UTF-8'?>"
+    "<soap:Envelope xmlns:soap='http://schemas.xmlsoap.org/soap/envelope/' "
+    "xmlns:xsi='http://www.w3.org/2001/XMLSchema-instance' "
+    "xmlns:xsd='http://www.w3.org/2001/XMLSchema'><soap:Body>"
+    "<n:%(action)sResponse xmlns:n='http://www.betfair.com/publicapi/stub/'>"
+    "<n:Result xsi:type='n2:%(Action)sResp' "
+    "xmlns:n2='http://www.betfair.com/publicapi/types/stub/'>"
+    "<header xsi:type='n2:APIResponseHeader'>"
+    "<errorCode xsi:type='n2:APIErrorEnum'>%(api_code)s</errorCode>"
+    "<sessionToken xsi:type='xsd:string'>%(token)s</sessionToken>"
+    "<timestamp xsi:type='xsd:dateTime'>%(timestamp)s</timestamp>"
+    "</header>%(body)s"
+    "<errorCode xsi:type='n2:%(enum)s'>%(code)s</errorCode>"
+    "</n:Result></n:%(action)sResponse></soap:Body></soap:Envelope>")
+
+
+def stub_urls(base_url):
+    """returns an API.urls dict sending every service to base_url"""
+    base_url = base_url.rstrip("/")
+    return {"global": base_url + "/global/v3/BFGlobalService",
+        "uk": base_url + "/exchange/v5/BFExchangeService",
+        "aus": base_url + "/exchange/v5/BFExchangeService"}
+
+
+def _value(xml, tag, default = ""):
+    """returns the contents of the first <tag> element of a request"""
+    open_tag = "<" + tag + ">"
+    start = xml.find(open_tag)
+    if start < 0:
+        return default
+    start += len(open_tag)
+    end = xml.find("</" + tag + ">", start)
+    return xml[start:end] if end >= 0 else default
+
+
+def _blocks(xml, tag):
+    """returns the contents of every <tag> element of a request"""
+    open_tag, close_tag = "<" + tag + ">", "</" + tag + ">"
+    return [part.partition(close_tag)[0]
+        for part in xml.split(open_tag)[1:]]
+
+
+def _field(name, xsd_type, val):
+    return "<%s xsi:type='%s'>%s</%s>" % (name, xsd_type, val, name)
+
+
+def _date(dt):
+    return dt.strftime(DATE_FORMAT) + ".%03dZ" % (dt.microsecond // 1000)
+
+
+def _ms(dt):
+    delta = dt - datetime.datetime(1970, 1, 1)
+    return (delta.days * 86400 + delta.seconds) * 1000 + delta.microseconds // 1000
+
+
+def _parse_date(s):
+    """parses a request dateTime. returns None for "null" or junk"""
+    try:
+        return datetime.datetime.strptime(s[:19], DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+class Runner(object):
+    """one selection of a synthetic market. tick is the index in TICKS of the
+    best price available to back; the best price to lay is one tick above"""
+    def __init__(self, selection_id, name, tick):
+        self.selection_id = selection_id
+        self.name = name
+        self.tick = tick
+        self.backs = [] # amounts available to back, best price first
+        self.lays = [] # amounts available to lay, best price first
+        self.traded = {} # price -> amount
+        self.total_matched = 0.0
+        self.last_price = 0.0
+
+
+class Market(object):
+    """a synthetic market and the bets resting on it"""
+    def __init__(self, market_id, name, event_type_id, menu_path, country,
+        event_date, runners, rnd, now):
+        self.market_id = market_id
+        self.name = name
+        self.event_type_id = event_type_id
+        self.menu_path = menu_path
+        self.country = country
+        self.event_date = event_date
+        self.event_ids = [event_type_id, str(298000 + market_id % 1000),
+            str(26000000 + market_id % 1000000)]
+        self.runners = runners
+        self.by_selection = dict((r.selection_id, r) for r in runners)
+        self.rnd = rnd
+        self.updated = now
+        self.bets = [] # every bet placed on the market
+        self.resting = [] # unmatched bets
+        for runner in runners:
+            self.refill(runner)
+
+    def refill(self, runner):
+        rnd = self.rnd
+        runner.backs = [round(rnd.uniform(2, 500), 2) for i in xrange(LADDER)]
+        runner.lays = [round(rnd.uniform(2, 500), 2) for i in xrange(LADDER)]
+
+    def total_matched(self):
+        return sum(r.total_matched for r in self.runners)
+
+
+class Bet(object):
+    """a bet placed on the stub. matches are (transaction id, price, size,
+    matched datetime)"""
+    def __init__(self, bet_id, market, runner, bet_type, price, size, placed):
+        self.bet_id = bet_id
+        self.market = market
+        self.runner = runner
+        self.bet_type = bet_type
+        self.price = price
+        self.size = size
+        self.remaining = size
+        self.placed = placed
+        self.matches = []
+
+
+class StubExchange(object):
+    """the in-memory exchange behind a StubServer.
+    * markets: number of synthetic markets. runners per market are random
+      between 2 and max_runners
+    * tick_secs: seconds per price random walk step
+    * latency: (min, max) seconds added to each response, or None
+    * errors: {APIErrorEnum: probability of returning it}
+    * session_ttl: seconds an unused session stays valid (None = forever)
+    * users: {username: password} to check at login (None = anyone)
+    * balance: starting account balance
+    * seed: makes the markets (and their price paths) repeatable
+    """
+    def __init__(self, markets = 200, max_runners = 14, tick_secs = 1.0,
+        latency = None, errors = None, session_ttl = None, users = None,
+        balance = 1000.0, seed = 0):
+        self.tick_secs = tick_secs
+        self.latency = latency
+        self.errors = errors or {}
+        self.session_ttl = session_ttl
+        self.users = users
+        self.balance = balance
+        self._rnd = random.Random(seed)
+        self._lock = threading.RLock()
+        self._sessions = {} # token -> last used time
+        self._bets = {} # bet id -> Bet
+        self._ids = itertools.count(20000000000) # bet and transaction ids
+        self._markets = {}
+        self._order = [] # market ids in creation order
+        self.__make_markets(markets, max_runners, seed)
+        self._handlers = {
+            "login": self.__login,
+            "logout": self.__logout,
+            "keepAlive": self.__keep_alive,
+            "getActiveEventTypes": self.__event_types,
+            "getAllEventTypes": self.__event_types,
+            "getAccountFunds": self.__account_funds,
+            "getMarket": self.__market,
+            "getAllMarkets": self.__all_markets,
+            "getMarketPricesCompressed": self.__market_prices,
+            "getCompleteMarketPricesCompressed": self.__complete_prices,
+            "getMarketTradedVolumeCompressed": self.__traded_volume,
+            "placeBets": self.__place_bets,
+            "updateBets": self.__update_bets,
+            "cancelBets": self.__cancel_bets,
+            "getMUBets": self.__mu_bets,
+            "getMarketProfitAndLoss": self.__profit_and_loss,
+        }
+        # metrics
+        self.requests = {} # soap action -> count
+        self.injected = 0
+        self.bets_placed = 0
+        self.volume_matched = 0.0
+
+    def handle(self, action, req_xml):
+        """returns the response xml for one soap request"""
+        if self.latency:
+            time.sleep(random.uniform(*self.latency))
+        now = time.time()
+        token = _value(req_xml, "sessionToken")
+        with self._lock:
+            self.requests[action] = self.requests.get(action, 0) + 1
+            if action != "login" and not self.__session_valid(token, now):
+                return self.__respond(action, "", "NO_SESSION", "API_ERROR")
+            for reason, probability in self.errors.items():
+                if self._rnd.random() < probability:
+                    self.injected += 1
+                    return self.__respond(action, token, reason, "API_ERROR")
+            handler = self._handlers.get(action)
+            if handler is None:
+                return self.__respond(action, token, "INTERNAL_ERROR",
+                    "API_ERROR")
+            code, body, token = handler(req_xml, token, now)
+            return self.__respond(action, token, "OK", code, body)
+
+    def market_ids(self):
+        """returns the ids of all synthetic markets"""
+        return [str(market_id) for market_id in self._order]
+
+    def stats(self):
+        with self._lock:
+            return {"requests": dict(self.requests),
+                "sessions": len(self._sessions), "injected": self.injected,
+                "bets_placed": self.bets_placed,
+                "volume_matched": round(self.volume_matched, 2),
+                "unmatched": sum(len(m.resting) for m in self._markets.values())}
+
+    def __respond(self, action, token, api_code, code, body = ""):
+        return ENVELOPE % {"action": action,
+            "Action": action[:1].upper() + action[1:], "api_code": api_code,
+            "token": token, "timestamp": _date(datetime.datetime.utcnow()),
+            "body": body, "code": code,
+            "enum": ERROR_ENUMS.get(action, "APIErrorEnum")}
+
+    def __session_valid(self, token, now):
+        """must be called with self._lock held"""
+        last_used = self._sessions.get(token)
+        if last_used is None:
+            return False
+        if self.session_ttl and now - last_used > self.session_ttl:
+            del self._sessions[token]
+            return False
+        self._sessions[token] = now
+        return True
+
+    def __make_markets(self, n_markets, max_runners, seed):
+        start = datetime.datetime.utcnow().replace(microsecond = 0)
+        now = time.time()
+        for i in xrange(n_markets):
+            rnd = random.Random("%s:%d" % (seed, i))
+            event_type_id, event_name, menus, country = rnd.choice(EVENT_TYPES)
+            market_id = 101000000 + i
+            runners = [Runner(2000000 + i * 100 + j, "Runner %d" % (j + 1),
+                rnd.randint(40, 250)) for j in xrange(rnd.randint(2, max_runners))]
+            event_date = start + datetime.timedelta(
+                minutes = rnd.randint(-30, 24 * 60))
+            market = Market(market_id, "Market %d" % i, event_type_id,
+                rnd.choice(menus) + " " + event_date.strftime("%d %b"),
+                country, event_date, runners, rnd, now)
+            self._markets[market_id] = market
+            self._order.append(market_id)
+
+    def __get_market(self, market_id, now):
+        """returns the market brought up to date, or None"""
+        try:
+            market = self._markets.get(int(market_id))
+        except ValueError:
+            return None
+        if market is not None:
+            steps = int((now - market.updated) / self.tick_secs)
+            if steps > 0:
+                market.updated += steps * self.tick_secs
+                for i in xrange(min(steps, MAX_STEPS)):
+                    self.__step(market)
+        return market
+
+    def __step(self, market):
+        """moves every runner one random walk step, trades a little at the new
+        price and matches resting bets the market has moved through"""
+        rnd = market.rnd
+        top = len(TICKS) - 1 - LADDER
+        for runner in market.runners:
+            runner.tick = min(max(runner.tick + rnd.choice(WALK), LADDER), top)
+            market.refill(runner)
+            self.__trade(runner, TICKS[runner.tick], round(rnd.uniform(0, 50), 2))
+        if market.resting:
+            dt = datetime.datetime.utcnow()
+            for bet in market.resting:
+                runner = bet.runner
+                if bet.bet_type == "B":
+                    if TICKS[runner.tick] >= bet.price - EPS:
+                        self.__fill(bet, bet.price, runner.backs, 0, dt)
+                elif TICKS[runner.tick + 1] <= bet.price + EPS:
+                    self.__fill(bet, bet.price, runner.lays, 0, dt)
+            market.resting = [b for b in market.resting if b.remaining > 0]
+
+    def __trade(self, runner, price, amount):
+        runner.traded[price] = runner.traded.get(price, 0.0) + amount
+        runner.total_matched += amount
+        runner.last_price = price
+
+    def __fill(self, bet, price, amounts, level, dt):
+        """matches as much of bet as amounts[level] allows at price"""
+        size = min(bet.remaining, amounts[level])
+        if size < 0.005:
+            return
+        amounts[level] = round(amounts[level] - size, 2)
+        bet.remaining = round(bet.remaining - size, 2)
+        bet.matches.append((str(self._ids.next()), price, round(size, 2), dt))
+        self.__trade(bet.runner, price, size)
+        self.volume_matched += size
+
+    def __match(self, bet, dt):
+        """matches a new bet against the prices on offer, best first"""
+        runner = bet.runner
+        for level in xrange(LADDER):
+            if bet.remaining <= 0:
+                break
+            if bet.bet_type == "B":
+                price = TICKS[runner.tick - level]
+                if price < bet.price - EPS:
+                    break
+                self.__fill(bet, price, runner.backs, level, dt)
+            else:
+                price = TICKS[runner.tick + 1 + level]
+                if price > bet.price + EPS:
+                    break
+                self.__fill(bet, price, runner.lays, level, dt)
+
+    def __new_bet(self, market, runner, bet_type, price, size, now):
+        dt = datetime.datetime.utcfromtimestamp(now)
+        bet = Bet(str(self._ids.next()), market, runner, bet_type, price,
+            size, dt)
+        self._bets[bet.bet_id] = bet
+        market.bets.append(bet)
+        self.bets_placed += 1
+        self.__match(bet, dt)
+        if bet.remaining > 0:
+            market.resting.append(bet)
+        return bet
+
+    def __cancel(self, bet):
+        """cancels the unmatched remainder of bet. returns the size cancelled"""
+        size = bet.remaining
+        if size > 0:
+            bet.remaining = 0.0
+            bet.market.resting.remove(bet)
+        return size
+
+    # global service
+
+    def __login(self, req_xml, token, now):
+        username = _value(req_xml, "username")
+        if self.users is not None and (username not in self.users
+            or self.users[username] != _value(req_xml, "password")):
+            return "INVALID_USERNAME_OR_PASSWORD", "", ""
+        token = "%032x" % self._rnd.getrandbits(128)
+        self._sessions[token] = now
+        body = (_field("currency", "xsd:string", "GBP")
+            + _field("validUntil", "xsd:dateTime", _date(
+            datetime.datetime.utcfromtimestamp(now + 20 * 60))))
+        return "OK", body, token
+
+    def __logout(self, req_xml, token, now):
+        self._sessions.pop(token, None)
+        return "OK", "", ""
+
+    def __keep_alive(self, req_xml, token, now):
+        return "OK", "", token
+
+    def __event_types(self, req_xml, token, now):
+        seen, items = set(), []
+        for event_type_id, name, menus, country in EVENT_TYPES:
+            if event_type_id not in seen:
+                seen.add(event_type_id)
+                items.append("<n2:EventType xsi:type='n2:EventType'>"
+                    + _field("id", "xsd:int", event_type_id)
+                    + _field("name", "xsd:string", name) + "</n2:EventType>")
+        body = ("<eventTypeItems xsi:type='n2:ArrayOfEventType'>"
+            + "".join(items) + "</eventTypeItems>")
+        return "OK", body, token
+
+    # exchange service
+
+    def __account_funds(self, req_xml, token, now):
+        exposure = 0.0
+        for market in self._markets.values():
+            if market.bets:
+                exposure += min(0.0, min(self.__pnl(market).values()))
+        body = "".join(_field(key, "xsd:double", "%.2f" % val) for key, val in [
+            ("availBalance", self.balance + exposure),
+            ("balance", self.balance), ("exposure", 0.0 - exposure),
+            ("withdrawBalance", self.balance + exposure)])
+        return "OK", body, token
+
+    def __market(self, req_xml, token, now):
+        market = self.__get_market(_value(req_xml, "marketId"), now)
+        if market is None:
+            return "INVALID_MARKET", "", token
+        hierarchy = "".join("<n2:EventId xsi:type='xsd:int'>%s</n2:EventId>"
+            % event_id for event_id in market.event_ids)
+        runners = "".join("<n2:Runner xsi:type='n2:Runner'>"
+            + _field("asianLineId", "xsd:int", "0")
+            + _field("handicap", "xsd:double", "0.0")
+            + _field("name", "xsd:string", r.name)
+            + _field("selectionId", "xsd:int", r.selection_id)
+            + "</n2:Runner>" for r in market.runners)
+        body = ("<market xsi:type='n2:Market'>"
+            + _field("countryISO3", "xsd:string", market.country)
+            + _field("discountAllowed", "xsd:boolean", "true")
+            + _field("eventTypeId", "xsd:int", market.event_type_id)
+            + _field("lastRefresh", "xsd:long", int(now * 1000))
+            + _field("marketBaseRate", "xsd:float", "5.0")
+            + _field("marketId", "xsd:int", market.market_id)
+            + _field("marketStatus", "n2:MarketStatusEnum", "ACTIVE")
+            + _field("marketTime", "xsd:dateTime", _date(market.event_date))
+            + _field("marketType", "n2:MarketTypeEnum", "O")
+            + _field("menuPath", "xsd:string", market.menu_path)
+            + "<eventHierarchy xsi:type='n2:ArrayOfEventId'>" + hierarchy
+            + "</eventHierarchy>"
+            + _field("name", "xsd:string", market.name)
+            + _field("numberOfWinners", "xsd:int", "1")
+            + _field("parentEventId", "xsd:int", market.event_ids[-1])
+            + "<runners xsi:type='n2:ArrayOfRunner'>" + runners + "</runners>"
+            + _field("bspMarket", "xsd:boolean", "false")
+            + "</market>")
+        return "OK", body, token
+
+    def __all_markets(self, req_xml, token, now):
+        event_types = set(_blocks(_value(req_xml, "eventTypeIds"), "int"))
+        countries = set(_blocks(_value(req_xml, "countries"), "Country"))
+        from_date = _parse_date(_value(req_xml, "fromDate"))
+        to_date = _parse_date(_value(req_xml, "toDate"))
+        refresh = int(now * 1000)
+        rows = []
+        for market_id in self._order:
+            market = self._markets[market_id]
+            if ((event_types and market.event_type_id not in event_types)
+                or (countries and market.country not in countries)
+                or (from_date and market.event_date < from_date)
+                or (to_date and market.event_date > to_date)):
+                continue
+            rows.append("%d~%s~O~ACTIVE~%d~%s~/%s~0~1~%s~%d~%d~1~%.2f~N~Y" % (
+                market_id, market.name, _ms(market.event_date),
+                market.menu_path, "/".join(market.event_ids), market.country,
+                refresh, len(market.runners), market.total_matched()))
+        body = ("<marketData xsi:type='xsd:string'>:" + ":".join(rows)
+            + "</marketData>")
+        return "OK", body, token
+
+    def __market_prices(self, req_xml, token, now):
+        market = self.__get_market(_value(req_xml, "marketId"), now)
+        if market is None:
+            return "INVALID_MARKET", "", token
+        rows = ["%d~GBP~ACTIVE~0~1~~true~5.0~%d~~N" % (market.market_id,
+            int(now * 1000))]
+        for i, r in enumerate(market.runners):
+            backs = "".join("%.2f~%.2f~L~%d~" % (TICKS[r.tick - d], r.backs[d],
+                d + 1) for d in xrange(DEPTH) if r.backs[d] > 0)
+            lays = "".join("%.2f~%.2f~B~%d~" % (TICKS[r.tick + 1 + d],
+                r.lays[d], d + 1) for d in xrange(DEPTH) if r.lays[d] > 0)
+            rows.append("%d~%d~%.2f~%.2f~~0.0~false~~~|%s|%s" % (
+                r.selection_id, i, r.total_matched, r.last_price, backs, lays))
+        body = ("<marketPrices xsi:type='xsd:string'>" + ":".join(rows)
+            + "</marketPrices>")
+        return "OK", body, token
+
+    def __complete_prices(self, req_xml, token, now):
+        market = self.__get_market(_value(req_xml, "marketId"), now)
+        if market is None:
+            return "INVALID_MARKET", "", token
+        rows = ["%d~0~" % market.market_id]
+        for i, r in enumerate(market.runners):
+            ladder = ["%.2f~%.2f~0.0~0.0~0.0~" % (TICKS[r.tick - d], r.backs[d])
+                for d in xrange(LADDER - 1, -1, -1)]
+            ladder += ["%.2f~0.0~%.2f~0.0~0.0~" % (TICKS[r.tick + 1 + d], r.lays[d])
+                for d in xrange(LADDER)]
+            rows.append("%d~%d~%.2f~%.2f~~0.0~false~0~~~|%s" % (r.selection_id,
+                i, r.total_matched, r.last_price, "".join(ladder)))
+        body = ("<completeMarketPrices xsi:type='xsd:string'>" + ":".join(rows)
+            + "</completeMarketPrices>")
+        return "OK", body, token
+
+    def __traded_volume(self, req_xml, token, now):
+        market = self.__get_market(_value(req_xml, "marketId"), now)
+        if market is None:
+            return "INVALID_MARKET", "", token
+        rows = []
+        for r in market.runners:
+            rows.append("%d~0~0.0~0.0~0.0" % r.selection_id + "".join(
+                "|%.2f~%.2f" % (price, r.traded[price])
+                for price in sorted(r.traded)))
+        body = ("<tradedVolume xsi:type='xsd:string'>:" + ":".join(rows)
+            + "</tradedVolume>")
+        return "OK", body, token
+
+    def __place_bets(self, req_xml, token, now):
+        blocks = _blocks(req_xml, "PlaceBets")
+        if not blocks or len(blocks) > MAX_BETS["placeBets"]:
+            return "INVALID_NUMBER_OF_BETS", "", token
+        results = []
+        for block in blocks:
+            market = self.__get_market(_value(block, "marketId"), now)
+            if market is None:
+                return "INVALID_MARKET", "", token
+            bet, code = None, "OK"
+            try:
+                runner = market.by_selection.get(int(_value(block, "selectionId")))
+                price = float(_value(block, "price"))
+                size = round(float(_value(block, "size")), 2)
+            except ValueError:
+                runner, price, size = None, 0.0, 0.0
+            bet_type = _value(block, "betType")
+            if runner is None:
+                code = "SELECTION_REMOVED"
+            elif bet_type not in ("B", "L"):
+                code = "INVALID_BET_TYPE"
+            elif abs(round_price(price) - price) > EPS or price < TICKS[0]:
+                code = "INVALID_PRICE"
+            elif size < MIN_STAKE:
+                code = "INVALID_SIZE"
+            else:
+                bet = self.__new_bet(market, runner, bet_type,
+                    round_price(price), size, now)
+            matched = sum(m[2] for m in bet.matches) if bet else 0.0
+            average = (sum(m[1] * m[2] for m in bet.matches) / matched
+                if matched else 0.0)
+            results.append("<n2:PlaceBetsResult xsi:type='n2:PlaceBetsResult'>"
+                + _field("averagePriceMatched", "xsd:double", "%.2f" % average)
+                + _field("betId", "xsd:long", bet.bet_id if bet else "0")
+                + _field("resultCode", "n2:PlaceBetsResultEnum", code)
+                + _field("sizeMatched", "xsd:double", "%.2f" % matched)
+                + _field("success", "xsd:boolean", bet and "true" or "false")
+                + "</n2:PlaceBetsResult>")
+        body = ("<betResults xsi:type='n2:ArrayOfPlaceBetsResult'>"
+            + "".join(results) + "</betResults>")
+        return "OK", body, token
+
+    def __update_bets(self, req_xml, token, now):
+        """a new price cancels the remainder and places it at the new price
+        (newSize is ignored, as on betfair). otherwise a larger size places a
+        new bet for the difference and a smaller one cancels part of it"""
+        blocks = _blocks(req_xml, "UpdateBets")
+        if not blocks or len(blocks) > MAX_BETS["updateBets"]:
+            return "INVALID_NUMBER_OF_BETS", "", token
+        results = []
+        for block in blocks:
+            bet_id = _value(block, "betId")
+            bet = self._bets.get(bet_id)
+            new_bet, cancelled, code = None, 0.0, "OK"
+            try:
+                old_price = float(_value(block, "oldPrice"))
+                new_price = float(_value(block, "newPrice"))
+                old_size = float(_value(block, "oldSize"))
+                new_size = float(_value(block, "newSize"))
+            except ValueError:
+                bet, code = None, "INVALID_NEW_PRICE"
+            if bet is None or bet.remaining <= 0:
+                if code == "OK":
+                    code = "BET_TAKEN_OR_LAPSED"
+            elif abs(new_price - old_price) > EPS:
+                if abs(round_price(new_price) - new_price) > EPS:
+                    code = "INVALID_NEW_PRICE"
+                else:
+                    cancelled = self.__cancel(bet)
+                    new_bet = self.__new_bet(bet.market, bet.runner,
+                        bet.bet_type, round_price(new_price), cancelled, now)
+            elif new_size > old_size + EPS:
+                if new_size - old_size < MIN_STAKE:
+                    code = "INVALID_SIZE"
+                else:
+                    new_bet = self.__new_bet(bet.market, bet.runner,
+                        bet.bet_type, bet.price, round(new_size - old_size, 2),
+                        now)
+            elif new_size < old_size - EPS:
+                cancelled = round(min(old_size - new_size, bet.remaining), 2)
+                bet.remaining = round(bet.remaining - cancelled, 2)
+                if bet.remaining <= 0:
+                    bet.market.resting.remove(bet)
+            results.append("<n2:UpdateBetsResult xsi:type='n2:UpdateBetsResult'>"
+                + _field("betId", "xsd:long", bet_id)
+                + _field("newBetId", "xsd:long", new_bet.bet_id if new_bet else "0")
+                + _field("newPrice", "xsd:double", "%.2f" % (
+                    new_bet.price if new_bet else 0.0))
+                + _field("newSize", "xsd:double", "%.2f" % (
+                    new_bet.size if new_bet else 0.0))
+                + _field("resultCode", "n2:UpdateBetsResultEnum", code)
+                + _field("sizeCancelled", "xsd:double", "%.2f" % cancelled)
+                + _field("success", "xsd:boolean",
+                    code == "OK" and "true" or "false")
+                + "</n2:UpdateBetsResult>")
+        body = ("<betResults xsi:type='n2:ArrayOfUpdateBetsResult'>"
+            + "".join(results) + "</betResults>")
+        return "OK", body, token
+
+    def __cancel_bets(self, req_xml, token, now):
+        bet_ids = _blocks(req_xml, "betId")
+        if not bet_ids or len(bet_ids) > MAX_BETS["cancelBets"]:
+            return "INVALID_NUMBER_OF_CANCELLATIONS", "", token
+        results = []
+        for bet_id in bet_ids:
+            bet = self._bets.get(bet_id)
+            cancelled = self.__cancel(bet) if bet is not None else 0.0
+            matched = sum(m[2] for m in bet.matches) if bet is not None else 0.0
+            results.append("<n2:CancelBetsResult xsi:type='n2:CancelBetsResult'>"
+                + _field("betId", "xsd:long", bet_id)
+                + _field("resultCode", "n2:CancelBetsResultEnum",
+                    cancelled and "REMAINING_CANCELLED" or "TAKEN_OR_LAPSED")
+                + _field("sizeCancelled", "xsd:double", "%.2f" % cancelled)
+                + _field("sizeMatched", "xsd:double", "%.2f" % matched)
+                + _field("success", "xsd:boolean", cancelled and "true" or "false")
+                + "</n2:CancelBetsResult>")
+        body = ("<betResults xsi:type='n2:ArrayOfCancelBetsResult'>"
+            + "".join(results) + "</betResults>")
+        return "OK", body, token
+
+    def __mu_bets(self, req_xml, token, now):
+        market_id = _value(req_xml, "marketId", "0")
+        status = _value(req_xml, "betStatus", "MU")
+        since = _parse_date(_value(req_xml, "matchedSince"))
+        until = None
+        if since is not None and _value(req_xml, "excludeLastSecond") == "true":
+            until = datetime.datetime.utcfromtimestamp(now - 1.0)
+        try:
+            start = int(_value(req_xml, "startRecord", "0"))
+            count = int(_value(req_xml, "recordCount", "200"))
+        except ValueError:
+            return "INVALID_START_RECORD", "", token
+        if market_id != "0":
+            market = self.__get_market(market_id, now)
+            if market is None:
+                return "INVALID_MARKET_ID", "", token
+            bets = market.bets
+        else:
+            for market in self._markets.values():
+                if market.resting:
+                    self.__get_market(market.market_id, now)
+            bets = self._bets.values()
+        records = [] # (bet, transaction id, price, size, matched datetime)
+        for bet in bets:
+            if "M" in status:
+                for txn, price, size, matched in bet.matches:
+                    if ((since is None or matched >= since)
+                        and (until is None or matched < until)):
+                        records.append((bet, txn, price, size, matched))
+            if "U" in status and since is None and bet.remaining > 0:
+                records.append((bet, bet.bet_id, bet.price, bet.remaining, None))
+        if not records:
+            return "NO_RESULTS", "", token
+        order_by = _value(req_xml, "orderBy", "NONE")
+        if order_by == "MATCHED_DATE":
+            records.sort(key = lambda r: (r[4] or r[0].placed, r[1]))
+        elif order_by == "BET_ID":
+            records.sort(key = lambda r: (int(r[0].bet_id), r[1]))
+        else:
+            records.sort(key = lambda r: (r[0].placed, int(r[0].bet_id), r[1]))
+        if _value(req_xml, "sortOrder") == "DESC":
+            records.reverse()
+        items = []
+        for bet, txn, price, size, matched in records[start:start + count]:
+            items.append("<n2:MUBet xsi:type='n2:MUBet'>"
+                + _field("asianLineId", "xsd:int", "0")
+                + _field("betId", "xsd:long", bet.bet_id)
+                + _field("transactionId", "xsd:long", txn)
+                + _field("betStatus", "n2:BetStatusEnum",
+                    matched is None and "U" or "M")
+                + _field("marketId", "xsd:int", bet.market.market_id)
+                + _field("matchedDate", "xsd:dateTime",
+                    matched is None and NO_DATE or _date(matched))
+                + _field("placedDate", "xsd:dateTime", _date(bet.placed))
+                + _field("price", "xsd:double", "%.2f" % price)
+                + _field("selectionId", "xsd:int", bet.runner.selection_id)
+                + _field("size", "xsd:double", "%.2f" % size)
+                + _field("betType", "n2:BetTypeEnum", bet.bet_type)
+                + _field("betCategoryType", "n2:BetCategoryTypeEnum", "E")
+                + _field("betPersistenceType", "n2:BetPersistenceTypeEnum", "NONE")
+                + _field("bspLiability", "xsd:double", "0.0")
+                + _field("handicap", "xsd:double", "0.0")
+                + "</n2:MUBet>")
+        body = ("<bets xsi:type='n2:ArrayOfMUBet'>" + "".join(items) + "</bets>"
+            + _field("totalRecordCount", "xsd:int", len(records)))
+        return "OK", body, token
+
+    def __pnl(self, market):
+        """returns {selection id: profit if it wins} from the matched bets"""
+        pnl = dict((r.selection_id, 0.0) for r in market.runners)
+        for bet in market.bets:
+            for txn, price, size, matched in bet.matches:
+                win = (price - 1.0) * size
+                if bet.bet_type == "L":
+                    win, size = -win, -size
+                for selection_id in pnl:
+                    if selection_id == bet.runner.selection_id:
+                        pnl[selection_id] += win
+                    else:
+                        pnl[selection_id] -= size
+        return pnl
+
+    def __profit_and_loss(self, req_xml, token, now):
+        market = self.__get_market(_value(req_xml, "marketID"), now)
+        if market is None:
+            return "INVALID_MARKET", "", token
+        pnl = self.__pnl(market)
+        items = "".join("<n2:ProfitAndLoss xsi:type='n2:ProfitAndLoss'>"
+            + _field("ifWin", "xsd:double", "%.2f" % pnl.get(r.selection_id, 0.0))
+            + _field("selectionId", "xsd:int", r.selection_id)
+            + _field("selectionName", "xsd:string", r.name)
+            + "</n2:ProfitAndLoss>" for r in market.runners)
+        body = ("<annotations xsi:type='n2:ArrayOfProfitAndLoss'>" + items
+            + "</annotations>" + _field("marketId", "xsd:int", market.market_id))
+        return "OK", body, token
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """answers soap POSTs from StubServer.exchange over keep-alive
+    connections"""
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1 # send headers and body together (no delayed ACK stalls)
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        req_xml = self.rfile.read(length)
+        action = self.headers.get("SOAPAction", "").strip('"')
+        resp_xml = self.server.exchange.handle(action, req_xml)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(resp_xml)))
+        self.end_headers()
+        self.wfile.write(resp_xml)
+
+    def log_message(self, format, *args):
+        pass # one line per request would swamp a load test
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """threaded http server for a StubExchange. port 0 picks a free port"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, exchange = None, host = "127.0.0.1", port = 0):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), _Handler)
+        self.exchange = exchange if exchange is not None else StubExchange()
+        self._thread = None
+        self._requests = {} # open client socket -> handler thread
+        self._requests_lock = threading.Lock()
+
+    @property
+    def url(self):
+        return "http://%s:%d" % self.server_address[:2]
+
+    def urls(self):
+        """returns the API.urls for this server"""
+        return stub_urls(self.url)
+
+    def start(self):
+        """serves on a background (daemon) thread. returns self"""
+        self._thread = threading.Thread(target = self.serve_forever,
+            name = "stub-exchange")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout = 1.0):
+        """stops serving and closes kept-alive connections, waiting up to
+        timeout for their handler threads, which would otherwise block until
+        interpreter exit"""
+        self.shutdown()
+        self.server_close()
+        with self._requests_lock:
+            open_requests = self._requests.items()
+        for request, thread in open_requests:
+            try:
+                request.shutdown(socket.SHUT_RDWR) # wakes a blocked recv()
+            except socket.error:
+                pass # already gone
+        deadline = time.time() + timeout
+        for request, thread in open_requests:
+            thread.join(max(deadline - time.time(), 0.0))
+
+    def process_request(self, request, client_address):
+        """ThreadingMixIn.process_request(), keeping the thread"""
+        thread = threading.Thread(target = self.process_request_thread,
+            args = (request, client_address))
+        thread.daemon = self.daemon_threads
+        with self._requests_lock:
+            self._requests[request] = thread
+        thread.start()
+
+    def shutdown_request(self, request):
+        with self._requests_lock:
+            self._requests.pop(request, None)
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+
+def main(argv = None):
+    import argparse
+    parser = argparse.ArgumentParser(description = "local stub betfair exchange")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8080,
+        help = "0 picks a free port")
+    parser.add_argument("--markets", type = int, default = 200)
+    parser.add_argument("--tick-secs", type = float, default = 1.0)
+    parser.add_argument("--latency", type = float, nargs = 2, default = None,
+        metavar = ("MIN", "MAX"), help = "seconds added to each response")
+    parser.add_argument("--error", action = "append", default = [],
+        metavar = "ENUM=P", help = "e.g. EXCEEDED_THROTTLE=0.01 (repeatable)")
+    parser.add_argument("--session-ttl", type = float, default = None)
+    parser.add_argument("--seed", type = int, default = 0)
+    args = parser.parse_args(argv)
+    errors = {}
+    for item in args.error:
+        reason, _, probability = item.partition("=")
+        errors[reason] = float(probability)
+    exchange = StubExchange(args.markets, tick_secs = args.tick_secs,
+        latency = args.latency, errors = errors,
+        session_ttl = args.session_ttl, seed = args.seed)
+    server = StubServer(exchange, args.host, args.port)
+    print "serving %d markets on %s" % (args.markets, server.url)
+    sys.stdout.flush() # for parents waiting on the url, see benchmarks/exchange_throughput.py
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Request templates compiled into static text and named slots.
+
+The raw XML templates used to be filled in with repeated set_value() and
+remove_string() calls, each of which scans and copies the whole string.
+A RequestTemplate splits the template once per set of element names into the
+text between those elements, so a request is assembled with a single join:
+
+    tmpl = RequestTemplate(xml)
+    req_xml = tmpl.build({"marketId": "123", "currencyCode": None})
+
+* values are element contents keyed by tag name (e.g. "marketId" fills
+  <marketId>...</marketId>). the first occurrence of the tag is used, which
+  for "sessionToken" is the request header.
+* a value of None removes the element, tags included (and its trailing
+  newline), just like remove_string(xml, "<tag>", "</tag>\\n").
+* elements not mentioned keep the template's default content.
+
+TemplateDir reads and wraps the templates of a service folder on demand.
+"""
+
+import os
+import threading
+
+
+class RequestTemplate(object):
+    """a request xml template with lazily compiled slot builders"""
+    def __init__(self, xml):
+        self.xml = xml
+        self._compiled = {} # tuple of slot names -> (first static part, slots)
+
+    def build(self, values):
+        """returns the request xml with values filled in"""
+        key = tuple(sorted(values))
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = self._compiled[key] = self.__compile(key)
+        head, slots = compiled
+        out = [head]
+        for name, open_tag, close_tag, static in slots:
+            val = values[name]
+            if val is not None:
+                out.append(open_tag)
+                out.append(val)
+                out.append(close_tag)
+            out.append(static)
+        return "".join(out)
+
+    def __compile(self, names):
+        """splits the template around the named elements.
+        returns (head, [(name, open_tag, close_tag, static_after), ...])"""
+        xml = self.xml
+        spans = []
+        for name in names:
+            open_tag = "<" + name + ">"
+            close_tag = "</" + name + ">"
+            start = xml.find(open_tag)
+            if start < 0:
+                raise KeyError("template has no <%s> element" % name)
+            end = xml.find(close_tag, start + len(open_tag))
+            if end < 0:
+                raise KeyError("template has no </%s> tag" % name)
+            stop = end + len(close_tag)
+            if xml[stop:stop + 1] == "\n":
+                close_tag += "\n"
+                stop += 1
+            spans.append((start, stop, name, open_tag, close_tag))
+        spans.sort()
+        slots = []
+        pos = 0
+        head = None
+        for start, stop, name, open_tag, close_tag in spans:
+            if start < pos:
+                raise ValueError("<%s> overlaps another slot" % name)
+            if head is None:
+                head = xml[:start]
+            else:
+                slots[-1][3] = xml[pos:start]
+            slots.append([name, open_tag, close_tag, ""])
+            pos = stop
+        if head is None:
+            return xml, []
+        slots[-1][3] = xml[pos:]
+        return head, [tuple(s) for s in slots]
+
+
+class TemplateDir(object):
+    """the request templates of one service folder (e.g. templates/uk),
+    looked up by soap action. each template is read from disk and wrapped
+    in a RequestTemplate the first time it is used, so a process only pays
+    for the calls it makes. thread-safe; meant to be shared by every API
+    instance (see api.shared_templates())
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._files = None # soap action -> file name
+        self._templates = {} # soap action -> RequestTemplate
+
+    def __getitem__(self, soap_action):
+        tmpl = self._templates.get(soap_action)
+        if tmpl is None:
+            with self._lock:
+                tmpl = self._templates.get(soap_action)
+                if tmpl is None:
+                    file_name = self.__files().get(soap_action)
+                    if file_name is None:
+                        raise KeyError(soap_action)
+                    with open(os.path.join(self.path, file_name), "r") as f:
+                        xml = f.read()
+                    tmpl = self._templates[soap_action] = RequestTemplate(xml)
+        return tmpl
+
+    def __contains__(self, soap_action):
+        return soap_action in self.keys()
+
+    def keys(self):
+        """returns the soap actions with a template"""
+        with self._lock:
+            return self.__files().keys()
+
+    def loaded(self):
+        """returns the soap actions read from disk so far"""
+        return self._templates.keys()
+
+    def __files(self):
+        """must be called with self._lock held"""
+        if self._files is None:
+            # e.g. "BFExchangeService.getMarket.req.xml" -> "getMarket"
+            self._files = dict((file_name.split(".")[1], file_name)
+                for file_name in os.listdir(self.path)
+                if file_name.endswith(".req.xml"))
+        return self._files
@@ -0,0 +1,127 @@
+"""
+Betfair price ladder (the 350 valid odds from 1.01 to 1000) and tick maths.
+
+Prices are located with binary search instead of scanning the ladder, so
+rounding, pip shifting and spreads are O(log n):
+
+    round_price(2.01) # 2.02 (nearest tick, halves round up)
+    round_price(2.01, "down") # 2.0
+    shift_price(2.0, 3) # 2.06
+    tick_distance(2.0, 2.06) # 3
+
+The *_prices() functions do the same for whole arrays of prices in one
+numpy call (numpy is only needed, and only imported, for these):
+
+    round_prices([1.234, 5.55, 17.3]) # array([ 1.23,  5.6 ,  17.5 ])
+    shift_prices([2.0, 3.0], [1, -1]) # array([ 2.02,  2.98])
+
+* mode is "nearest", "up" or "down"
+* prices outside the ladder are clipped to 1.01/1000 and shifts stop at the
+  ends of the ladder, like API.set_betfair_odds() always did
+* NaN prices stay NaN in the array functions
+"""
+
+from bisect import bisect_left
+
+np = None # numpy, imported by _numpy() on first use
+TICK_ARRAY = None # TICKS as a numpy array, see _numpy()
+
+# (from, to, increment) in hundredths, so the ladder is built without float error
+TICK_BANDS = [(101, 200, 1), (200, 300, 2), (300, 400, 5), (400, 600, 10),
+    (600, 1000, 20), (1000, 2000, 50), (2000, 3000, 100), (3000, 5000, 200),
+    (5000, 10000, 500), (10000, 100000, 1000)]
+
+TICKS = [c / 100.0 for start, stop, step in TICK_BANDS
+    for c in xrange(start, stop, step)] + [1000.0]
+MIN_PRICE = TICKS[0]
+MAX_PRICE = TICKS[-1]
+EPS = 1e-9 # prices this close to a tick are on it (float noise)
+
+MODES = ("nearest", "up", "down")
+
+
+def _numpy():
+    """imports numpy and builds TICK_ARRAY the first time an array function
+    is called. importing numpy takes longer than the rest of the package, so
+    code that never uses the array functions does not pay for it"""
+    global np, TICK_ARRAY
+    if np is None:
+        import numpy
+        TICK_ARRAY = numpy.array(TICKS)
+        np = numpy
+    return np
+
+
+def tick_index(price, mode = "nearest"):
+    """returns the index in TICKS of price rounded onto the ladder"""
+    if mode not in MODES:
+        raise ValueError("mode must be one of %s, not %r" % (MODES, mode))
+    if price <= MIN_PRICE:
+        return 0
+    if price >= MAX_PRICE:
+        return len(TICKS) - 1
+    hi = bisect_left(TICKS, price - EPS) # first tick >= price
+    if mode == "up" or TICKS[hi] - price <= EPS:
+        return hi
+    if mode == "down":
+        return hi - 1
+    if TICKS[hi] - price <= price - TICKS[hi - 1] + EPS:
+        return hi
+    return hi - 1
+
+
+def round_price(price, mode = "nearest"):
+    """returns price rounded to a valid betfair price"""
+    return TICKS[tick_index(float(price), mode)]
+
+
+def shift_price(price, pips, mode = "nearest"):
+    """rounds price onto the ladder and moves it by pips ticks (negative =
+    shorter odds). stops at 1.01 and 1000"""
+    index = tick_index(float(price), mode) + pips
+    return TICKS[min(max(index, 0), len(TICKS) - 1)]
+
+
+def tick_distance(from_price, to_price):
+    """returns the number of ticks from from_price to to_price (negative if
+    to_price is shorter), rounding both to the nearest tick first"""
+    return tick_index(float(to_price)) - tick_index(float(from_price))
+
+
+def tick_indices(prices, mode = "nearest"):
+    """vectorised tick_index(). returns (indices, nan_mask); indices of NaN
+    prices are 0 and should be masked out"""
+    if mode not in MODES:
+        raise ValueError("mode must be one of %s, not %r" % (MODES, mode))
+    _numpy()
+    p = np.asarray(prices, dtype = np.float64)
+    nan = np.isnan(p)
+    p = np.clip(np.where(nan, MIN_PRICE, p), MIN_PRICE, MAX_PRICE)
+    hi = np.searchsorted(TICK_ARRAY, p - EPS)
+    if mode == "up":
+        return hi, nan
+    lo = np.maximum(hi - 1, 0)
+    if mode == "down":
+        return np.where(TICK_ARRAY[hi] - p <= EPS, hi, lo), nan
+    return np.where(TICK_ARRAY[hi] - p <= p - TICK_ARRAY[lo] + EPS, hi, lo), nan
+
+
+def round_prices(prices, mode = "nearest"):
+    """vectorised round_price(). returns a float array"""
+    index, nan = tick_indices(prices, mode)
+    return np.where(nan, np.nan, TICK_ARRAY[index])
+
+
+def shift_prices(prices, pips, mode = "nearest"):
+    """vectorised shift_price(). pips is an int or an array of ints"""
+    index, nan = tick_indices(prices, mode)
+    index = np.clip(index + np.asarray(pips), 0, len(TICKS) - 1)
+    return np.where(nan, np.nan, TICK_ARRAY[index])
+
+
+def tick_distances(from_prices, to_prices):
+    """vectorised tick_distance(). returns a float array (NaN where either
+    price is NaN)"""
+    i, nan_i = tick_indices(from_prices)
+    j, nan_j = tick_indices(to_prices)
+    return np.where(nan_i | nan_j, np.nan, j - i)
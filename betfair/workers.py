@@ -0,0 +1,116 @@
+"""
+Minimal futures/worker pool used to keep many API requests in flight at once.
+Only built-in libraries are used (python 2 has no concurrent.futures/asyncio).
+"""
+
+import logging
+import sys
+import threading
+from Queue import Queue
+
+
+class Future(object):
+    """result of a call running on a WorkerPool"""
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout = None):
+        """blocks until the call finishes. re-raises any exception it raised"""
+        if not self._done.wait(timeout):
+            raise RuntimeError("Future.result() timed out after %s seconds" % timeout)
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout = None):
+        if not self._done.wait(timeout):
+            raise RuntimeError("Future.exception() timed out after %s seconds" % timeout)
+        return self._exc_info[1] if self._exc_info else None
+
+    def add_done_callback(self, fn):
+        """calls fn(future) once done (immediately if already done).
+        exceptions raised by fn are logged, not propagated"""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        self.__call_back(fn)
+
+    def set_result(self, result):
+        self._result = result
+        self.__finish()
+
+    def set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self.__finish()
+
+    def __finish(self):
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            self.__call_back(fn)
+
+    def __call_back(self, fn):
+        # a failing callback must not skip the others or fail the future
+        try:
+            fn(self)
+        except Exception:
+            logging.getLogger(__name__).exception(
+                "done callback %r raised" % fn)
+
+
+class WorkerPool(object):
+    """fixed number of daemon threads executing submitted calls"""
+    def __init__(self, workers = 8):
+        self.workers = workers
+        self._queue = Queue()
+        self._threads = []
+        for i in xrange(workers):
+            t = threading.Thread(target = self.__run, name = "betfair-worker-%d" % i)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, fn, *args, **kwargs):
+        """schedules fn(*args, **kwargs) and returns a Future"""
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def map(self, fn, items):
+        """calls fn(item) for every item concurrently. returns a list of futures
+        in the same order as items"""
+        return [self.submit(fn, item) for item in items]
+
+    def shutdown(self, wait = True):
+        for t in self._threads:
+            self._queue.put(None)
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def __run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            future, fn, args, kwargs = job
+            try:
+                result = fn(*args, **kwargs)
+            except:
+                future.set_exc_info(sys.exc_info())
+            else:
+                future.set_result(result)
+
+
+def wait_all(futures, timeout = None):
+    """returns the results of futures in order, raising the first exception"""
+    return [f.result(timeout) for f in futures]
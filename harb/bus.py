@@ -0,0 +1,208 @@
+"""
+In-process publish/subscribe bus, so that feeds hand their posts over
+without waiting for the subscribers.
+
+Messages are published to a topic, e.g. ('quotes', market_id), and queued
+for every subscription to that topic (or to all topics, topic=None). Each
+subscription has its own bounded queue, drained in order by the bus's
+worker threads, so a slow Mongo insert or bet round trip only delays its own
+subscription. What happens when a subscription's queue is full is up to its
+policy:
+* 'drop_oldest': the oldest queued message makes room (the default)
+* 'drop_newest': the new message is dropped
+* 'coalesce': a queued message of the same topic is replaced by the new one
+  (even before the queue is full), so a slow subscriber only ever gets the
+  latest snapshot. not for deltas, which must all be applied
+* 'block': the publisher waits for room. keeps every message, at the cost of
+  the publisher's timing once the subscriber is maxlen behind
+
+    bus = MessageBus()
+    feed = QuoteFeed(client, market_id, bus=bus)
+    feed.subscribe(bot.process_quotes, policy='coalesce')
+    ...
+    print(bus.report())
+"""
+from __future__ import print_function, division
+
+import collections
+import logging
+import threading
+import time
+
+from betfair.workers import WorkerPool
+from scheduler import Histogram
+
+WORKERS = 8
+MAXLEN = 100
+POLICIES = ('drop_oldest', 'drop_newest', 'coalesce', 'block')
+BATCH = 32  # messages a subscription handles before letting the others run
+
+
+class Subscription(object):
+    """one subscriber's queue and statistics"""
+    def __init__(self, bus, topic, subscriber, maxlen, policy):
+        if policy not in POLICIES:
+            raise ValueError('policy must be one of %s, not %r' % (POLICIES, policy))
+        self.topic = topic
+        self.subscriber = subscriber
+        self.name = getattr(subscriber, '__name__', type(subscriber).__name__)
+        self.maxlen = maxlen
+        self.policy = policy
+        self.closed = False
+        self._bus = bus
+        self._queue = collections.deque()  # [topic, timestamp, data, published]
+        self._pending = {}  # topic -> its queued message, for 'coalesce'
+        self._running = False
+        self._cond = threading.Condition(threading.Lock())
+        self.latency = Histogram()  # ms from publish to delivery
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    def put(self, topic, timestamp, data):
+        with self._cond:
+            if self.closed:
+                return
+            if self.policy == 'coalesce' and topic in self._pending:
+                self._pending[topic][1:] = [timestamp, data, time.time()]
+                self.coalesced += 1
+                return
+            while len(self._queue) >= self.maxlen:
+                if self.policy == 'block':
+                    self._cond.wait()
+                    if self.closed:
+                        return
+                elif self.policy == 'drop_newest':
+                    self.dropped += 1
+                    return
+                else:
+                    self._forget(self._queue.popleft())
+                    self.dropped += 1
+            message = [topic, timestamp, data, time.time()]
+            self._queue.append(message)
+            if self.policy == 'coalesce':
+                self._pending[topic] = message
+            self.max_depth = max(self.max_depth, len(self._queue))
+            if not self._running:
+                self._running = True
+                self._bus._pool.submit(self._drain)
+
+    def depth(self):
+        return len(self._queue)
+
+    def idle(self):
+        with self._cond:
+            return not self._queue and not self._running
+
+    def stats(self):
+        return {'subscriber': self.name, 'topic': self.topic, 'policy': self.policy,
+                'delivered': self.delivered, 'dropped': self.dropped, 'coalesced': self.coalesced,
+                'errors': self.errors, 'depth': len(self._queue), 'max_depth': self.max_depth,
+                'latency_ms': self.latency.summary()}
+
+    def _forget(self, message):
+        if self._pending.get(message[0]) is message:
+            del self._pending[message[0]]
+
+    def _drain(self):
+        for _ in range(BATCH):
+            with self._cond:
+                if not self._queue:
+                    self._running = False
+                    self._cond.notify_all()
+                    return
+                message = self._queue.popleft()
+                self._forget(message)
+                self._cond.notify_all()
+            topic, timestamp, data, published = message
+            self.latency.add((time.time() - published) * 1000)
+            try:
+                self.subscriber(timestamp, data)
+                self.delivered += 1
+            except Exception:
+                self.errors += 1
+                logging.exception('subscriber %s failed on %s', self.name, topic)
+        with self._cond:
+            if self._queue:
+                self._bus._pool.submit(self._drain)  # back of the line
+            else:
+                self._running = False
+                self._cond.notify_all()
+
+
+class MessageBus(object):
+    """topics -> subscriptions, delivered on a pool of worker threads"""
+    def __init__(self, workers=WORKERS):
+        self._pool = WorkerPool(workers)
+        self._topics = {}  # topic -> [Subscription]
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic, subscriber, maxlen=MAXLEN, policy='drop_oldest'):
+        """calls subscriber(timestamp, data) for every message published to
+        topic (None: every topic). returns the Subscription"""
+        subscription = Subscription(self, topic, subscriber, maxlen, policy)
+        with self._lock:
+            # copy on write, so publish() can iterate without the lock
+            self._topics[topic] = self._topics.get(topic, []) + [subscription]
+        return subscription
+
+    def unsubscribe(self, topic, subscriber):
+        """stops the subscriptions of subscriber to topic. messages already
+        queued for them are dropped"""
+        with self._lock:
+            subscriptions = self._topics.get(topic, [])
+            gone = [s for s in subscriptions if s.subscriber == subscriber]
+            self._topics[topic] = [s for s in subscriptions if s not in gone]
+        for subscription in gone:
+            with subscription._cond:
+                subscription.closed = True
+                subscription._queue.clear()
+                subscription._pending.clear()
+                subscription._cond.notify_all()
+
+    def subscribed(self, topic):
+        """True if anything would receive a message published to topic"""
+        return bool(self._topics.get(topic) or self._topics.get(None))
+
+    def publish(self, topic, timestamp, data):
+        """queues data for the subscribers of topic. returns at once, unless a
+        'block' subscription is full"""
+        for subscription in self._topics.get(topic, ()):
+            subscription.put(topic, timestamp, data)
+        if topic is not None:
+            for subscription in self._topics.get(None, ()):
+                subscription.put(topic, timestamp, data)
+
+    def subscriptions(self):
+        with self._lock:
+            return [s for subscriptions in self._topics.values() for s in subscriptions]
+
+    def flush(self, timeout=None):
+        """waits until every queued message has been delivered. returns False
+        on timeout"""
+        deadline = None if timeout is None else time.time() + timeout
+        while not all(s.idle() for s in self.subscriptions()):
+            if deadline is not None and time.time() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def close(self, timeout=None):
+        """delivers what is queued (see flush()), then stops the workers"""
+        self.flush(timeout)
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        return [s.stats() for s in self.subscriptions()]
+
+    def report(self):
+        """returns a one line per subscription summary of stats()"""
+        lines = ['%-24s %-28s %9s %7s %7s %5s %6s %9s' % (
+            'subscriber', 'topic', 'delivered', 'dropped', 'merged', 'err', 'depth', 'lat p99')]
+        for s in self.stats():
+            lines.append('%-24s %-28s %9d %7d %7d %5d %6d %7.0fms' % (
+                s['subscriber'][:24], str(s['topic'])[:28], s['delivered'], s['dropped'],
+                s['coalesced'], s['errors'], s['max_depth'], s['latency_ms']['p99']))
+        return '\n'.join(lines)
@@ -0,0 +1,142 @@
+"""
+Delta encoding of consecutive get_market_prices() snapshots of a market, as
+posted by QuoteFeed to its delta subscribers.
+
+Every keyframe_every ticks (and on the first) the document is a keyframe: the
+full snapshot plus 'type': 'keyframe' and 'seq'. In between it is a delta
+holding only what changed since the previous snapshot:
+
+    {'type': 'delta', 'seq': 12, 'market_id': ..., 'timestamp': ..., 'refresh_time': ...,
+     'market': {'status': 'SUSPENDED'},              # changed market fields
+     'runners': [{'selection_id': 123,
+                  'last_price_matched': 3.45,         # changed runner fields
+                  'total_matched': 10234.5,
+                  'back': [[3.4, 120.0], [3.5, 0.0]], # changed levels, 0 = gone
+                  'lay': [[3.45, 8.0]]}],
+     'removed': [456]}                                # runners no longer there
+
+'market', 'runners' and 'removed' are left out when empty, and a tick where
+nothing changed gives no document at all. apply_delta() turns the previous
+snapshot and a document back into the full snapshot.
+"""
+from __future__ import print_function, division
+
+KEYFRAME_EVERY = 60  # ticks
+VOLATILE = ('timestamp', 'refresh_time')  # change every tick: not diffed, sent with every delta
+SIDES = (('back_prices', 'back', 'L'), ('lay_prices', 'lay', 'B'))  # snapshot key, delta key, level type
+
+
+def _scalars(d, skip):
+    return dict((k, v) for k, v in d.items() if k not in skip)
+
+
+def _levels(levels):
+    return dict((level['price'], level['amount']) for level in levels)
+
+
+def _diff(old, new):
+    """keys of new whose value differs from old"""
+    return dict((k, v) for k, v in new.items() if k not in old or old[k] != v)
+
+
+class QuoteDiffer(object):
+    """encodes one market's snapshots as keyframes and deltas"""
+    def __init__(self, keyframe_every=KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self.seq = 0
+        self.ticks = 0
+        self._market = None  # market fields of the last snapshot
+        self._runners = None  # selection id -> (runner fields, {delta key: {price: amount}})
+
+    def encode(self, quotes):
+        """returns the keyframe or delta document for the next snapshot, or
+        None if nothing changed"""
+        market = _scalars(quotes, VOLATILE + ('runners',))
+        runners = dict((r['selection_id'], (_scalars(r, ('back_prices', 'lay_prices')),
+                                            dict((key, _levels(r[side])) for side, key, _ in SIDES)))
+                       for r in quotes['runners'])
+        keyframe = self._runners is None or self.ticks % self.keyframe_every == 0
+        doc = None if keyframe else self._delta(market, quotes['runners'], runners)
+        if doc is not None:
+            doc.update((k, quotes[k]) for k in VOLATILE if k in quotes)
+        self.ticks += 1
+        self._market, self._runners = market, runners
+        if keyframe:
+            doc = dict(quotes, type='keyframe')
+        elif doc is None:
+            return None
+        self.seq += 1
+        doc['seq'] = self.seq
+        return doc
+
+    def _delta(self, market, order, runners):
+        doc = {}
+        changed = _diff(self._market, market)
+        if changed:
+            doc['market'] = changed
+        deltas = []
+        for runner in order:
+            sel_id = runner['selection_id']
+            fields, levels = runners[sel_id]
+            old_fields, old_levels = self._runners.get(sel_id, ({}, {}))
+            delta = _diff(old_fields, fields)
+            for side, key, _ in SIDES:
+                old, new = old_levels.get(key, {}), levels[key]
+                moved = [[p, a] for p, a in new.items() if old.get(p) != a]
+                moved += [[p, 0.0] for p in old if p not in new]
+                if moved:
+                    delta[key] = sorted(moved)
+            if delta:
+                delta['selection_id'] = sel_id
+                deltas.append(delta)
+        if deltas:
+            doc['runners'] = deltas
+        removed = [sel_id for sel_id in self._runners if sel_id not in runners]
+        if removed:
+            doc['removed'] = removed
+        if not doc:
+            return None
+        doc.update(type='delta', market_id=market.get('market_id'))
+        return doc
+
+
+def apply_delta(snapshot, doc):
+    """returns the snapshot after doc (a keyframe or delta). snapshot is not
+    modified. level 'depth's are renumbered from the best price"""
+    if doc['type'] == 'keyframe':
+        return dict((k, v) for k, v in doc.items() if k not in ('type', 'seq'))
+    quotes = dict(snapshot)
+    quotes.update(doc.get('market', {}))
+    quotes.update((k, doc[k]) for k in VOLATILE if k in doc)
+    changes = dict((d['selection_id'], d) for d in doc.get('runners', ()))
+    removed = set(doc.get('removed', ()))
+    runners = []
+    for runner in snapshot['runners']:
+        sel_id = runner['selection_id']
+        if sel_id in removed:
+            continue
+        delta = changes.pop(sel_id, None)
+        runners.append(_apply_runner(runner, delta) if delta else runner)
+    for delta in doc.get('runners', ()):  # new runners, in delta order
+        if delta['selection_id'] in changes:
+            runners.append(_apply_runner({'back_prices': [], 'lay_prices': []}, delta))
+    quotes['runners'] = runners
+    return quotes
+
+
+def _apply_runner(runner, delta):
+    runner = dict(runner)
+    for side, key, level_type in SIDES:
+        if key not in delta:
+            continue
+        levels = _levels(runner[side])
+        for price, amount in delta[key]:
+            if amount:
+                levels[price] = amount
+            else:
+                levels.pop(price, None)
+        prices = sorted(levels, reverse=(key == 'back'))
+        runner[side] = [{'price': p, 'amount': levels[p], 'type': level_type, 'depth': str(i + 1)}
+                        for i, p in enumerate(prices)]
+    runner.update((k, v) for k, v in delta.items() if k not in ('back', 'lay'))
+    return runner
@@ -2,13 +2,13 @@ from __future__ import print_function, division
 
 import logging
 import datetime
-from itertools import ifilter
+from itertools import islice
 
 import dateutil
 from pymongo import ASCENDING, DESCENDING
 from bson import ObjectId
 
-from betfair import API_T
+from betfair import API_T, Error
 from common import extract_horse_name
 
 
@@ -82,10 +82,14 @@ class HistoricalExecutionService(VirtualExecutionService):
 
 
 class PaperExecutionService(VirtualExecutionService):
-    def __init__(self, username=USERNAME, password=PASSWORD):
+    def __init__(self, username=USERNAME, password=PASSWORD, client=None):
+        """client: an already logged in API or betfair.sessions.SessionManager
+        (to spread the price requests over several sessions)"""
         super(PaperExecutionService, self).__init__()
-        self.client = API_T()
-        self.client.login(username, password)
+        if client is None:
+            client = API_T(raise_errors=True)
+            client.login(username, password)
+        self.client = client
         self._static = {}
 
     def get_market_prices(self, market_id):
@@ -153,22 +157,31 @@ def get_traded_strategies(coll, currently_trading=False):
     return summary
 
 
+def _with_details(client, markets):
+    """yields (market, get_market() details) as markets is consumed, fetching
+    the details of client.batch_workers markets at a time"""
+    markets = iter(markets)
+    while True:
+        batch = list(islice(markets, client.batch_workers))
+        if not batch:
+            return
+        details = client.get_markets([m['market_id'] for m in batch])
+        for m in batch:
+            yield m, details[m['market_id']]
+
+
 def get_future_markets(menu_prefix='\\Horse Racing\\GB', hours=24):
-    client = API_T()
+    client = API_T(raise_errors=True)
     client.login(USERNAME, PASSWORD)
     now = datetime.datetime.utcnow()
     before_date = now + datetime.timedelta(hours=hours)
 
-    markets = client.get_all_markets(hours=24)
     logging.info('Getting all markets..')
-    if isinstance(markets, str):
-        raise RuntimeError(markets)
-    markets = ifilter(lambda x: before_date > x['event_date'] > now and x['menu_path'].startswith(menu_prefix),
-                      markets)
-    for m in markets:
-        detailed = client.get_market(m['market_id'])
-        if isinstance(detailed, str):
-            raise RuntimeError(detailed)
+    markets = client.iter_all_markets(hours=hours, menu_prefix=menu_prefix,
+                                      starts_after=now, starts_before=before_date)
+    for m, detailed in _with_details(client, markets):
+        if isinstance(detailed, Error):
+            raise detailed.exception()
 
         runners, selection_ids = [], []
         invalid_selection = False
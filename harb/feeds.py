@@ -2,55 +2,93 @@
 from __future__ import division, print_function
 
 import datetime
-import sched
+import logging
 import time
 
-import pandas as pd
 import pymongo
-from betfair import api
+from betfair import api, Error
 
 import settings
+from deltas import QuoteDiffer, KEYFRAME_EVERY
+from scheduler import FeedScheduler
+from trades import TradeTracker
 
 
 dt = datetime.datetime
 
 
-class MasterTimer(object):
-    def __init__(self):
-        self._sched = sched.scheduler(time.time, time.sleep)
-        self._feeds = []
-
-    def add_feed(self, feed, seconds, priority=1):
-        def timed_feed():
-            feed.post_to_all()
-            self._sched.enter(seconds, priority, timed_feed, ())
-        self._feeds.append(timed_feed)
-
-    def run(self):
-        map(lambda f: f(), self._feeds)
-        self._sched.run()
+# feeds used to share one sched.scheduler thread, so a slow call delayed every
+# other feed and each feed drifted by its own run time. the name is kept for
+# the existing scripts
+MasterTimer = FeedScheduler
 
 
 #####  Feeds  ######
 
 class Feed(object):
-    def __init__(self, client, subscribers=[]):
+    """posts data to its subscribers. without a bus they are called inline
+    by post_to_all(); with a bus (see bus.py) they get the posts from their
+    own queues, published under (topic, market_id), and subscribe() takes the
+    queue's maxlen and policy"""
+    topic = None
+    market_id = None
+
+    def __init__(self, client, subscribers=None, bus=None):
         self._client = client
-        self.subscribers = subscribers
+        self.bus = bus
+        self.subscribers = []
+        for subscriber in subscribers or []:
+            self.subscribe(subscriber)
+
+
+    @property
+    def client(self):
+        return self._client
 
 
-    def subscribe(self, subscriber):
-        self.subscribers.append(subscriber)
+    def subscribe(self, subscriber, **options):
+        self._subscribe(self.topic, self.subscribers, subscriber, options)
 
 
     def unsubscribe(self, subscriber):
-        self.subscribers.remove(subscriber)
+        self._unsubscribe(self.topic, self.subscribers, subscriber)
+
+
+    def publish(self, topic, subscribers, timestamp, data):
+        for sub in subscribers:
+            sub(timestamp, data)
+        if self.bus is not None:
+            self.bus.publish((topic, self.market_id), timestamp, data)
+
+
+    def _subscribe(self, topic, subscribers, subscriber, options):
+        if self.bus is not None:
+            self.bus.subscribe((topic, self.market_id), subscriber, **options)
+        else:
+            subscribers.append(subscriber)
+
+
+    def _unsubscribe(self, topic, subscribers, subscriber):
+        if self.bus is not None:
+            self.bus.unsubscribe((topic, self.market_id), subscriber)
+        else:
+            subscribers.remove(subscriber)
 
 
 class QuoteFeed(Feed):
-    def __init__(self, client, market_id, subscribers=[]):
-        super(QuoteFeed, self).__init__(client, subscribers)
+    """posts get_market_prices() snapshots to the subscribers, and keyframes
+    and deltas of them (see deltas.py) to the delta subscribers"""
+    topic = 'quotes'
+    delta_topic = 'quote_deltas'
+
+    def __init__(self, client, market_id, subscribers=None, delta_subscribers=None,
+                 keyframe_every=KEYFRAME_EVERY, bus=None):
         self._market_id = market_id
+        self.delta_subscribers = []
+        self._differ = QuoteDiffer(keyframe_every)
+        super(QuoteFeed, self).__init__(client, subscribers, bus)
+        for subscriber in delta_subscribers or []:
+            self.subscribe_deltas(subscriber)
 
 
     @property
@@ -58,19 +96,45 @@ class QuoteFeed(Feed):
         return self._market_id
 
 
+    def subscribe_deltas(self, subscriber, **options):
+        # a missed delta corrupts every snapshot after it, so by default the
+        # feed waits for a delta subscriber that is a whole queue behind
+        options.setdefault('policy', 'block')
+        self._subscribe(self.delta_topic, self.delta_subscribers, subscriber, options)
+
+
+    def unsubscribe_deltas(self, subscriber):
+        self._unsubscribe(self.delta_topic, self.delta_subscribers, subscriber)
+
+
     def post_to_all(self):
         client = self._client
         quotes = client.get_market_prices(market_id=self._market_id)
-        quotes['timestamp'] = client.API_TIMESTAMP
-        for sub in self.subscribers:
-            sub(client.API_TIMESTAMP, quotes)
+        # server time of the reply. not API_TIMESTAMP, which the feeds polling
+        # the same client on other threads overwrite
+        timestamp = client.clock.server_now()
+        if isinstance(quotes, Error):
+            logging.warning('get_market_prices(%s) failed: %s', self._market_id, quotes)
+            return None
+        quotes['timestamp'] = timestamp
+        self.publish(self.topic, self.subscribers, timestamp, quotes)
+        if self.delta_subscribers or (self.bus is not None and
+                                      self.bus.subscribed((self.delta_topic, self._market_id))):
+            doc = self._differ.encode(quotes)
+            if doc is not None:
+                self.publish(self.delta_topic, self.delta_subscribers, timestamp, doc)
+        return quotes
 
 
 class TradeFeed(Feed):
-    def __init__(self, client, market_id, subscribers=[]):
-        super(TradeFeed, self).__init__(client, subscribers)
+    """posts the trades since the last tick, as inferred by trades.TradeTracker"""
+    topic = 'trades'
+
+    def __init__(self, client, market_id, subscribers=None, bus=None):
         self._market_id = market_id
-        self._last = self.get_traded_volume()
+        super(TradeFeed, self).__init__(client, subscribers, bus)
+        self._tracker = TradeTracker()
+        self._tracker.update(self.get_traded_volume() or [])
 
 
     @property
@@ -80,25 +144,21 @@ class TradeFeed(Feed):
 
     def get_traded_volume(self):
         tv = self._client.get_market_traded_volume(self._market_id)
-        if isinstance(tv, str):
+        if isinstance(tv, Error):
             return None
-        return dict(map(lambda x: (x['selection_id'], pd.DataFrame(x['volumes']).set_index('price').amount), tv))
+        return tv
 
 
     def post_to_all(self):
         curr = self.get_traded_volume()
-        trades = {}
-        for sel_id, vol in self._last.items():
-            sel_trades = (curr[sel_id] - vol)
-            sel_trades = sel_trades[sel_trades >= 2]
-            trades[sel_id] = sel_trades
-        self._last = curr
-
-        trades = {'timestamp': self._client.API_TIMESTAMP,
-                  'runners': trades}
-
-        for sub in self.subscribers:
-            sub(self._client.API_TIMESTAMP, trades)
+        timestamp = self._client.clock.server_now()  # see QuoteFeed.post_to_all()
+        if curr is None:
+            return None
+        trades = {'timestamp': timestamp,
+                  'runners': self._tracker.update(curr)}
+
+        self.publish(self.topic, self.subscribers, timestamp, trades)
+        return trades
 
 
 
@@ -0,0 +1,124 @@
+"""
+Adaptive poll intervals for QuoteFeed/TradeFeed, used as the policy of
+FeedScheduler.add_feed():
+
+    scheduler = FeedScheduler(budget=20)  # data requests per second in all
+    for market_id in market_ids:
+        scheduler.add_feed(QuoteFeed(client, market_id), 5, policy=AdaptivePolicy())
+
+The period follows the time to the off (SCHEDULE), then:
+* in-play markets are polled every min_secs
+* suspended markets every suspended_secs, closed markets every max_secs
+* a market matching busy_volume or more per second is polled twice as often
+* a market where nothing was matched for idle_ticks ticks in a row backs off,
+  doubling its period each further idle tick, up to max_secs
+* while the start time cannot be had from get_market(), the period is
+  max_secs and get_market() is retried every lookup_retry_secs at most
+"""
+from __future__ import print_function, division
+
+import logging
+import time
+
+from betfair import Error, APIError
+from betfair.clock import parse_timestamp
+
+# (seconds to the off, period) from the nearest; later than the last -> max_secs
+SCHEDULE = [(120, 1), (600, 2), (1800, 5), (3600, 15), (3 * 3600, 30)]
+BUSY_VOLUME = 500.0  # matched per second
+IDLE_TICKS = 3
+SUSPENDED_SECS = 10.0
+LOOKUP_RETRY_SECS = 300.0  # between get_market() retries when the start time is unknown
+
+
+def matched(data):
+    """total matched of a QuoteFeed post, or the traded amount of a TradeFeed
+    post. None if there is neither"""
+    if not isinstance(data, dict):
+        return None
+    runners = data.get('runners')
+    if isinstance(runners, list):  # get_market_prices()
+        return sum(r.get('total_matched') or 0.0 for r in runners)
+    if isinstance(runners, dict):  # TradeFeed: selection id -> prices and amounts
+        return sum(sum(trades['amount']) for trades in runners.values())
+    return None
+
+
+class AdaptivePolicy(object):
+    """the period one market's feed should poll at, from its time to the off
+    and its activity. one instance per feed"""
+    def __init__(self, schedule=SCHEDULE, min_secs=1.0, max_secs=60.0, busy_volume=BUSY_VOLUME,
+                 idle_ticks=IDLE_TICKS, suspended_secs=SUSPENDED_SECS,
+                 lookup_retry_secs=LOOKUP_RETRY_SECS):
+        self.schedule = schedule
+        self.min_secs = min_secs
+        self.max_secs = max_secs
+        self.busy_volume = busy_volume
+        self.idle_ticks = idle_ticks
+        self.suspended_secs = suspended_secs
+        self.lookup_retry_secs = lookup_retry_secs
+        self.start_time = None  # marketTime, from get_market() on the first tick
+        self._next_lookup = 0.0  # time.time() before which get_market() is not retried
+        self.idle = 0
+        self._matched = None
+        self._when = None
+
+    def __call__(self, feed, data):
+        status = data.get('status') if isinstance(data, dict) else None
+        if status == 'CLOSED':
+            return self.max_secs
+        if status == 'SUSPENDED':
+            return self.suspended_secs
+        # activity: matched per second since the last tick. TradeFeed posts
+        # the amounts traded since its last tick, quotes carry running totals
+        now, total = time.time(), matched(data)
+        rate = None
+        if total is not None:
+            if self._when is not None:
+                traded = total if isinstance(data['runners'], dict) else total - self._matched
+                rate = traded / max(now - self._when, 1e-3)
+            self._matched, self._when = total, now
+        if isinstance(data, dict) and int(data.get('in_play_delay') or 0) > 0:
+            return self.min_secs
+        secs = self.scheduled_secs(feed)
+        if rate is not None:
+            if rate >= self.busy_volume:
+                secs /= 2
+            if rate > 0:
+                self.idle = 0
+            else:
+                self.idle += 1
+                if self.idle >= self.idle_ticks:
+                    secs *= 2 ** (self.idle - self.idle_ticks + 1)
+        return max(self.min_secs, min(self.max_secs, secs))
+
+    def scheduled_secs(self, feed):
+        """period for the time to the off, max_secs if unknown"""
+        left = self.secs_to_off(feed)
+        if left is None:
+            return self.max_secs
+        for before, secs in self.schedule:
+            if left <= before:
+                return secs
+        return self.max_secs
+
+    def secs_to_off(self, feed):
+        client = feed.client
+        if self.start_time is None:
+            now = time.time()
+            if now < self._next_lookup:
+                return None
+            # until the lookup succeeds, whatever it raises
+            self._next_lookup = now + self.lookup_retry_secs
+            try:
+                market = client.get_market(feed.market_id)
+            except APIError as e:  # a raise_errors client
+                market = e.error
+            if isinstance(market, Error) or not market.get('marketTime'):
+                logging.warning('no start time for market %s: %s', feed.market_id,
+                                market if isinstance(market, Error) else 'no marketTime')
+                return None
+            self.start_time = parse_timestamp(market['marketTime'])
+            if self.start_time is None:
+                return None
+        return client.clock.secs_until(self.start_time)
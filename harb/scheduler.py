@@ -0,0 +1,277 @@
+"""
+Fixed-rate scheduler that runs many feeds concurrently on a worker pool.
+
+Every feed has its own clock: tick k is due at start + phase + k * period,
+whatever time the earlier ticks took, so slow calls do not make the schedule
+drift. A dispatcher thread hands due ticks to the workers, so a slow
+get_market_traded_volume() only delays its own feed. Ticks are never queued
+up behind each other:
+* a tick that is due while the feed's previous tick is still running is
+  skipped (busy)
+* a tick that has not started within the feed's deadline of its due time,
+  e.g. because all the workers were busy, is dropped (late)
+* when the dispatcher falls behind by whole periods, the missed ticks are
+  skipped rather than run in a burst (missed)
+
+stats() reports per feed the start lag (actual - due start time), the jitter
+(actual - nominal interval between consecutive starts) and the run time, as
+histograms in milliseconds.
+
+A feed's period can adapt: after each tick its policy (see polling.py) is
+given what post_to_all() returned and answers the period it wants next. With
+a budget (ticks per second over all the feeds, i.e. data requests for
+QuoteFeed and TradeFeed) every period is stretched by the same factor
+whenever the feeds want more than the budget, so the busiest markets keep
+the shortest periods.
+
+    scheduler = FeedScheduler(workers=16)
+    for market_id in market_ids:
+        scheduler.add_feed(QuoteFeed(client, market_id), 1)
+    scheduler.run()
+"""
+from __future__ import print_function, division
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+
+from betfair.workers import WorkerPool
+
+WORKERS = 16
+GOLDEN = 0.6180339887498949  # spreads the feeds' phases evenly over a period
+
+# histogram bucket upper bounds (ms)
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf')]
+
+
+class Histogram(object):
+    """counts of values (ms) per bucket of BUCKETS_MS"""
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.n += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        """upper bound of the bucket holding the p-th percentile"""
+        if not self.n:
+            return 0.0
+        rank, seen = p / 100 * self.n, 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {'n': self.n, 'mean': self.total / self.n if self.n else 0.0,
+                'p50': self.percentile(50), 'p99': self.percentile(99), 'max': self.max,
+                'buckets': dict((str(b), c) for b, c in zip(self.bounds, self.counts) if c)}
+
+
+class ScheduledFeed(object):
+    """a feed, its timing and its statistics"""
+    def __init__(self, feed, period, priority, deadline, phase, policy):
+        self.feed = feed
+        self.name = '%s(%s)' % (type(feed).__name__, getattr(feed, 'market_id', ''))
+        self.wanted = period  # as given or last answered by the policy
+        self.period = period  # wanted, stretched to fit the budget
+        self.priority = priority
+        self.deadline = deadline  # None: one period
+        self.policy = policy
+        self.phase = phase  # offset of the first tick from the start
+        self.due = None
+        self.seq = None  # of the heap item that is current
+        self.busy = False
+        self.last_due = None
+        self.last_start = None
+        self.lag = Histogram()
+        self.jitter = Histogram()
+        self.runtime = Histogram()
+        self.ticks = 0
+        self.errors = 0
+        self.skipped_busy = 0
+        self.dropped_late = 0
+        self.missed = 0
+        self.overruns = 0  # ticks that ran longer than the period
+
+    def stats(self):
+        return {'feed': self.name, 'period': self.period, 'wanted': self.wanted, 'ticks': self.ticks,
+                'errors': self.errors, 'skipped_busy': self.skipped_busy,
+                'dropped_late': self.dropped_late, 'missed': self.missed,
+                'overruns': self.overruns, 'lag_ms': self.lag.summary(),
+                'jitter_ms': self.jitter.summary(), 'runtime_ms': self.runtime.summary()}
+
+
+class FeedScheduler(object):
+    """runs feeds at fixed rates on a pool of worker threads, see above"""
+    def __init__(self, workers=WORKERS, budget=None):
+        """budget: max ticks per second over all the feeds (None: no limit)"""
+        self._workers = workers
+        self.budget = budget
+        self._demand = 0.0  # ticks per second the feeds want
+        self._pool = None
+        self._feeds = []
+        self._heap = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._log = logging.getLogger(__name__)
+
+    def add_feed(self, feed, seconds, priority=1, deadline=None, policy=None):
+        """runs feed.post_to_all() every seconds. lower priority values go first
+        when ticks are due at the same time.
+        deadline: seconds after its due time by which a tick must have started
+        (default: one period)
+        policy: callable(feed, data) returning the period wanted after a tick
+        that returned data, e.g. polling.AdaptivePolicy()"""
+        phase = (len(self._feeds) * GOLDEN) % 1.0 * seconds
+        entry = ScheduledFeed(feed, seconds, priority, deadline, phase, policy)
+        with self._lock:
+            self._demand += 1 / seconds
+            entry.period = self._stretch(seconds)
+            self._feeds.append(entry)
+            if self._thread is not None:
+                entry.due = time.time() + phase
+                self._push(entry)
+        self._wake.set()
+        return entry
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._pool = WorkerPool(self._workers)
+            now = time.time()
+            with self._lock:
+                self._heap = []
+                for entry in self._feeds:
+                    entry.due = now + entry.phase
+                    self._push(entry)
+            self._thread = threading.Thread(target=self._dispatch, name='feed-scheduler')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def run(self):
+        """runs the feeds until stop() or Ctrl-C"""
+        self.start()
+        try:
+            while not self._stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def stats(self):
+        """returns the statistics of every feed (see ScheduledFeed.stats())"""
+        return [entry.stats() for entry in self._feeds]
+
+    def report(self):
+        """returns a one line per feed summary of stats()"""
+        lines = ['%-28s %7s %6s %5s %5s %5s %5s %9s %9s %9s' % (
+            'feed', 'period', 'ticks', 'busy', 'late', 'miss', 'err', 'lag p99', 'jit p99', 'run p99')]
+        for s in self.stats():
+            lines.append('%-28s %6.1fs %6d %5d %5d %5d %5d %7.0fms %7.0fms %7.0fms' % (
+                s['feed'][:28], s['period'], s['ticks'], s['skipped_busy'], s['dropped_late'], s['missed'],
+                s['errors'], s['lag_ms']['p99'], s['jitter_ms']['p99'], s['runtime_ms']['p99']))
+        return '\n'.join(lines)
+
+    def _stretch(self, wanted):
+        if self.budget and self._demand > self.budget:
+            return wanted * self._demand / self.budget
+        return wanted
+
+    def _push(self, entry):
+        self._seq += 1
+        entry.seq = self._seq
+        heapq.heappush(self._heap, (entry.due, entry.priority, self._seq, entry))
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            with self._lock:
+                wait = self._heap[0][0] - time.time() if self._heap else 1.0
+                if wait <= 0:
+                    seq, entry = heapq.heappop(self._heap)[2:]
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            if seq != entry.seq:
+                continue  # rescheduled by _retime()
+            due = entry.due
+            if entry.busy:
+                entry.skipped_busy += 1
+            else:
+                entry.busy = True
+                self._pool.submit(self._tick, entry, due)
+            # fixed rate: the next slot after now, skipping any missed ones
+            with self._lock:
+                now = time.time()
+                entry.period = self._stretch(entry.wanted)
+                entry.due = due + entry.period
+                if entry.due <= now:
+                    missed = int((now - entry.due) // entry.period) + 1
+                    entry.missed += missed
+                    entry.due += missed * entry.period
+                self._push(entry)
+
+    def _retime(self, entry, wanted, due):
+        """moves the feed's next tick to due + its new period"""
+        with self._lock:
+            self._demand += 1 / wanted - 1 / entry.wanted
+            entry.wanted = wanted
+            entry.period = self._stretch(wanted)
+            entry.due = max(due + entry.period, time.time())
+            self._push(entry)
+        self._wake.set()
+
+    def _tick(self, entry, due):
+        start = time.time()
+        try:
+            if start - due > (entry.deadline or entry.period):
+                entry.dropped_late += 1
+                return
+            entry.lag.add((start - due) * 1000)
+            if entry.last_start is not None:
+                # against the nominal interval, which spans skipped ticks too
+                entry.jitter.add(abs((start - entry.last_start) - (due - entry.last_due)) * 1000)
+            entry.last_start, entry.last_due = start, due
+            try:
+                data = entry.feed.post_to_all()
+                if entry.policy is not None:
+                    wanted = entry.policy(entry.feed, data)
+                    if wanted and wanted != entry.wanted:
+                        self._retime(entry, wanted, due)
+            except Exception:
+                entry.errors += 1
+                self._log.exception('%s tick failed', entry.name)
+            elapsed = time.time() - start
+            entry.runtime.add(elapsed * 1000)
+            entry.ticks += 1
+            if elapsed > entry.period:
+                entry.overruns += 1
+        finally:
+            entry.busy = False
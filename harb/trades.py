@@ -0,0 +1,87 @@
+"""
+Trades inferred from successive get_market_traded_volume() polls of a market.
+
+Betfair only publishes the total traded at each price, so the trades since
+the last poll are the increases of those totals. TradeTracker keeps each
+selection's totals in a row of a preallocated array, one column per tick of
+the betfair ladder (betfair.ticks.TICKS), so a poll is diffed with a handful
+of numpy calls for the whole market:
+
+    tracker = TradeTracker()
+    tracker.update(client.get_market_traded_volume(market_id))  # baseline
+    ...
+    prints = tracker.update(client.get_market_traded_volume(market_id))
+    # {selection_id: {'prices': [2.5, 2.52], 'amount': [40.0, 12.5]}}
+
+* increases below min_amount are ignored (the minimum stake is 2)
+* a selection seen for the first time is taken as the baseline, like the
+  first poll, rather than reported as one big trade
+* a selection missing from a poll keeps its totals, so nothing is reported
+  twice if it comes back
+* totals that go down (voided bets) just lower the baseline
+"""
+from __future__ import print_function, division
+
+from operator import itemgetter
+
+import numpy as np
+
+from betfair.ticks import TICKS, tick_indices
+
+MIN_TRADE = 2.0
+TICK_PRICES = np.array(TICKS)
+
+_price = itemgetter('price')
+_amount = itemgetter('amount')
+
+
+class TradeTracker(object):
+    def __init__(self, min_amount=MIN_TRADE, capacity=16):
+        """capacity: selections to allocate for, grown as needed"""
+        self.min_amount = min_amount
+        self.rows = {}  # selection id -> row of volume
+        self.volume = np.zeros((capacity, len(TICKS)))  # traded so far by tick
+
+    def update(self, runners):
+        """takes the runners of a get_market_traded_volume() poll. returns the
+        trades since the last poll as {selection id: {'prices': [...],
+        'amount': [...]}} for the selections that traded"""
+        sel_ids = [r['selection_id'] for r in runners]
+        fresh = np.array([sel_id not in self.rows for sel_id in sel_ids], dtype=bool)
+        for sel_id in sel_ids:
+            self._row(sel_id)
+        rows = np.array([self.rows[sel_id] for sel_id in sel_ids], dtype=int)
+
+        prices, amounts, counts = [], [], []
+        for r in runners:
+            volumes = r['volumes']
+            prices.extend(map(_price, volumes))
+            amounts.extend(map(_amount, volumes))
+            counts.append(len(volumes))
+        current = np.zeros((len(sel_ids), len(TICKS)))
+        if prices:
+            current[np.repeat(np.arange(len(sel_ids)), counts), tick_indices(prices)[0]] = amounts
+
+        delta = current - self.volume[rows]
+        delta[fresh] = 0.0
+        self.volume[rows] = current
+
+        # traded levels, grouped by selection (nonzero() goes row by row)
+        i, at = np.nonzero(delta >= self.min_amount)
+        bounds = np.searchsorted(i, np.arange(len(sel_ids) + 1)).tolist()
+        traded_prices = TICK_PRICES[at].tolist()
+        traded_amounts = delta[i, at].round(2).tolist()
+        prints = {}
+        for row, sel_id in enumerate(sel_ids):
+            lo, hi = bounds[row], bounds[row + 1]
+            if hi > lo:
+                prints[sel_id] = {'prices': traded_prices[lo:hi], 'amount': traded_amounts[lo:hi]}
+        return prints
+
+    def _row(self, sel_id):
+        row = self.rows.get(sel_id)
+        if row is None:
+            row = self.rows[sel_id] = len(self.rows)
+            if row == len(self.volume):
+                self.volume = np.vstack([self.volume, np.zeros_like(self.volume)])
+        return row
@@ -9,6 +9,10 @@ import numpy as np
 import pandas as pd
 
 from betfair import api
+from betfair.book import MarketBook
+from betfair.cache import CachedAPI
+from betfair.replay import record, replay
+from harb.bus import MessageBus
 from harb.feeds import MasterTimer, QuoteFeed
 from robot import Robot
 
@@ -76,14 +80,10 @@ class LiquidBot1(Robot):
 
 
     def market_pnl(self, quotes):
-        MIN_P = 0.00
-
-        book_top = self.get_book_top(quotes)
-        inv_odds = (1 / book_top.ix['B'].price).fillna(MIN_P)
-        imp_prob = inv_odds / inv_odds.sum()
+        imp_prob = MarketBook.from_prices(quotes).implied_probabilities('back')
 
         pnl = self.c.get_market_profit_and_loss(self.market_id)
-        payoffs = pd.DataFrame.from_dict(pnl).set_index('selectionId')['ifWin']
+        payoffs = np.array([x['ifWin'] for x in pnl])
         return np.dot(imp_prob, payoffs)
 
 
@@ -97,12 +97,22 @@ def main(args):
     l.setLevel(logging.DEBUG)
     l.handlers.append(logging.StreamHandler(sys.stdout))
 
-    client = api.API()
+    raw = api.API()
+    if args.replay:
+        replay(raw, args.replay, speed=args.speed)
+    elif args.record:
+        record(raw, args.record)
+    # process_quotes asks for the market P&L twice per tick
+    client = CachedAPI(raw)
     client.login('aristotle137', 'Antiquark_87')
 
     bot = LiquidBot1(client, args.market_id, args.selection_id)
     mt = MasterTimer()
-    qf = QuoteFeed(client, args.market_id, [bot.process_quotes])
+    bus = MessageBus()
+    qf = QuoteFeed(client, args.market_id, bus=bus)
+    # bet round trips run off the polling thread; a bot that falls behind
+    # skips to the latest quotes
+    qf.subscribe(bot.process_quotes, policy='coalesce')
     #tf = TradeFeed(client, args.market_id)
     mt.add_feed(qf, 1)
     #mt.add_feed(tf, 1)
@@ -115,6 +125,9 @@ def main(args):
 parser = argparse.ArgumentParser()
 parser.add_argument('market_id', metavar='MARKET_ID',  help='Market ID')
 parser.add_argument('selection_id', metavar='SELECTION_ID',  help='Selection ID')
+parser.add_argument('--record', metavar='LOG', help='record betfair traffic to LOG (.gz)')
+parser.add_argument('--replay', metavar='LOG', help='replay recorded betfair traffic from LOG instead of going live')
+parser.add_argument('--speed', type=float, default=1.0, help='replay speed-up (0 = no delays)')
 args = parser.parse_args()
 
 main(args)
@@ -4,6 +4,10 @@ import logging
 import argparse
 import sys
 
+from betfair.bulk import BulkOrders
+from betfair.orders import OrderCache
+from betfair.ticks import round_prices
+
 
 class Robot(object):
     def __init__(self, client, market_id):
@@ -16,18 +20,16 @@ class InstructionEngine(object):
     def __init__(self, client, market_id):
         self.c = client
         self.market_id = market_id
+        self.orders = OrderCache(client, market_id)
+        self.bulk = BulkOrders(client)
 
 
     def update_bets(self, sel_id, backs, lays):
-        _to_betfair_odds = lambda x: (self.c.set_betfair_odds(x[0]), round(x[1], 2))
-        backs = set(map(_to_betfair_odds, backs))
-        lays = set(map(_to_betfair_odds, lays))
+        backs = self._to_betfair_odds(backs)
+        lays = self._to_betfair_odds(lays)
 
-        curr_bets = self.c.get_mu_bets(self.market_id, status='U')
-        if isinstance(curr_bets, str):
-            curr_bets = []
-        else:
-            curr_bets = filter(lambda x: x['selectionId'] == sel_id, curr_bets)
+        self.orders.sync()
+        curr_bets = self.orders.bets(self.market_id, sel_id, status='U')
 
         cancel_ids = []
         for bet in curr_bets:
@@ -40,7 +42,6 @@ class InstructionEngine(object):
                 logging.info('[sel_id=%8s] Cancelling %s bet [bet_id=%s, GBP %.2f @ %.2f (p=%.3f)]' %
                              (sel_id, bet['betType'], bet['betId'], bet['size'], bet['price'], 1 / bet['price']))
                 cancel_ids.append(bet['betId'])
-        self.c.cancel_bets(cancel_ids)
 
         bets = []
         for back in backs:
@@ -49,8 +50,16 @@ class InstructionEngine(object):
         for lay in lays:
             logging.info('[sel_id=%8s] Placing new  LAY bet: GBP %.2f @ %.2f (p=%.3f)' % (sel_id, lay[1], lay[0], 1.0 / lay[0]))
             bets.append(self._bet(sel_id, 'L', lay[0], lay[1]))
-        if len(bets) > 0:
-            self.c.place_bets(bets)
+        resp = self.bulk.requote(cancel_ids, bets)
+        self.orders.cancelled(cancel_ids)
+        self.orders.placed(bets, resp['placed']['results'])
+
+
+    def _to_betfair_odds(self, bets):
+        if not bets:
+            return set()
+        prices = round_prices([b[0] for b in bets]).tolist()
+        return set(zip(prices, [round(b[1], 2) for b in bets]))
 
 
     def _bet(self, sel_id, bet_type, price, size):
@@ -49,8 +49,7 @@ class SimpleBot(object):
                     and market['no_of_winners'] == 1 # single winner market
                     ):
                     # calc seconds til start of race
-                    delta = market['event_date'] - self.api.API_TIMESTAMP
-                    sec_til_start = delta.days * 86400 + delta.seconds # 1 day = 86400 sec
+                    sec_til_start = int(self.api.clock.secs_until(market['event_date']))
                     temp = [sec_til_start, market]
                     markets.append(temp)
             markets.sort() # sort into time order (earliest race first)
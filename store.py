@@ -22,8 +22,8 @@ class MarketStore(object):
             self._db['markets'].insert(client.get_market(market_id), safe=True)
         else:
             logging.info('Static data already exists for market_id=%s; Skipped inserting' % market_id)
-        quote_feed.subscribe(self.store_quote)
-        trade_feed.subscribe(self.store_trade)
+        quote_feed.subscribe_deltas(self.store_quote)
+        trade_feed.subscribe(self.store_trade, policy='block')  # trades are never resent
 
 
     @property
@@ -32,19 +32,21 @@ class MarketStore(object):
 
 
     def store_quote(self, timestamp, quotes):
-        logging.debug('Inserting quotes for market_id=%s' % self._market_id)
+        # keyframes and deltas, see harb.deltas.apply_delta() for reading them back
+        logging.debug('Inserting %s quotes for market_id=%s' % (quotes['type'], self._market_id))
         self._db['quotes'].insert(quotes)
 
 
     def store_trade(self, timestamp, trades):
         logging.debug('Inserting trades for market_id=%s' % self._market_id)
-        trades['runners'] = dict(map(lambda x: (x[0], {'prices': x[1].index.tolist(), 'amount': x[1].values.tolist()}), trades['runners'].items()))
         self._db['trades'].insert(trades)
 
 
 if __name__ == '__main__':
     from betfair import api
+    from harb.bus import MessageBus
     from harb.feeds import MasterTimer, QuoteFeed, TradeFeed
+    from harb.polling import AdaptivePolicy
 
     import sys
 
@@ -58,9 +60,11 @@ if __name__ == '__main__':
     client.login('aristotle137', 'Antiquark_87')
 
     mt = MasterTimer()
-    qf = QuoteFeed(client, market_id)
-    tf = TradeFeed(client, market_id)
+    bus = MessageBus()  # the Mongo inserts run off the polling threads
+    qf = QuoteFeed(client, market_id, bus=bus)
+    tf = TradeFeed(client, market_id, bus=bus)
     MarketStore(client, market_id, qf, tf)
-    mt.add_feed(qf, 3)
-    mt.add_feed(tf, 3)
-    mt.run()
\ No newline at end of file
+    mt.add_feed(qf, 3, policy=AdaptivePolicy())
+    mt.add_feed(tf, 3, policy=AdaptivePolicy())
+    mt.run()
+    bus.close()
\ No newline at end of file
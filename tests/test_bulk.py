@@ -0,0 +1,150 @@
+"""
+betfair.bulk: chunking, merging back into input order and per chunk errors
+of BulkOrders.
+"""
+from __future__ import print_function, division
+
+import threading
+import time
+import unittest
+
+from betfair import bulk
+from betfair.bulk import BulkOrders
+from betfair.errors import Error, ServerError
+
+
+class FakeAPI(object):
+    """records the chunks it is sent. a bet with size 'fail' fails its chunk
+    (raised as an APIError when raise_errors is set)"""
+    def __init__(self, raise_errors=False):
+        self.raise_errors = raise_errors
+        self.chunks = []
+        self.lock = threading.Lock()
+
+    def place_bets(self, bets):
+        with self.lock:
+            self.chunks.append(list(bets))
+        # finish later chunks first so merging must restore the order
+        time.sleep(0.01 * (3 - len(self.chunks) % 3))
+        if any(bet['size'] == 'fail' for bet in bets):
+            error = Error('API_ERROR', 'INTERNAL_ERROR')
+            if self.raise_errors:
+                raise ServerError(error)
+            return error
+        return [{'betId': bet['size'], 'resultCode': 'OK'} for bet in bets]
+
+    def cancel_bets(self, bet_ids):
+        with self.lock:
+            self.chunks.append(list(bet_ids))
+        return 'OK'
+
+
+def bets(n):
+    return [{'size': i} for i in range(n)]
+
+
+class BulkOrdersTest(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeAPI()
+        self.bulk = BulkOrders(self.api)
+
+    def tearDown(self):
+        self.bulk.shutdown()
+
+    def test_place_chunks_of_60(self):
+        resp = self.bulk.place_bets(bets(130))
+        self.assertEqual(sorted(len(c) for c in self.api.chunks), [10, 60, 60])
+        self.assertEqual([(c['start'], c['count']) for c in resp['chunks']],
+                         [(0, 60), (60, 60), (120, 10)])
+        self.assertTrue(all(c['error'] is None for c in resp['chunks']))
+
+    def test_cancel_chunks_of_40(self):
+        resp = self.bulk.cancel_bets(list(range(100)))
+        self.assertEqual(sorted(len(c) for c in self.api.chunks), [20, 40, 40])
+        self.assertEqual(resp['results'], ['OK'] * 100)
+
+    def test_max_bets_override(self):
+        bulk = BulkOrders(self.api, max_bets={'place_bets': 7})
+        try:
+            resp = bulk.place_bets(bets(20))
+        finally:
+            bulk.shutdown()
+        self.assertEqual([c['count'] for c in resp['chunks']], [7, 7, 6])
+
+    def test_results_in_input_order(self):
+        resp = self.bulk.place_bets(bets(200))
+        self.assertEqual([r['betId'] for r in resp['results']],
+                         list(range(200)))
+
+    def test_empty(self):
+        self.assertEqual(self.bulk.place_bets([]),
+                         {'results': [], 'chunks': []})
+
+    def check_failed_chunk(self):
+        items = bets(150)
+        items[70]['size'] = 'fail'  # in the second chunk, 60..119
+        resp = self.bulk.place_bets(items)
+        errors = [c['error'] for c in resp['chunks']]
+        self.assertEqual(errors[0], None)
+        self.assertEqual(errors[2], None)
+        self.assertTrue(isinstance(errors[1], Error))
+        self.assertEqual(errors[1].reason, 'INTERNAL_ERROR')
+        self.assertEqual(resp['chunks'][1]['start'], 60)
+        results = resp['results']
+        self.assertEqual(len(results), 150)
+        self.assertEqual(results[60:120], [errors[1]] * 60)
+        self.assertEqual([r['betId'] for r in results[:60] + results[120:]],
+                         list(range(60)) + list(range(120, 150)))
+
+    def test_failed_chunk(self):
+        self.check_failed_chunk()
+
+    def test_failed_chunk_raised(self):
+        self.api.raise_errors = True
+        self.check_failed_chunk()
+
+    def test_short_response(self):
+        self.api.place_bets = lambda chunk: [{'betId': 0}]
+        resp = self.bulk.place_bets(bets(3))
+        error = resp['chunks'][0]['error']
+        self.assertEqual(error.code, 'SERVER_RESPONSE_ERROR')
+        self.assertEqual(resp['results'], [{'betId': 0}, error, error])
+
+    def test_update_both_price_and_size(self):
+        sent = []
+        self.api.update_bets = lambda chunk: sent.append(chunk) or \
+            ['OK'] * len(chunk)
+        resp = self.bulk.update_bets([
+            {'oldPrice': 2.0, 'newPrice': 2.2, 'oldSize': 5, 'newSize': 6},
+            {'oldPrice': 2.0, 'newPrice': 2.0, 'oldSize': 5, 'newSize': 6}])
+        self.assertEqual(resp['results'], [('OK', 'OK'), 'OK'])
+        size_first, price_second = sent[0][0], sent[1][0]
+        self.assertEqual(size_first['newPrice'], 2.0)
+        self.assertEqual(price_second['oldSize'], 6)
+
+    def test_one_pool_for_concurrent_callers(self):
+        created = []
+        original = bulk.WorkerPool
+
+        class CountingPool(original):
+            def __init__(self, workers):
+                created.append(self)
+                time.sleep(0.05)  # widen the window for a second pool
+                original.__init__(self, workers)
+
+        bulk.WorkerPool = CountingPool
+        try:
+            threads = [threading.Thread(target=self.bulk.place_bets,
+                                        args=(bets(5),)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            bulk.WorkerPool = original
+        self.assertEqual(len(created), 1)
+        self.assertEqual(len(self.api.chunks), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+harb.bus: delivery, topics and the full-queue policies of MessageBus.
+"""
+from __future__ import print_function, division
+
+import logging
+import threading
+import time
+import unittest
+
+from harb.bus import MessageBus
+
+TOPIC = ('quotes', 1)
+
+
+class Gate(object):
+    """subscriber that holds its first message until opened, so the
+    messages after it queue up"""
+    __name__ = 'gate'
+
+    def __init__(self):
+        self.opened = threading.Event()
+        self.started = threading.Event()
+        self.got = []
+
+    def __call__(self, timestamp, data):
+        self.started.set()
+        self.opened.wait(5)
+        self.got.append(data)
+
+
+class MessageBusTest(unittest.TestCase):
+    def setUp(self):
+        self.bus = MessageBus(workers=4)
+
+    def tearDown(self):
+        self.bus.close(timeout=5)
+
+    def fill(self, policy, n, maxlen=3, topic=TOPIC, topics=None):
+        """publishes 0 (held by the subscriber), then 1..n. returns the gate
+        and its subscription"""
+        gate = Gate()
+        subscription = self.bus.subscribe(topic, gate, maxlen=maxlen, policy=policy)
+        self.bus.publish(TOPIC, 0, 0)
+        self.assertTrue(gate.started.wait(5))
+        for i in range(1, n + 1):
+            self.bus.publish(topics[i % len(topics)] if topics else TOPIC, i, i)
+        return gate, subscription
+
+    def release(self, gate):
+        gate.opened.set()
+        self.assertTrue(self.bus.flush(5))
+
+    def test_delivers_in_order(self):
+        got = []
+        self.bus.subscribe(TOPIC, lambda timestamp, data: got.append((timestamp, data)))
+        for i in range(50):
+            self.bus.publish(TOPIC, i, str(i))
+        self.assertTrue(self.bus.flush(5))
+        self.assertEqual(got, [(i, str(i)) for i in range(50)])
+
+    def test_topics(self):
+        mine, everything = [], []
+        self.bus.subscribe(TOPIC, lambda t, d: mine.append(d))
+        self.bus.subscribe(None, lambda t, d: everything.append(d))
+        self.assertTrue(self.bus.subscribed(('trades', 2)))  # via the None subscription
+        self.bus.publish(TOPIC, 0, 'a')
+        self.bus.publish(('trades', 2), 0, 'b')
+        self.assertTrue(self.bus.flush(5))
+        self.assertEqual(mine, ['a'])
+        self.assertEqual(sorted(everything), ['a', 'b'])
+
+    def test_drop_oldest(self):
+        gate, subscription = self.fill('drop_oldest', 6)
+        self.release(gate)
+        self.assertEqual(gate.got, [0, 4, 5, 6])
+        self.assertEqual(subscription.dropped, 3)
+
+    def test_drop_newest(self):
+        gate, subscription = self.fill('drop_newest', 6)
+        self.release(gate)
+        self.assertEqual(gate.got, [0, 1, 2, 3])
+        self.assertEqual(subscription.dropped, 3)
+
+    def test_coalesce(self):
+        # one queued message per topic, always the latest
+        other = ('quotes', 2)
+        gate, subscription = self.fill('coalesce', 6, maxlen=10, topic=None, topics=[TOPIC, other])
+        self.assertEqual(subscription.depth(), 2)
+        self.release(gate)
+        self.assertEqual(gate.got, [0, 5, 6])
+        self.assertEqual(subscription.coalesced, 4)
+        self.assertEqual(subscription.dropped, 0)
+
+    def test_block(self):
+        gate = Gate()
+        subscription = self.bus.subscribe(TOPIC, gate, maxlen=2, policy='block')
+        self.bus.publish(TOPIC, 0, 0)
+        self.assertTrue(gate.started.wait(5))
+        done = threading.Event()
+
+        def publish():
+            for i in range(1, 6):
+                self.bus.publish(TOPIC, i, i)
+            done.set()
+        publisher = threading.Thread(target=publish)
+        publisher.start()
+        self.assertFalse(done.wait(0.2))  # waiting for room
+        self.assertEqual(subscription.depth(), 2)
+        self.release(gate)
+        publisher.join(5)
+        self.assertTrue(done.is_set())
+        self.assertTrue(self.bus.flush(5))
+        self.assertEqual(gate.got, [0, 1, 2, 3, 4, 5])
+        self.assertEqual(subscription.dropped, 0)
+
+    def test_unsubscribe_releases_blocked_publisher(self):
+        gate = Gate()
+        self.bus.subscribe(TOPIC, gate, maxlen=1, policy='block')
+        self.bus.publish(TOPIC, 0, 0)
+        self.assertTrue(gate.started.wait(5))
+        self.bus.publish(TOPIC, 1, 1)
+        publisher = threading.Thread(target=self.bus.publish, args=(TOPIC, 2, 2))
+        publisher.start()
+        time.sleep(0.05)
+        self.bus.unsubscribe(TOPIC, gate)
+        publisher.join(5)
+        self.assertFalse(publisher.is_alive())
+        self.bus.publish(TOPIC, 3, 3)
+        gate.opened.set()  # the held message is still delivered, nothing after it
+        time.sleep(0.05)
+        self.assertEqual(gate.got, [0])
+
+    def test_failing_subscriber(self):
+        got = []
+
+        def subscriber(timestamp, data):
+            if data == 1:
+                raise ValueError(data)
+            got.append(data)
+        subscription = self.bus.subscribe(TOPIC, subscriber)
+        logging.disable(logging.ERROR)
+        try:
+            for i in range(3):
+                self.bus.publish(TOPIC, i, i)
+            self.assertTrue(self.bus.flush(5))
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertEqual(got, [0, 2])
+        self.assertEqual((subscription.delivered, subscription.errors), (2, 1))
+
+    def test_bad_policy(self):
+        self.assertRaises(ValueError, self.bus.subscribe, TOPIC, lambda t, d: None, policy='lossy')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+"""
+betfair.cache: call keys, TTLs, invalidation and request coalescing of
+CachedAPI.
+"""
+from __future__ import print_function, division
+
+import threading
+import time
+import unittest
+
+from betfair.cache import CachedAPI, call_key
+from betfair.errors import Error
+
+
+class FakeAPI(object):
+    """counts the requests each method would send"""
+    def __init__(self):
+        self.calls = []
+        self.gate = None  # an Event get_market_prices waits for
+
+    def get_market_prices(self, market_id='', currency_code='', as_book=False):
+        self.calls.append(('get_market_prices', market_id))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if market_id == 'bad':
+            return Error('INVALID_MARKET')
+        return {'market_id': market_id, 'n': len(self.calls)}
+
+    def get_all_markets(self, events=None, countries=None, **filters):
+        self.calls.append(('get_all_markets', events, countries))
+        return [{'market_id': '1'}]
+
+    def get_mu_bets(self, market_id='0'):
+        self.calls.append(('get_mu_bets', market_id))
+        return [{'betId': len(self.calls)}]
+
+    def place_bets(self, bets=None):
+        self.calls.append(('place_bets',))
+        return []
+
+    def login(self, username='', password=''):
+        return 'OK'
+
+
+class CallKeyTest(unittest.TestCase):
+    def key(self, *args, **kwargs):
+        api = FakeAPI()
+        return call_key('get_all_markets', api.get_all_markets, args, kwargs)
+
+    def test_positional_and_keyword_match(self):
+        api = FakeAPI()
+        method = api.get_market_prices
+        self.assertEqual(call_key('p', method, ('1',), {}),
+                         call_key('p', method, (), {'market_id': '1'}))
+        self.assertNotEqual(call_key('p', method, ('1',), {}),
+                            call_key('p', method, ('2',), {}))
+
+    def test_lists_and_dicts(self):
+        key = self.key([7], countries=['GBR', 'IRL'], turn={'in_play': [1]})
+        hash(key)
+        self.assertEqual(key, self.key(events=[7], countries=['GBR', 'IRL'],
+                                       turn={'in_play': [1]}))
+        self.assertNotEqual(key, self.key([7], countries=['GBR']))
+
+    def test_unbindable_arguments(self):
+        key = call_key('x', len, ([1, 2],), {'a': {'b': [3]}})
+        hash(key)
+
+
+class CachedAPITest(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeAPI()
+        self.cached = CachedAPI(self.api, ttls={'get_market_prices': 0.2})
+
+    def test_hit_within_ttl(self):
+        first = self.cached.get_market_prices('1')
+        self.assertTrue(self.cached.get_market_prices(market_id='1') is first)
+        self.cached.get_market_prices('2')
+        self.assertEqual(len(self.api.calls), 2)
+        self.assertEqual(self.cached.stats(),
+                         {'hits': 1, 'misses': 2, 'coalesced': 0, 'entries': 2})
+
+    def test_expires_after_ttl(self):
+        self.cached.get_market_prices('1')
+        time.sleep(0.25)
+        self.cached.get_market_prices('1')
+        self.assertEqual(len(self.api.calls), 2)
+
+    def test_list_arguments_cached(self):
+        for i in range(3):
+            self.cached.get_all_markets(events=[7], countries=['GBR', 'IRL'])
+        self.assertEqual(len(self.api.calls), 1)
+        self.assertEqual(self.cached.stats()['hits'], 2)
+
+    def test_errors_not_cached(self):
+        self.cached.get_market_prices('bad')
+        self.cached.get_market_prices('bad')
+        self.assertEqual(len(self.api.calls), 2)
+
+    def test_uncached_methods_pass_through(self):
+        self.assertEqual(self.cached.login('user', 'pass'), 'OK')
+        self.assertEqual(self.cached.stats()['misses'], 0)
+
+    def test_invalidate(self):
+        self.cached.get_market_prices('1')
+        self.cached.get_all_markets()
+        self.cached.invalidate('get_market_prices')
+        self.cached.get_market_prices('1')
+        self.cached.get_all_markets()
+        self.assertEqual(len(self.api.calls), 3)
+        self.cached.invalidate()
+        self.assertEqual(self.cached.stats()['entries'], 0)
+
+    def test_bet_changes_invalidate(self):
+        self.cached.get_mu_bets('1')
+        self.cached.get_mu_bets('1')
+        self.cached.place_bets([{}])
+        self.cached.get_mu_bets('1')
+        self.assertEqual([c[0] for c in self.api.calls],
+                         ['get_mu_bets', 'place_bets', 'get_mu_bets'])
+
+    def start(self, n, market_id='1'):
+        """starts n threads calling get_market_prices(market_id)"""
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.cached.get_market_prices(market_id))) for i in range(n)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_calls_coalesced(self):
+        self.api.gate = threading.Event()
+        threads, results = self.start(5)
+        time.sleep(0.1)  # all waiting on the first request
+        self.api.gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.api.calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(self.cached.stats()['coalesced'], 4)
+
+    def test_invalidated_in_flight_not_stored(self):
+        self.api.gate = threading.Event()
+        threads, results = self.start(1)
+        time.sleep(0.05)
+        self.cached.invalidate('get_market_prices')
+        later, more = self.start(1)  # does not wait for the stale request
+        self.api.gate.set()
+        for thread in threads + later:
+            thread.join()
+        self.assertEqual(len(self.api.calls), 2)
+        self.assertEqual(self.cached.stats()['coalesced'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
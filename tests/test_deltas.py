@@ -0,0 +1,123 @@
+"""
+harb.deltas: QuoteDiffer.encode() documents turned back into the snapshots
+by apply_delta().
+"""
+from __future__ import print_function, division
+
+import copy
+import time
+import unittest
+
+from harb.deltas import VOLATILE, QuoteDiffer, apply_delta
+from tests.common import StubTestCase
+
+
+def runner(selection_id, backs, lays, total_matched=100.0):
+    return {'selection_id': selection_id, 'total_matched': total_matched, 'last_price_matched': backs[0][0],
+            'back_prices': levels(backs, 'L', reverse=True), 'lay_prices': levels(lays, 'B')}
+
+
+def levels(pairs, level_type, reverse=False):
+    return [{'price': p, 'amount': a, 'type': level_type, 'depth': str(i + 1)}
+            for i, (p, a) in enumerate(sorted(pairs, reverse=reverse))]
+
+
+def market(runners, status='ACTIVE', timestamp=0):
+    return {'market_id': 1, 'status': status, 'in_play_delay': 0, 'timestamp': timestamp,
+            'refresh_time': timestamp, 'runners': runners}
+
+
+def replay(docs):
+    """the snapshots after each document"""
+    snapshot, snapshots = None, []
+    for doc in docs:
+        snapshot = apply_delta(snapshot, doc)
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def stable(quotes):
+    """quotes without the fields that change every tick"""
+    return dict((k, v) for k, v in quotes.items() if k not in VOLATILE)
+
+
+class QuoteDifferTest(unittest.TestCase):
+    def setUp(self):
+        self.snapshots = [
+            market([runner(1, [(2.0, 10.0), (1.99, 5.0)], [(2.02, 8.0)]),
+                    runner(2, [(5.0, 3.0)], [(5.1, 4.0)])], timestamp=1),
+            # runner 1: a level traded away and another amount changed
+            market([runner(1, [(2.0, 12.0)], [(2.02, 8.0)], 110.0),
+                    runner(2, [(5.0, 3.0)], [(5.1, 4.0)])], timestamp=2),
+            # runner 2 removed, runner 3 added, market suspended
+            market([runner(1, [(2.0, 12.0)], [(2.02, 8.0)], 110.0),
+                    runner(3, [(9.0, 2.0)], [(9.2, 2.5)])], status='SUSPENDED', timestamp=3),
+            # lay side emptied
+            market([runner(1, [(2.0, 12.0)], [], 110.0),
+                    runner(3, [(9.0, 2.0)], [(9.2, 2.5)])], status='SUSPENDED', timestamp=4),
+        ]
+
+    def test_round_trip(self):
+        differ = QuoteDiffer(keyframe_every=60)
+        docs = [differ.encode(copy.deepcopy(s)) for s in self.snapshots]
+        self.assertEqual([d['type'] for d in docs], ['keyframe', 'delta', 'delta', 'delta'])
+        self.assertEqual([d['seq'] for d in docs], [1, 2, 3, 4])
+        self.assertEqual(replay(docs), self.snapshots)
+
+    def test_delta_contents(self):
+        differ = QuoteDiffer()
+        differ.encode(self.snapshots[0])
+        doc = differ.encode(self.snapshots[1])
+        self.assertNotIn('market', doc)
+        self.assertEqual(doc['runners'], [{'selection_id': 1, 'total_matched': 110.0,
+                                           'back': [[1.99, 0.0], [2.0, 12.0]]}])
+        doc = differ.encode(self.snapshots[2])
+        self.assertEqual(doc['market'], {'status': 'SUSPENDED'})
+        self.assertEqual(doc['removed'], [2])
+        self.assertEqual([r['selection_id'] for r in doc['runners']], [3])
+
+    def test_unchanged(self):
+        differ = QuoteDiffer()
+        differ.encode(self.snapshots[0])
+        same = dict(self.snapshots[0], timestamp=9, refresh_time=9)
+        self.assertIsNone(differ.encode(same))
+        self.assertEqual(differ.encode(self.snapshots[1])['seq'], 2)
+
+    def test_keyframes(self):
+        differ = QuoteDiffer(keyframe_every=2)
+        docs = [differ.encode(s) for s in self.snapshots]
+        self.assertEqual([d['type'] for d in docs], ['keyframe', 'delta', 'keyframe', 'delta'])
+        # a keyframe alone restores the snapshot
+        self.assertEqual(apply_delta(None, docs[2]), self.snapshots[2])
+        self.assertEqual(replay(docs), self.snapshots)
+
+
+class StubDeltaTest(StubTestCase):
+    """snapshots polled from the stub exchange, whose prices move every few
+    milliseconds"""
+    markets = 3
+    tick_secs = 0.005
+
+    def test_round_trip(self):
+        api = self.new_api()
+        market_id = self.market_ids(api, 1)[0]
+        differ = QuoteDiffer(keyframe_every=10)
+        snapshots, docs = [], []
+        for _ in range(30):
+            quotes = api.get_market_prices(market_id)
+            quotes['timestamp'] = api.API_TIMESTAMP
+            snapshots.append(quotes)
+            docs.append(differ.encode(copy.deepcopy(quotes)))
+            time.sleep(0.01)
+        self.assertTrue(any(doc is not None and doc['type'] == 'delta' for doc in docs))
+        snapshot = None
+        for expected, doc in zip(snapshots, docs):
+            if doc is None:  # nothing but the volatile fields changed
+                self.assertEqual(stable(snapshot), stable(expected))
+            else:
+                snapshot = apply_delta(snapshot, doc)
+                self.assertEqual(snapshot, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+betfair.errors: Error results, the APIError each raises, and API logging
+back in when the stub exchange expires its session (NO_SESSION).
+"""
+from __future__ import print_function, division
+
+import threading
+import time
+import unittest
+
+from betfair.errors import (Error, APIError, SessionError, ThrottleError,
+                            ServerError, RequestError)
+from tests.common import StubTestCase
+
+
+class ErrorTest(unittest.TestCase):
+    def test_compares_like_old_strings(self):
+        error = Error('API_ERROR', 'NO_SESSION', '<xml/>')
+        self.assertEqual(error, 'API_ERROR: NO_SESSION')
+        self.assertTrue(isinstance(error, str))
+        self.assertEqual((error.code, error.reason, error.response),
+                         ('API_ERROR', 'NO_SESSION', '<xml/>'))
+        self.assertEqual(Error('INVALID_MARKET'), 'INVALID_MARKET')
+        self.assertEqual(Error('INVALID_ARGUMENT', text='ERROR: bad'),
+                         'ERROR: bad')
+
+    def test_exceptions(self):
+        cases = [(Error('API_ERROR', 'NO_SESSION'), SessionError),
+                 (Error('INVALID_USERNAME_OR_PASSWORD'), SessionError),
+                 (Error('API_ERROR', 'EXCEEDED_THROTTLE'), ThrottleError),
+                 (Error('SERVER_RESPONSE_ERROR'), ServerError),
+                 (Error('INVALID_ARGUMENT', text='x'), RequestError),
+                 (Error('INVALID_MARKET'), APIError)]
+        for error, cls in cases:
+            exception = error.exception()
+            self.assertEqual(type(exception), cls)
+            self.assertTrue(exception.error is error)
+            self.assertEqual((exception.code, exception.reason),
+                             (error.code, error.reason))
+
+
+class ReloginTest(StubTestCase):
+    markets = 3
+    session_ttl = 0.2
+
+    def setUp(self):
+        self.api = self.new_api()
+        self.market_id = self.market_ids(self.api, 1)[0]
+
+    def logins(self):
+        return self.server.exchange.stats()['requests']['login']
+
+    def expire(self):
+        time.sleep(self.session_ttl + 0.1)
+
+    def test_relogin_on_no_session(self):
+        token, logins = self.api.session_token, self.logins()
+        self.expire()
+        prices = self.api.get_market_prices(self.market_id)
+        self.assertEqual(prices['market_id'], self.market_id)
+        self.assertEqual(self.logins(), logins + 1)
+        self.assertNotEqual(self.api.session_token, token)
+
+    def test_relogin_with_raise_errors(self):
+        self.api.raise_errors = True
+        self.expire()
+        self.assertEqual(self.api.get_market_prices(self.market_id)['market_id'],
+                         self.market_id)
+        self.assertEqual(self.api.keep_alive(), 'OK')
+
+    def test_relogin_disabled(self):
+        self.api.relogin = False
+        self.expire()
+        error = self.api.get_market_prices(self.market_id)
+        self.assertEqual((error.code, error.reason), ('API_ERROR', 'NO_SESSION'))
+        self.api.raise_errors = True
+        self.assertRaises(SessionError, self.api.get_market_prices,
+                          self.market_id)
+
+    def test_one_relogin_for_concurrent_calls(self):
+        logins = self.logins()
+        self.expire()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.api.get_market_prices(self.market_id))) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(r['market_id'] == self.market_id for r in results))
+        self.assertEqual(len(results), 6)
+        self.assertEqual(self.logins(), logins + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
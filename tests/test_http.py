@@ -0,0 +1,157 @@
+"""
+betfair.http.ConnectionPool against a local server that misbehaves on cue:
+stale keep-alive connections are retried once, timeouts and responses cut
+off mid-body never are, and bet actions are never resent.
+"""
+from __future__ import print_function, division
+
+import httplib
+import socket
+import threading
+import time
+import unittest
+
+from betfair.http import ConnectionPool, Http
+
+OK = 'ok'  # respond and keep the connection open
+STALE = 'stale'  # respond, then close without telling the client
+HANG = 'hang'  # read the request, never respond
+CUT = 'cut'  # send half the body, then close
+
+
+class ScriptedServer(object):
+    """keep-alive http server answering the n-th request (from 0) as
+    script[n], OK once the script runs out"""
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.requests = []  # soap actions received, in order
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(8)
+        self._conns = []
+        self.url = 'http://127.0.0.1:%d/' % self._sock.getsockname()[1]
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self._sock.close()
+        for conn in self._conns:
+            conn.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except socket.error:
+                return
+            self._conns.append(conn)
+            thread = threading.Thread(target=self._serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, conn):
+        f = conn.makefile('rb')
+        try:
+            while True:
+                headers = {}
+                line = f.readline()
+                if not line:
+                    return
+                while line.strip():
+                    line = f.readline()
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                f.read(int(headers.get('content-length', 0)))
+                n = len(self.requests)
+                self.requests.append(headers.get('soapaction'))
+                action = self.script[n] if n < len(self.script) else OK
+                if action == HANG:
+                    time.sleep(2)
+                    return
+                body = 'response %d' % n
+                if action == CUT:
+                    conn.sendall('HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s' % (len(body) * 2, body))
+                    return
+                conn.sendall('HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body))
+                if action == STALE:
+                    return
+        except socket.error:
+            pass
+        finally:
+            f.close()
+            conn.close()
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(size=1, timeout=0.3)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.close()
+
+    def serve(self, *script):
+        self.server = ScriptedServer(script)
+        return self.server.url
+
+    def stats(self):
+        return self.pool.stats().values()[0]
+
+    def test_keep_alive(self):
+        url = self.serve()
+        self.assertEqual([self.pool.request(url, 'POST', 'x') for _ in range(3)],
+                         ['response 0', 'response 1', 'response 2'])
+        self.assertEqual((self.stats()['connects'], self.stats()['reuses']), (1, 2))
+
+    def test_stale_connection_retried(self):
+        url = self.serve(STALE)
+        self.pool.request(url, 'POST', 'x')
+        time.sleep(0.05)  # let the server close it
+        self.assertEqual(self.pool.request(url, 'POST', 'x'), 'response 1')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual((self.stats()['connects'], self.stats()['errors']), (2, 0))
+
+    def test_stale_connection_not_retried_without_retry(self):
+        url = self.serve(STALE)
+        self.pool.request(url, 'POST', 'x')
+        time.sleep(0.05)
+        self.assertRaises((httplib.HTTPException, socket.error),
+                          self.pool.request, url, 'POST', 'x', retry=False)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.stats()['errors'], 1)
+
+    def test_timeout_not_retried(self):
+        url = self.serve(OK, HANG)
+        self.pool.request(url, 'POST', 'x')
+        self.assertRaises(socket.timeout, self.pool.request, url, 'POST', 'x')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.stats()['errors'], 1)
+        self.assertEqual(self.pool.request(url, 'POST', 'x'), 'response 2')  # a new connection
+
+    def test_cut_off_body_not_retried(self):
+        url = self.serve(OK, CUT)
+        self.pool.request(url, 'POST', 'x')
+        self.assertRaises(httplib.IncompleteRead, self.pool.request, url, 'POST', 'x')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.stats()['errors'], 1)
+        self.assertEqual(self.pool.request(url, 'POST', 'x'), 'response 2')
+
+    def test_bet_actions_never_resent(self):
+        url = self.serve(STALE, STALE)
+        http = Http(pool=self.pool)
+        http.send_http_request(url, 'x', 'getMarket')
+        time.sleep(0.05)
+        self.assertRaises((httplib.HTTPException, socket.error), http.send_http_request, url, 'x', 'placeBets')
+        self.assertEqual(self.server.requests, ['getMarket'])
+        # other actions are
+        self.assertEqual(http.send_http_request(url, 'x', 'getMarket'), 'response 1')
+        time.sleep(0.05)
+        self.assertEqual(http.send_http_request(url, 'x', 'getMarket'), 'response 2')
+        self.assertEqual(self.server.requests, ['getMarket', 'getMarket', 'getMarket'])
+
+
+if __name__ == '__main__':
+    unittest.main()
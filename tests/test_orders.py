@@ -0,0 +1,122 @@
+"""
+betfair.orders: OrderCache reloads, deltas and the placed()/cancelled()
+bookkeeping against the stub exchange.
+"""
+from __future__ import print_function, division
+
+import datetime
+import itertools
+import time
+
+from betfair.orders import OrderCache
+from tests.common import StubTestCase
+
+
+class OrderCacheTest(StubTestCase):
+    markets = 10
+    tick_secs = 1e6  # prices never move, so only our own bets match
+    unused = itertools.count()  # a fresh market for every test
+
+    def setUp(self):
+        self.api = self.new_api()
+        self.market_id = self.market_ids(self.api, self.markets)[
+            next(self.unused)]
+        runner = self.api.get_market_prices(self.market_id)['runners'][0]
+        self.selection_id = str(runner['selection_id'])
+        self.best = runner['back_prices'][0]  # price, amount on offer
+
+    def bet(self, price, size):
+        return {'marketId': self.market_id, 'selectionId': self.selection_id,
+                'betType': 'B', 'price': str(price), 'size': str(size),
+                'betCategoryType': 'E', 'betPersistenceType': 'NONE',
+                'bspLiability': '0', 'asianLineId': '0'}
+
+    def place(self, orders, *bets):
+        bets = list(bets)
+        results = self.api.place_bets(bets)
+        orders.placed(bets, results)
+        return [r['bet_id'] for r in results]
+
+    def unmatched(self, orders):
+        return dict((bet['betId'], bet['size'])
+                    for bet in orders.bets(status='U'))
+
+    def test_reload(self):
+        self.api.place_bets([self.bet(1000, 5), self.bet(self.best['price'], 2)])
+        orders = OrderCache(self.api, self.market_id)
+        self.assertEqual(orders.reload(), 1)
+        unmatched = orders.bets(status='U')
+        self.assertEqual([(b['price'], b['size']) for b in unmatched],
+                         [(1000.0, 5.0)])
+        self.assertEqual(len(orders.bets(self.market_id, self.selection_id)), 2)
+        self.assertEqual(orders.bets(self.market_id, 'no such runner'), [])
+        self.assertEqual(orders.stats()['reloads'], 1)
+
+    def test_reload_empty_market(self):
+        orders = OrderCache(self.api, self.market_id)
+        self.assertEqual(orders.sync(), 0)
+        self.assertEqual(orders.bets(), [])
+
+    def test_delta_absorbs_match_at_placement(self):
+        orders = OrderCache(self.api, self.market_id)
+        orders.reload()
+        size = self.best['amount'] + 100  # part matches when placed
+        bet_id, = self.place(orders, self.bet(self.best['price'], size))
+        self.assertAlmostEqual(self.unmatched(orders)[bet_id], 100, 2)
+        time.sleep(1.1)  # past excludeLastSecond
+        self.assertEqual(orders.sync(), 1)
+        self.assertEqual(orders.stats()['deltas'], 1)
+        # the delta reports the match placed() already took off
+        self.assertAlmostEqual(self.unmatched(orders)[bet_id], 100, 2)
+        fresh = OrderCache(self.api, self.market_id)
+        fresh.reload()
+        self.assertEqual(list(self.unmatched(fresh)), [bet_id])
+        self.assertAlmostEqual(self.unmatched(fresh)[bet_id],
+                               self.unmatched(orders)[bet_id], 2)
+        self.assertEqual(len(orders.bets(status='M')),
+                         len(fresh.bets(status='M')))
+
+    def test_delta_counts_each_match_once(self):
+        orders = OrderCache(self.api, self.market_id)
+        orders.reload()
+        self.api.place_bets([self.bet(self.best['price'], 2)])
+        time.sleep(1.1)
+        self.assertEqual(orders.sync(), 1)
+        self.assertEqual(orders.sync(), 0)  # the overlap repeats it
+        self.assertEqual(orders.stats()['matches'], 1)
+
+    def test_placed_and_cancelled(self):
+        orders = OrderCache(self.api, self.market_id)
+        orders.reload()
+        low, high = self.place(orders, self.bet(1000, 5), self.bet(900, 3))
+        self.assertEqual(self.unmatched(orders), {low: 5.0, high: 3.0})
+        self.assertEqual(self.api.cancel_bets([low]), 'OK')
+        orders.cancelled([low, 'unknown'])
+        self.assertEqual(self.unmatched(orders), {high: 3.0})
+        self.assertEqual(orders.stats()['unmatched'], 1)
+
+    def test_placed_skips_failures(self):
+        orders = OrderCache(self.api, self.market_id)
+        orders.reload()
+        bets = [self.bet(1000, 1), self.bet(1000, 5)]  # below the min stake
+        results = self.api.place_bets(bets)
+        orders.placed(bets, results)
+        self.assertEqual(list(self.unmatched(orders).values()), [5.0])
+        orders.placed(bets, 'API_ERROR: NO_SESSION')
+        self.assertEqual(len(self.unmatched(orders)), 1)
+
+    def test_cursor_from_clock(self):
+        orders = OrderCache(self.api, self.market_id)
+        get_all_mu_bets = self.api.get_all_mu_bets
+
+        def stale_timestamp(*args, **kwargs):
+            # another thread's older reply lands while we sync
+            bets = get_all_mu_bets(*args, **kwargs)
+            self.api.API_TIMESTAMP = datetime.datetime(2000, 1, 1)
+            return bets
+        self.api.get_all_mu_bets = stale_timestamp
+        before = self.api.clock.server_now()
+        orders.sync()
+        orders.sync()
+        lag = (before - orders._since).total_seconds()
+        self.assertTrue(0 < lag < 1.5, lag)
@@ -0,0 +1,78 @@
+"""
+betfair.parsers against the original inline parsers of API, kept in
+benchmarks/legacy.py.
+"""
+from __future__ import print_function, division
+
+import unittest
+
+from betfair import parsers
+from betfair.api_async import API_A
+from benchmarks import legacy, payloads
+from tests.common import Capture, StubTestCase
+
+PRICES_TAGS = ("<marketPrices xsi:type='xsd:string'>", '</marketPrices>')
+COMPLETE_TAGS = ("<completeMarketPrices xsi:type='xsd:string'>", '</completeMarketPrices>')
+
+
+class ParserTest(unittest.TestCase):
+    def test_market_prices(self):
+        for n_runners in (1, 5, 12, 40):
+            for depth in (1, 3):
+                payload = payloads.market_prices(n_runners, depth, seed=n_runners)
+                self.assertEqual(parsers.parse_market_prices(payload), legacy.parse_market_prices(payload))
+
+    def test_market_prices_without_offers(self):
+        payload = payloads.market_prices(3, depth=0)
+        self.assertEqual(parsers.parse_market_prices(payload), legacy.parse_market_prices(payload))
+
+    def test_escaped_colon(self):
+        # the market info holds an escaped ':', which must not split the rows
+        payload = payloads.market_prices(2)
+        self.assertIn('\\:', payload)
+        market = parsers.parse_market_prices(payload)
+        self.assertEqual(market, legacy.parse_market_prices(payload))
+        self.assertEqual(market['info'], 'Some info with escaped colon')
+        self.assertEqual(len(market['runners']), 2)
+
+    def test_complete_market_prices(self):
+        for n_runners, rungs in ((1, 1), (10, 50), (20, 150)):
+            payload = payloads.complete_market_prices(n_runners, rungs)
+            self.assertEqual(parsers.parse_complete_market_prices(payload),
+                             legacy.parse_complete_market_prices(payload))
+
+    def test_all_markets(self):
+        resp_xml = payloads.all_markets(500)
+        start = resp_xml.index("<marketData xsi:type='xsd:string'>") + len("<marketData xsi:type='xsd:string'>")
+        data = resp_xml[start:resp_xml.index('</marketData>', start)]
+        self.assertEqual(list(parsers.iter_all_markets(data)), legacy.parse_all_markets(resp_xml))
+
+
+class StubParserTest(StubTestCase):
+    """the API and API_A paths, on responses from the stub exchange"""
+    def test_api(self):
+        api = self.new_api()
+        api.http = capture = Capture(api.http)
+        for market_id in self.market_ids(api):
+            prices = api.get_market_prices(market_id)
+            payload = capture.payload('getMarketPricesCompressed', *PRICES_TAGS)
+            self.assertEqual(prices, legacy.parse_market_prices(payload))
+            complete = api.get_complete_market_prices(market_id)
+            payload = capture.payload('getCompleteMarketPricesCompressed', *COMPLETE_TAGS)
+            self.assertEqual(complete, legacy.parse_complete_market_prices(payload))
+
+    def test_api_a(self):
+        api = self.new_api()
+        api.http = capture = Capture(api.http)
+        client = API_A(api=api, workers=2)
+        try:
+            for market_id in self.market_ids(api, 3):
+                prices = client.get_market_prices(market_id).result(10)
+                payload = capture.payload('getMarketPricesCompressed', *PRICES_TAGS)
+                self.assertEqual(prices, legacy.parse_market_prices(payload))
+        finally:
+            client.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+harb.polling.AdaptivePolicy: periods from the time to the off and the
+market's activity, and the throttled start time lookup.
+"""
+from __future__ import print_function, division
+
+import datetime
+import logging
+import unittest
+
+from betfair import Error
+from betfair.errors import ServerError
+from betfair.clock import ServerClock
+from harb.polling import AdaptivePolicy, matched
+
+
+class Client(object):
+    """get_market() answers start, or fails with error (raising it if
+    raise_errors)"""
+    def __init__(self, start=None, error=None, raise_errors=False):
+        self.clock = ServerClock()
+        self.start = start
+        self.error = error
+        self.raise_errors = raise_errors
+        self.calls = 0
+
+    def get_market(self, market_id):
+        self.calls += 1
+        if self.error is not None:
+            if self.raise_errors:
+                raise ServerError(self.error)
+            return self.error
+        return {'marketTime': self.start.strftime('%Y-%m-%dT%H:%M:%S.000Z')}
+
+
+class Feed(object):
+    market_id = 1
+
+    def __init__(self, client):
+        self.client = client
+
+
+def starting_in(secs):
+    return Feed(Client(datetime.datetime.utcnow() + datetime.timedelta(seconds=secs)))
+
+
+def quotes(total_matched, **fields):
+    return dict(fields, runners=[{'total_matched': total_matched}])
+
+
+class AdaptivePolicyTest(unittest.TestCase):
+    def setUp(self):
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_schedule(self):
+        for secs, period in ((60, 1), (300, 2), (1200, 5), (3000, 15), (7200, 30), (86400, 60), (-60, 1)):
+            self.assertEqual(AdaptivePolicy()(starting_in(secs), None), period, secs)
+
+    def test_start_time_looked_up_once(self):
+        feed, policy = starting_in(300), AdaptivePolicy()
+        for _ in range(5):
+            policy(feed, None)
+        self.assertEqual(feed.client.calls, 1)
+
+    def test_status(self):
+        policy, feed = AdaptivePolicy(), starting_in(3000)
+        self.assertEqual(policy(feed, quotes(0, status='SUSPENDED')), 10.0)
+        self.assertEqual(policy(feed, quotes(0, status='CLOSED')), 60.0)
+        self.assertEqual(policy(feed, quotes(0, status='ACTIVE', in_play_delay='5')), 1.0)
+        self.assertEqual(policy(feed, quotes(0, status='ACTIVE', in_play_delay='0')), 15)
+
+    def test_busy_and_idle(self):
+        policy, feed = AdaptivePolicy(idle_ticks=2), starting_in(3000)
+        policy._when = 0.0  # a first tick long ago: any matched is slow
+        policy._matched = 0.0
+        self.assertEqual(policy(feed, quotes(100.0)), 15)
+        policy._when -= 1.0  # 1000 matched in a second
+        self.assertEqual(policy(feed, quotes(1100.0)), 7.5)
+        periods = [policy(feed, quotes(1100.0)) for _ in range(4)]
+        self.assertEqual(periods, [15, 30, 60, 60])  # idle from the second
+        self.assertEqual(policy.idle, 4)
+
+    def test_failed_lookup_throttled(self):
+        for raise_errors in (False, True):
+            client = Client(error=Error('API_ERROR', 'INTERNAL_ERROR'), raise_errors=raise_errors)
+            policy = AdaptivePolicy(lookup_retry_secs=300)
+            periods = [policy(Feed(client), None) for _ in range(5)]
+            self.assertEqual(periods, [60.0] * 5)
+            self.assertEqual(client.calls, 1, raise_errors)
+            policy._next_lookup = 0.0  # retry time reached
+            client.error, client.start = None, datetime.datetime.utcnow()
+            self.assertEqual(policy(Feed(client), None), 1)
+            self.assertEqual(client.calls, 2)
+
+    def test_lookup_throttled_when_the_client_blows_up(self):
+        class Broken(Client):
+            def get_market(self, market_id):
+                self.calls += 1
+                raise IOError('connection refused')
+        client, policy = Broken(), AdaptivePolicy()
+        self.assertRaises(IOError, policy, Feed(client), None)
+        self.assertEqual(policy(Feed(client), None), 60.0)
+        self.assertEqual(client.calls, 1)
+
+
+class MatchedTest(unittest.TestCase):
+    def test_matched(self):
+        self.assertEqual(matched(quotes(10.0)), 10.0)
+        self.assertEqual(matched({'runners': {1: {'amount': [2.0, 3.0]}, 2: {'amount': [5.0]}}}), 10.0)
+        self.assertIsNone(matched(None))
+        self.assertIsNone(matched(Error('API_ERROR')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+betfair.ratelimit: token bucket refill, per endpoint class budgets, and
+API_T drawing from them against the stub exchange.
+"""
+from __future__ import print_function, division
+
+import threading
+import time
+import unittest
+
+from betfair import ratelimit
+from betfair.api_throttled import API_T
+from betfair.ratelimit import RateLimiter, TokenBucket
+from tests.common import StubTestCase
+
+
+class FakeTime(object):
+    """stands in for the time module: sleep() moves the clock on"""
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.slept.append(secs)
+        self.now += secs
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeTime()
+        self.time, ratelimit.time = ratelimit.time, self.clock
+
+    def tearDown(self):
+        ratelimit.time = self.time
+
+    def test_burst_then_empty(self):
+        bucket = TokenBucket(2.0, 3)
+        self.assertEqual([bucket.try_acquire() for i in range(4)],
+                         [True, True, True, False])
+        self.assertEqual(bucket.acquired, 3)
+
+    def test_refill_at_rate(self):
+        bucket = TokenBucket(2.0, 3)
+        bucket.try_acquire(3)
+        self.clock.now += 0.25
+        self.assertFalse(bucket.try_acquire())  # half a token
+        self.clock.now += 0.25
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+
+    def test_refill_capped_at_burst(self):
+        bucket = TokenBucket(2.0, 3)
+        self.clock.now += 60
+        self.assertEqual(bucket.stats()['tokens'], 3.0)
+        self.assertTrue(bucket.try_acquire(3))
+        self.assertFalse(bucket.try_acquire())
+
+    def test_reserve_goes_into_debt(self):
+        bucket = TokenBucket(4.0, 2)
+        self.assertEqual([bucket.reserve() for i in range(5)],
+                         [0.0, 0.0, 0.25, 0.5, 0.75])
+        stats = bucket.stats()
+        self.assertEqual(stats['tokens'], -3.0)
+        self.assertEqual(stats['waits'], 3)
+        self.assertEqual(stats['wait_secs'], 1.5)
+        self.assertEqual(stats['max_wait_secs'], 0.75)
+        self.clock.now += 1.0  # pays the debt back
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_acquire_sleeps(self):
+        bucket = TokenBucket(10.0, 1)
+        self.assertEqual(bucket.acquire(), 0.0)
+        self.assertAlmostEqual(bucket.acquire(), 0.1)
+        self.assertEqual(len(self.clock.slept), 1)
+        self.assertAlmostEqual(self.clock.slept[0], 0.1)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_endpoint_classes(self):
+        limiter = RateLimiter()
+        self.assertTrue(limiter.bucket('getMarketPricesCompressed')
+                        is limiter.buckets['data'])
+        self.assertTrue(limiter.bucket('placeBets') is limiter.buckets['bets'])
+        self.assertTrue(limiter.bucket('getEvents') is limiter.buckets['free'])
+        self.assertTrue(limiter.bucket('noSuchAction') is limiter.buckets['free'])
+
+    def test_budgets_and_classes_merged(self):
+        limiter = RateLimiter({'data': (20.0, 40), 'stream': (1.0, 1)},
+                              {'getMarket': 'stream'})
+        self.assertEqual(limiter.buckets['data'].rate, 20.0)
+        self.assertEqual(limiter.buckets['bets'].burst,
+                         ratelimit.DEFAULT_BUDGETS['bets'][1])
+        self.assertTrue(limiter.bucket('getMarket') is limiter.buckets['stream'])
+
+    def test_classes_budgeted_separately(self):
+        limiter = RateLimiter({'data': (0.1, 2), 'bets': (0.1, 2)})
+        limiter.reserve('getMUBets')
+        limiter.reserve('getMUBets')
+        self.assertTrue(limiter.reserve('getMarketPricesCompressed') > 9)
+        self.assertEqual(limiter.reserve('placeBets'), 0.0)
+        self.assertEqual(limiter.reserve('login'), 0.0)
+        stats = limiter.stats()
+        self.assertEqual(stats['data']['waits'], 1)
+        self.assertEqual(stats['bets']['waits'], 0)
+
+    def test_concurrent_reserve(self):
+        bucket = TokenBucket(1.0, 100)
+        threads = [threading.Thread(target=lambda: [bucket.reserve()
+                                                    for i in range(50)])
+                   for j in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(bucket.acquired, 200)
+        self.assertTrue(-101 < bucket.stats()['tokens'] < -99)
+
+
+class ThrottledAPITest(StubTestCase):
+    markets = 3
+
+    def test_data_calls_wait_for_their_budget(self):
+        limiter = RateLimiter({'data': (20.0, 2), 'free': (100.0, 100)})
+        api = API_T(limiter=limiter)
+        api.urls = self.server.urls()
+        self.assertEqual(api.login('user', 'pass'), 'OK')
+        market_id = self.market_ids(api, 1)[0]
+        started = time.time()
+        for i in range(6):
+            api.get_market_prices(market_id)
+        # 2 from the burst, then 4 more at 20 a second
+        self.assertTrue(time.time() - started >= 0.18)
+        stats = limiter.stats()
+        self.assertEqual(stats['data']['acquired'], 6)
+        self.assertEqual(stats['data']['waits'], 4)
+        self.assertEqual(stats['free']['waits'], 0)
+        self.assertEqual(stats['free']['acquired'], 2)  # login, markets
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+betfair.replay: sessions recorded against the stub exchange and replayed
+without it.
+"""
+from __future__ import print_function, division
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from betfair.api import API
+from betfair.replay import ReplayError, read_log, record, replay
+from tests.common import StubTestCase
+
+
+class ReplayTest(StubTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record(self, requests=True, pause=0.0):
+        """records a session polling three markets. returns (path, market
+        ids, {market id: prices})"""
+        path = os.path.join(self.dir, 'session.log.gz')
+        api = API()
+        api.urls = self.server.urls()
+        recorder = record(api, path, requests)
+        api.login('user', 'secret')
+        market_ids = self.market_ids(api, 3)
+        prices = {}
+        for market_id in market_ids:
+            time.sleep(pause)
+            prices[market_id] = api.get_market_prices(market_id)
+        recorder.close()
+        self.token = api.session_token
+        return path, market_ids, prices
+
+    def replayed(self, path, speed=None, loop=False):
+        api = API()
+        transport = replay(api, path, speed, loop)
+        self.assertEqual(api.login('anyone', 'anything'), 'OK')
+        api.get_all_markets()
+        return api, transport
+
+    def test_round_trip(self):
+        path, market_ids, prices = self.record()
+        api, transport = self.replayed(path)
+        for market_id in reversed(market_ids):  # not the recorded order
+            self.assertEqual(api.get_market_prices(market_id), prices[market_id])
+        self.assertEqual(sum(transport.remaining().values()), 0)
+        self.assertEqual(transport.served, 2 + len(market_ids))
+        self.assertRaises(ReplayError, api.get_market_prices, market_ids[0])
+
+    def test_unrecorded_market(self):
+        path, market_ids, prices = self.record()
+        api, transport = self.replayed(path)
+        self.assertRaises(ReplayError, api.get_market_prices, '999')
+
+    def test_loop(self):
+        path, market_ids, prices = self.record()
+        api, transport = self.replayed(path, loop=True)
+        for _ in range(2):
+            self.assertEqual(api.get_market_prices(market_ids[1]), prices[market_ids[1]])
+
+    def test_password_redacted(self):
+        path, market_ids, prices = self.record()
+        logins = [r for r in read_log(path) if r['action'] == 'login']
+        self.assertEqual(len(logins), 1)
+        self.assertNotIn('secret', logins[0]['request'])
+
+    def test_session_token_redacted(self):
+        path, market_ids, prices = self.record()
+        self.assertTrue(self.token)
+        records = list(read_log(path))
+        self.assertEqual(len(records), 2 + len(market_ids))
+        for r in records:
+            self.assertNotIn(self.token, r['request'])
+            self.assertNotIn(self.token, r['response'])
+            self.assertIn('sessionToken', r['response'])
+        api, transport = self.replayed(path)
+        self.assertEqual(api.session_token, '***')
+
+    def test_without_requests(self):
+        # only the soap action to go by: served in the recorded order
+        path, market_ids, prices = self.record(requests=False)
+        self.assertTrue(all('request' not in r for r in read_log(path)))
+        api, transport = self.replayed(path)
+        self.assertEqual([api.get_market_prices(m) for m in market_ids],
+                         [prices[m] for m in market_ids])
+
+    def test_recorded_timing(self):
+        # the third poll was recorded ~0.6s after login, so at speed 2 it
+        # comes back ~0.3s after it however soon it is asked for
+        path, market_ids, prices = self.record(pause=0.2)
+        start = time.time()
+        api, transport = self.replayed(path, speed=2.0)
+        api.get_market_prices(market_ids[2])
+        self.assertGreater(time.time() - start, 0.25)
+        start = time.time()
+        api, transport = self.replayed(path)
+        api.get_market_prices(market_ids[2])
+        self.assertLess(time.time() - start, 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
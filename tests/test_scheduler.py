@@ -0,0 +1,159 @@
+"""
+harb.scheduler.FeedScheduler: fixed-rate ticks, busy and late ticks, missed
+slots, adaptive periods and the request budget.
+"""
+from __future__ import print_function, division
+
+import logging
+import threading
+import time
+import unittest
+
+from harb.scheduler import FeedScheduler, Histogram
+
+
+class Feed(object):
+    """records when its ticks start. post_to_all() takes secs"""
+    def __init__(self, secs=0.0, fail=False):
+        self.secs = secs
+        self.fail = fail
+        self.starts = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def post_to_all(self):
+        with self._lock:
+            self.starts.append(time.time())
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.secs)
+        with self._lock:
+            self.running -= 1
+        if self.fail:
+            raise ValueError('feed failed')
+        return {'n': len(self.starts)}
+
+
+class FeedSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = FeedScheduler(workers=4)
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def run_for(self, secs):
+        self.scheduler.start()
+        time.sleep(secs)
+        self.scheduler.stop()
+
+    def test_fixed_rate(self):
+        # run time does not add to the period: ticks stay on start + k * period
+        feed = Feed(secs=0.03)
+        entry = self.scheduler.add_feed(feed, 0.1)
+        self.run_for(1.0)
+        time.sleep(0.05)  # let the last tick finish
+        self.assertIn(len(feed.starts), (9, 10, 11))
+        first = feed.starts[0]
+        for k, start in enumerate(feed.starts):
+            self.assertAlmostEqual(start - first, k * 0.1, delta=0.05)
+        self.assertEqual((entry.skipped_busy, entry.dropped_late, entry.overruns), (0, 0, 0))
+        self.assertEqual(entry.stats()['ticks'], len(feed.starts))
+
+    def test_busy_feed_skips_ticks(self):
+        feed = Feed(secs=0.25)
+        entry = self.scheduler.add_feed(feed, 0.1)
+        self.run_for(1.0)
+        time.sleep(0.3)  # let the last tick finish
+        self.assertEqual(feed.max_running, 1)  # never queued up behind itself
+        self.assertIn(len(feed.starts), (3, 4, 5))
+        self.assertGreater(entry.skipped_busy, 4)
+        self.assertEqual(entry.overruns, entry.ticks)
+
+    def test_slow_feed_does_not_delay_others(self):
+        slow, fast = Feed(secs=0.5), Feed()
+        self.scheduler.add_feed(slow, 0.1)
+        self.scheduler.add_feed(fast, 0.1)
+        self.run_for(1.0)
+        self.assertIn(len(fast.starts), (9, 10, 11))
+
+    def test_late_ticks_dropped(self):
+        # one worker, held by a slow feed: the other's ticks start too late
+        self.scheduler = FeedScheduler(workers=1)
+        slow, starved = Feed(secs=0.5), Feed()
+        self.scheduler.add_feed(slow, 1.0)
+        entry = self.scheduler.add_feed(starved, 0.1, deadline=0.05)
+        self.run_for(0.45)
+        time.sleep(0.2)
+        self.assertGreater(entry.dropped_late, 0)
+
+    def test_missed_slots_skipped(self):
+        # a dispatcher held up for several periods skips the slots it missed
+        # rather than running them in a burst
+        feed = Feed()
+        entry = self.scheduler.add_feed(feed, 0.05)
+        self.scheduler.start()
+        time.sleep(0.02)
+        with self.scheduler._lock:
+            time.sleep(0.3)
+        time.sleep(0.1)
+        self.scheduler.stop()
+        self.assertGreaterEqual(entry.missed, 4)
+        gaps = [b - a for a, b in zip(feed.starts, feed.starts[1:])]
+        self.assertTrue(all(gap > 0.02 for gap in gaps), gaps)
+
+    def test_errors_counted(self):
+        feed = Feed(fail=True)
+        entry = self.scheduler.add_feed(feed, 0.1)
+        logging.disable(logging.ERROR)
+        try:
+            self.run_for(0.35)
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertGreater(entry.errors, 1)
+        self.assertEqual(entry.errors, entry.ticks)
+
+    def test_policy(self):
+        calls = []
+
+        def policy(feed, data):
+            calls.append(data)
+            return 0.3
+        feed = Feed()
+        entry = self.scheduler.add_feed(feed, 0.05, policy=policy)
+        self.run_for(0.8)
+        self.assertEqual(calls[0], {'n': 1})
+        self.assertEqual((entry.wanted, entry.period), (0.3, 0.3))
+        self.assertIn(len(feed.starts), (3, 4))
+
+    def test_budget(self):
+        # 2 feeds at 20 a second each want 40 ticks a second: stretched 4x
+        self.scheduler = FeedScheduler(budget=10)
+        feeds = [Feed(), Feed()]
+        entries = [self.scheduler.add_feed(feed, 0.05) for feed in feeds]
+        self.assertEqual([e.period for e in entries], [0.1, 0.2])  # the first was added alone
+        self.run_for(1.0)
+        self.assertEqual([e.period for e in entries], [0.2, 0.2])
+        self.assertLessEqual(sum(len(f.starts) for f in feeds), 13)
+
+    def test_report(self):
+        self.scheduler.add_feed(Feed(), 0.1)
+        self.run_for(0.25)
+        lines = self.scheduler.report().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('Feed()'))
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = Histogram()
+        for ms in [0.5] * 90 + [30] * 9 + [700]:
+            histogram.add(ms)
+        summary = histogram.summary()
+        self.assertEqual((summary['n'], summary['p50'], summary['p99'], summary['max']), (100, 1, 50, 700))
+        self.assertEqual(summary['buckets'], {'1': 90, '50': 9, '1000': 1})
+        self.assertEqual(Histogram().percentile(99), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
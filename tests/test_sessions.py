@@ -0,0 +1,142 @@
+"""
+betfair.sessions: market sharding and failover, keep-alives and idle
+accounting of SessionManager against the stub exchange.
+"""
+from __future__ import print_function, division
+
+import time
+import unittest
+
+from betfair.api import API
+from betfair.sessions import SessionManager, shard
+from tests.common import StubTestCase
+
+ACCOUNTS = [('user1', 'pass1'), ('user2', 'pass2'), ('user3', 'pass3')]
+
+
+class ShardTest(unittest.TestCase):
+    def test_numeric_ids(self):
+        self.assertEqual([shard(str(i), 3) for i in range(100, 106)],
+                         [1, 2, 0, 1, 2, 0])
+
+    def test_other_ids(self):
+        self.assertEqual(shard('1.2345', 4), shard('1.2345', 4))
+        self.assertTrue(0 <= shard('1.2345', 4) < 4)
+
+
+class SessionManagerTest(StubTestCase):
+    markets = 12
+    users = dict(ACCOUNTS, user='pass')
+
+    def setUp(self):
+        self.managers = []
+
+    def tearDown(self):
+        for manager in self.managers:
+            manager.close()
+
+    def new_api(self, exchange='uk'):
+        api = API(exchange)
+        api.urls = self.server.urls()
+        return api
+
+    def manager(self, accounts=ACCOUNTS, **kwargs):
+        manager = SessionManager(accounts, api_factory=self.new_api, **kwargs)
+        self.managers.append(manager)
+        return manager
+
+    def test_login(self):
+        manager = self.manager()
+        self.assertEqual(manager.login(),
+                         {'user1': 'OK', 'user2': 'OK', 'user3': 'OK'})
+        self.assertEqual(len(manager.up()), 3)
+        self.assertEqual(len(set(s.api.session_token for s in manager.sessions)), 3)
+        self.assertTrue(all(s.api.clock is manager.clock
+                            for s in manager.sessions))
+
+    def test_names(self):
+        manager = self.manager([('user1', 'pass1'), ('user1', 'pass1', '99'),
+                                {'name': 'third', 'username': 'user2',
+                                 'password': 'pass2'}])
+        self.assertEqual([s.name for s in manager.sessions],
+                         ['user1', 'user1:99', 'third'])
+        self.assertRaises(ValueError, SessionManager, [])
+
+    def test_calls_sharded(self):
+        manager = self.manager()
+        manager.login()
+        market_ids = [m['market_id'] for m in manager.get_all_markets()]
+        prices = manager.get_markets_prices(market_ids)
+        self.assertEqual(sorted(prices), sorted(market_ids))
+        self.assertTrue(all(p['market_id'] == m for m, p in prices.items()))
+        for i, s in enumerate(manager.sessions):
+            owned = [m for m in market_ids if shard(m, 3) == i]
+            self.assertEqual(s.calls, len(owned) + (i == 0))  # + all markets
+            self.assertTrue(manager.session_for(owned[0]) is s)
+
+    def test_concurrent_calls_counted(self):
+        manager = self.manager(workers=16)
+        manager.login()
+        market_ids = [m['market_id'] for m in manager.get_all_markets()]
+        for i in range(5):
+            manager.get_markets_prices(market_ids)
+        self.assertEqual(sum(s['calls'] for s in manager.stats()),
+                         5 * len(market_ids) + 1)
+
+    def test_failed_login_hands_over_shard(self):
+        manager = self.manager([('user1', 'pass1'), ('user2', 'wrong')])
+        results = manager.login()
+        self.assertEqual(results['user2'], 'INVALID_USERNAME_OR_PASSWORD')
+        first, second = manager.sessions
+        self.assertEqual(manager.up(), [first])
+        market_ids = [m['market_id'] for m in manager.get_all_markets()]
+        odd = [m for m in market_ids if shard(m, 2) == 1][0]
+        self.assertTrue(manager.session_for(odd) is first)
+        self.assertEqual(manager.get_market_prices(odd)['market_id'], odd)
+        self.assertEqual(second.calls, 0)
+        stats = manager.stats()[1]
+        self.assertEqual((stats['up'], stats['failed_logins']), (False, 1))
+        # retried by check() once next_retry has passed
+        second.password = 'pass2'
+        manager.check()
+        self.assertFalse(second.up)
+        second.next_retry = 0.0
+        manager.check()
+        self.assertTrue(second.up)
+        self.assertTrue(manager.session_for(odd) is second)
+
+    def test_idle_secs(self):
+        manager = self.manager()
+        session = manager.sessions[0]
+        self.assertEqual(session.idle_secs(), None)
+        session.login()
+        self.assertTrue(0 <= session.idle_secs() < 0.1)
+        time.sleep(0.2)
+        self.assertTrue(session.idle_secs() >= 0.2)
+        session.api.get_all_markets()
+        self.assertTrue(session.idle_secs() < 0.1)
+
+    def test_keep_alive_when_idle(self):
+        manager = self.manager(keep_alive_secs=0.4)
+        manager.login()
+        time.sleep(0.15)
+        manager.check()
+        self.assertEqual([s.keep_alives for s in manager.sessions], [0, 0, 0])
+        manager.get_all_markets()  # only the first session is busy
+        time.sleep(0.3)
+        manager.check()  # the other two have been idle 0.45s
+        self.assertEqual([s.keep_alives for s in manager.sessions], [0, 1, 1])
+        self.assertEqual(len(manager.up()), 3)
+        manager.check()
+        self.assertEqual([s.keep_alives for s in manager.sessions], [0, 1, 1])
+
+    def test_logout(self):
+        manager = self.manager()
+        manager.login()
+        manager.close()
+        self.assertEqual(manager.up(), [])
+        self.managers.remove(manager)
+
+
+if __name__ == '__main__':
+    unittest.main()
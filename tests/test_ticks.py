@@ -0,0 +1,119 @@
+"""
+betfair.ticks: rounding at the edges of the price bands, pip shifts across
+them, and the vectorised functions against the scalar ones.
+"""
+from __future__ import print_function, division
+
+import random
+import unittest
+
+import numpy as np
+
+from betfair import ticks
+from betfair.ticks import TICKS, round_price, shift_price, tick_distance
+from benchmarks import legacy
+
+# (price, nearest, down, up) around every band edge. halves round up
+BAND_EDGES = [
+    (0.5, 1.01, 1.01, 1.01),
+    (1.01, 1.01, 1.01, 1.01),
+    (1.994, 1.99, 1.99, 2.0),
+    (1.995, 2.0, 1.99, 2.0),
+    (2.0, 2.0, 2.0, 2.0),
+    (2.01, 2.02, 2.0, 2.02),
+    (2.99, 3.0, 2.98, 3.0),
+    (3.02, 3.0, 3.0, 3.05),
+    (3.025, 3.05, 3.0, 3.05),
+    (3.99, 4.0, 3.95, 4.0),
+    (4.04, 4.0, 4.0, 4.1),
+    (5.95, 6.0, 5.9, 6.0),
+    (6.1, 6.2, 6.0, 6.2),
+    (9.9, 10.0, 9.8, 10.0),
+    (10.2, 10.0, 10.0, 10.5),
+    (19.75, 20.0, 19.5, 20.0),
+    (20.4, 20.0, 20.0, 21.0),
+    (29.5, 30.0, 29.0, 30.0),
+    (31.0, 32.0, 30.0, 32.0),
+    (49.0, 50.0, 48.0, 50.0),
+    (52.4, 50.0, 50.0, 55.0),
+    (97.5, 100.0, 95.0, 100.0),
+    (104.0, 100.0, 100.0, 110.0),
+    (995.0, 1000.0, 990.0, 1000.0),
+    (1000.0, 1000.0, 1000.0, 1000.0),
+    (5000.0, 1000.0, 1000.0, 1000.0),
+]
+
+
+class TicksTest(unittest.TestCase):
+    def test_ladder(self):
+        self.assertEqual(len(TICKS), 350)
+        self.assertEqual((TICKS[0], TICKS[-1]), (1.01, 1000.0))
+        self.assertEqual(TICKS, sorted(set(TICKS)))
+        self.assertEqual(TICKS, legacy_ladder())
+
+    def test_band_edges(self):
+        for price, nearest, down, up in BAND_EDGES:
+            self.assertEqual(round_price(price), nearest, price)
+            self.assertEqual(round_price(price, 'down'), down, price)
+            self.assertEqual(round_price(price, 'up'), up, price)
+
+    def test_float_noise(self):
+        # a hair off a tick is on it, whatever the mode
+        for price in (2.0, 3.05, 6.2, 1000.0):
+            for mode in ticks.MODES:
+                self.assertEqual(round_price(price + 1e-10, mode), price)
+                self.assertEqual(round_price(price - 1e-10, mode), price)
+        self.assertEqual(round_price(0.1 + 0.2 + 1.0), 1.3)
+
+    def test_shift_across_bands(self):
+        self.assertEqual(shift_price(1.99, 1), 2.0)
+        self.assertEqual(shift_price(2.0, -1), 1.99)
+        self.assertEqual(shift_price(2.98, 2), 3.05)
+        self.assertEqual(shift_price(3.95, 1), 4.0)
+        self.assertEqual(shift_price(100.0, -1), 95.0)
+        self.assertEqual(shift_price(1.01, -1), 1.01)
+        self.assertEqual(shift_price(1000.0, 1), 1000.0)
+        self.assertEqual(shift_price(2.01, 1, 'down'), 2.02)
+        self.assertEqual(tick_distance(1.99, 2.02), 2)
+        self.assertEqual(tick_distance(3.05, 2.98), -2)
+        self.assertEqual(tick_distance(1.01, 1000.0), 349)
+
+    def test_bad_mode(self):
+        self.assertRaises(ValueError, round_price, 2.0, 'sideways')
+        self.assertRaises(ValueError, ticks.round_prices, [2.0], 'sideways')
+
+    def test_legacy_on_ladder(self):
+        # the original set_betfair_odds()/get_odds_spread() on valid prices
+        for i, price in enumerate(TICKS):
+            for pips in (-3, -1, 0, 1, 3):
+                self.assertEqual(shift_price(price, pips), legacy.set_betfair_odds(TICKS, price, pips))
+            other = TICKS[(i * 7) % len(TICKS)]
+            self.assertEqual(tick_distance(price, other), legacy.get_odds_spread(TICKS, price, other))
+
+    def test_vectorised(self):
+        rnd = random.Random(0)
+        prices = [p for p, _, _, _ in BAND_EDGES] + [rnd.uniform(1.0, 1100.0) for _ in range(500)]
+        for mode in ticks.MODES:
+            self.assertEqual(ticks.round_prices(prices, mode).tolist(),
+                             [round_price(p, mode) for p in prices])
+            self.assertEqual(ticks.shift_prices(prices, 2, mode).tolist(),
+                             [shift_price(p, 2, mode) for p in prices])
+        others = prices[1:] + prices[:1]
+        self.assertEqual(ticks.tick_distances(prices, others).tolist(),
+                         [tick_distance(p, q) for p, q in zip(prices, others)])
+
+    def test_vectorised_nan(self):
+        rounded = ticks.round_prices([2.01, np.nan, 3.02])
+        self.assertEqual(rounded[[0, 2]].tolist(), [2.02, 3.0])
+        self.assertTrue(np.isnan(rounded[1]))
+        self.assertTrue(np.isnan(ticks.tick_distances([2.0, np.nan], [np.nan, 2.0])).all())
+        self.assertEqual(ticks.shift_prices([2.0, 3.0], [1, -1]).tolist(), [2.02, 2.98])
+
+
+def legacy_ladder():
+    """the prices the original set_betfair_odds() leaves as they are"""
+    prices = [c / 100.0 for c in range(101, 100001)]
+    return [p for p in prices if legacy.set_betfair_odds([], p) == p]
+
+if __name__ == '__main__':
+    unittest.main()
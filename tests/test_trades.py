@@ -0,0 +1,169 @@
+"""
+harb.trades: TradeTracker's per tick volume rows, selections coming and
+going, and its trades against the pandas TradeFeed differencing it replaced
+on polls recorded from the stub exchange.
+"""
+from __future__ import print_function, division
+
+import time
+import unittest
+
+from betfair.api import API
+from betfair.ticks import TICKS, tick_index
+from benchmarks import legacy
+from harb.trades import TradeTracker
+from tests.common import StubTestCase
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+
+def runner(sel_id, *volumes):
+    """a get_market_traded_volume() runner from (price, amount) pairs"""
+    return {'selection_id': sel_id,
+            'volumes': [{'price': p, 'amount': a} for p, a in volumes]}
+
+
+class TradeTrackerTest(unittest.TestCase):
+    def setUp(self):
+        self.tracker = TradeTracker(capacity=2)
+
+    def row(self, sel_id):
+        return self.tracker.volume[self.tracker.rows[sel_id]]
+
+    def test_first_poll_is_baseline(self):
+        self.assertEqual(self.tracker.update([runner('1', (2.0, 50.0))]), {})
+
+    def test_volume_by_tick(self):
+        self.tracker.update([runner('1', (2.0, 50.0), (2.02, 10.0)),
+                             runner('2', (5.5, 7.5))])
+        row = self.row('1')
+        self.assertEqual(row[tick_index(2.0)], 50.0)
+        self.assertEqual(row[tick_index(2.02)], 10.0)
+        self.assertEqual(row.sum(), 60.0)
+        self.assertEqual(len(row), len(TICKS))
+        self.assertEqual(self.row('2')[tick_index(5.5)], 7.5)
+
+    def test_trades(self):
+        self.tracker.update([runner('1', (2.0, 50.0), (2.02, 10.0)),
+                             runner('2', (5.5, 7.5))])
+        prints = self.tracker.update([
+            runner('1', (2.0, 80.0), (2.02, 11.0), (2.04, 4.0)),
+            runner('2', (5.5, 7.5))])
+        # 2.02 rose by less than min_amount, '2' did not trade
+        self.assertEqual(prints, {'1': {'prices': [2.0, 2.04],
+                                        'amount': [30.0, 4.0]}})
+        self.assertEqual(self.row('1')[tick_index(2.02)], 11.0)
+
+    def test_min_amount(self):
+        tracker = TradeTracker(min_amount=0.5)
+        tracker.update([runner('1', (3.0, 1.0))])
+        self.assertEqual(tracker.update([runner('1', (3.0, 2.0))]),
+                         {'1': {'prices': [3.0], 'amount': [1.0]}})
+
+    def test_new_selection_is_baseline(self):
+        self.tracker.update([runner('1', (2.0, 50.0))])
+        prints = self.tracker.update([runner('1', (2.0, 60.0)),
+                                      runner('2', (4.0, 500.0))])
+        self.assertEqual(list(prints), ['1'])
+        self.assertEqual(self.row('2')[tick_index(4.0)], 500.0)
+        prints = self.tracker.update([runner('1', (2.0, 60.0)),
+                                      runner('2', (4.0, 520.0))])
+        self.assertEqual(prints, {'2': {'prices': [4.0], 'amount': [20.0]}})
+
+    def test_grows_past_capacity(self):
+        self.tracker.update([runner(str(i), (2.0, 10.0)) for i in range(5)])
+        self.assertTrue(len(self.tracker.volume) >= 5)
+        prints = self.tracker.update([runner(str(i), (2.0, 10.0 + i * 5))
+                                      for i in range(5)])
+        self.assertEqual(sorted(prints), ['1', '2', '3', '4'])
+        self.assertEqual(prints['4']['amount'], [20.0])
+
+    def test_missing_selection_keeps_totals(self):
+        self.tracker.update([runner('1', (2.0, 50.0)), runner('2', (3.0, 9.0))])
+        self.assertEqual(self.tracker.update([runner('1', (2.0, 55.0))]),
+                         {'1': {'prices': [2.0], 'amount': [5.0]}})
+        self.assertEqual(self.row('2')[tick_index(3.0)], 9.0)
+        # back with 3 more traded while it was missing: reported once
+        prints = self.tracker.update([runner('1', (2.0, 55.0)),
+                                      runner('2', (3.0, 12.0))])
+        self.assertEqual(prints, {'2': {'prices': [3.0], 'amount': [3.0]}})
+        self.assertEqual(self.tracker.update([runner('2', (3.0, 12.0))]), {})
+
+    def test_voided_volume_lowers_baseline(self):
+        self.tracker.update([runner('1', (2.0, 50.0))])
+        self.assertEqual(self.tracker.update([runner('1', (2.0, 30.0))]), {})
+        self.assertEqual(self.tracker.update([runner('1', (2.0, 35.0))]),
+                         {'1': {'prices': [2.0], 'amount': [5.0]}})
+
+    def test_no_runners(self):
+        self.assertEqual(self.tracker.update([]), {})
+
+
+class RecordedPollsTest(StubTestCase):
+    markets = 2
+    tick_secs = 0.02  # several trades per runner between polls
+
+    @classmethod
+    def setUpClass(cls):
+        super(RecordedPollsTest, cls).setUpClass()
+        api = API()
+        api.urls = cls.server.urls()
+        api.login('user', 'pass')
+        market_id = api.get_all_markets()[0]['market_id']
+        cls.polls = []
+        for i in range(4):
+            cls.polls.append(api.get_market_traded_volume(market_id))
+            time.sleep(0.1)
+
+    def test_totals_match_polls(self):
+        tracker = TradeTracker()
+        for poll in self.polls:
+            tracker.update(poll)
+            for r in poll:
+                row = tracker.volume[tracker.rows[r['selection_id']]]
+                for v in r['volumes']:
+                    self.assertEqual(row[tick_index(v['price'])], v['amount'])
+                self.assertAlmostEqual(row.sum(),
+                                       sum(v['amount'] for v in r['volumes']))
+
+    def test_trades_add_up(self):
+        tracker = TradeTracker(min_amount=0.0)
+        tracker.update(self.polls[0])
+        traded = {}
+        for poll in self.polls[1:]:
+            for sel_id, p in tracker.update(poll).items():
+                traded[sel_id] = traded.get(sel_id, 0.0) + sum(p['amount'])
+        self.assertTrue(traded)
+
+        def total(poll, sel_id):
+            return sum(v['amount'] for r in poll if r['selection_id'] == sel_id
+                       for v in r['volumes'])
+        for sel_id, amount in traded.items():
+            self.assertAlmostEqual(amount, total(self.polls[-1], sel_id) -
+                                   total(self.polls[0], sel_id), 1)
+
+    @unittest.skipUnless(pandas, 'pandas is not installed')
+    def test_same_as_pandas_trade_feed(self):
+        tracker = TradeTracker()
+        tracker.update(self.polls[0])
+        for last, poll in zip(self.polls, self.polls[1:]):
+            prints = tracker.update(poll)
+            old = legacy.trades_since(legacy.traded_volume_series(last),
+                                      legacy.traded_volume_series(poll))
+            for sel_id, series in old.items():
+                new = prints.get(sel_id, {'prices': [], 'amount': []})
+                new = dict(zip(new['prices'], new['amount']))
+                # the old code lost trades at prices new since the last poll
+                # (NaN differences), so it only covers prices already traded
+                before = set(v['price'] for r in last
+                             if r['selection_id'] == sel_id for v in r['volumes'])
+                self.assertEqual(
+                    sorted((p, round(a, 2)) for p, a in series.items()),
+                    sorted((p, a) for p, a in new.items() if p in before))
+
+
+if __name__ == '__main__':
+    unittest.main()